@@ -0,0 +1,26 @@
+"""
+Backtest of ~25 years of daily data: the vectorized Backtester.run against the
+per-bar reference loop it replaced (tests/fixtures.py).
+
+    python -m benchmarks.bench_backtester [days]
+"""
+import sys
+
+from benchmarks.common import best_of, report
+from src.shared.backtester import Backtester
+from tests.fixtures import random_walk, reference_backtest
+
+
+def main(days: int = 6500):
+    history = random_walk(days=days)
+    backtester = Backtester()
+    print(f"{days} bars")
+
+    loop, _ = best_of(lambda: reference_backtest(backtester.prepare_indicators(history), start=backtester.warmup), repeat=1)
+    report("per-bar loop", loop)
+    vectorized, _ = best_of(lambda: backtester.run(history))
+    report("Backtester.run", vectorized, baseline=loop)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Time-series response encodings of src/api/columnar.py on a /rates page: the
+regular list-of-records JSON against column JSON, packed float32 and (with
+pyarrow) Arrow IPC. Times include the row -> column split; sizes are the
+response bodies. The f32 body is decoded back and checked against the rows.
+
+    python -m benchmarks.bench_columnar [rows]
+"""
+import json
+import struct
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.common import best_of, report
+from src.api.columnar import arrow_ipc, columns_json, pa, packed_f32, to_columns
+from src.api.responses import render_json
+
+
+def rate_rows(rows: int):
+    """
+    Records as /rates returns them (Rate columns after jsonable_encoder).
+    """
+    rng = np.random.default_rng(15)
+    mids = 4.0 * np.exp(np.cumsum(rng.normal(0, 0.005, rows)))
+    start = date(2000, 1, 3)
+    return jsonable_encoder([
+        {'id': i + 1, 'currency_code': 'USD', 'rate_mid': round(float(mid), 4),
+         'effective_date': start + timedelta(days=i), 'source': 'NBP'}
+        for i, mid in enumerate(mids)
+    ])
+
+
+def encode_columns(rows, encoder) -> bytes:
+    dates, values = to_columns(rows, "effective_date", ["rate_mid"])
+    return encoder(dates, values, ["rate_mid"])
+
+
+def decode_f32(body: bytes):
+    (length,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4:4 + length])
+    offset = 4 + length
+    days = np.frombuffer(body, dtype="<i4", count=header["rows"], offset=offset)
+    values = np.frombuffer(body, dtype="<f4", count=header["rows"], offset=offset + 4 * header["rows"])
+    return days, values
+
+
+def main(rows: int = 5000):
+    records = rate_rows(rows)
+    print(f"/rates page of {rows} rows")
+
+    encodings = [
+        ("list-of-records JSON", lambda: render_json(records)),
+        ("column JSON", lambda: encode_columns(records, lambda *a: render_json(columns_json(*a)))),
+        ("packed float32", lambda: encode_columns(records, packed_f32)),
+    ]
+    if pa is not None:
+        encodings.append(("Arrow IPC", lambda: encode_columns(records, arrow_ipc)))
+
+    baseline = None
+    bodies = {}
+    for label, encode in encodings:
+        seconds, body = best_of(encode, repeat=20)
+        bodies[label] = body
+        report(label, seconds, baseline=baseline)
+        print(f"{'':<40} {len(body) / 1024:10.1f} KB")
+        baseline = baseline or seconds
+
+    days, values = decode_f32(bodies["packed float32"])
+    expected_days = np.array([r['effective_date'] for r in records], dtype="datetime64[D]").astype("int64")
+    assert (days == expected_days).all()
+    error = np.max(np.abs(values - np.array([r['rate_mid'] for r in records])))
+    print(f"f32 round trip: dates exact, max value difference {error:.1e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""
+Correlation computation on a wide price matrix (9 assets): the pandas path
+/stats/correlation used before (merge per asset + DataFrame.corr(), pandas
+rolling().corr()) against correlation_matrix and rolling_correlation.
+The price loading is covered by bench_history.
+
+    python -m benchmarks.bench_correlation [rows] [window]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import best_of, report
+from src.shared.snapshots import CORRELATION_ASSETS, correlation_matrix, rolling_correlation, tail_rows
+
+
+def price_matrix(rows: int):
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range("2000-01-03", periods=rows).to_numpy().astype('datetime64[D]')
+    common = np.cumsum(rng.normal(0, 0.004, rows))
+    prices = 4.0 * np.exp(common[:, None] + np.cumsum(rng.normal(0, 0.005, (rows, len(CORRELATION_ASSETS))), axis=0))
+    # Holes as in real data (gold and rates are not published on the same days)
+    prices[rng.random(prices.shape) < 0.02] = np.nan
+    return dates, prices
+
+
+def pandas_matrix(dates, prices) -> dict:
+    merged = pd.DataFrame()
+    for i, code in enumerate(CORRELATION_ASSETS):
+        df = pd.DataFrame({'date': dates, code: prices[:, i]}).dropna()
+        merged = df if merged.empty else pd.merge(merged, df, on='date', how='inner')
+    return merged.drop(columns=['date']).corr().to_dict()
+
+
+def pandas_rolling(dates, prices, window: int) -> dict:
+    df = pd.DataFrame(prices, index=dates, columns=CORRELATION_ASSETS).dropna()
+    return {
+        f"{a}/{b}": df[a].rolling(window).corr(df[b]).to_numpy()[window - 1:]
+        for i, a in enumerate(CORRELATION_ASSETS) for j, b in enumerate(CORRELATION_ASSETS) if i < j
+    }
+
+
+def max_difference(old: dict, new: dict) -> float:
+    return max(np.nanmax(np.abs(np.asarray(old[k], dtype=float) - np.asarray(new[k], dtype=float))) for k in old)
+
+
+def main(rows: int = 2000, window: int = 60):
+    dates, prices = price_matrix(rows)
+    print(f"{len(CORRELATION_ASSETS)} assets, {rows} rows, rolling window {window}")
+
+    for label, matrix in (("matrix, last 180", tail_rows(prices, 180)), ("matrix, full history", prices)):
+        old_seconds, old = best_of(lambda: pandas_matrix(dates, matrix))
+        new_seconds, new = best_of(lambda: correlation_matrix(CORRELATION_ASSETS, matrix))
+        report(f"{label}: merge + corr", old_seconds)
+        report(f"{label}: correlation_matrix", new_seconds, baseline=old_seconds)
+        print(f"{'':<40} max difference {max(max_difference(old[a], new[a]) for a in old):.1e}")
+
+    old_seconds, old = best_of(lambda: pandas_rolling(dates, prices, window))
+    new_seconds, new = best_of(lambda: rolling_correlation(CORRELATION_ASSETS, dates, prices, window))
+    report("rolling: pandas rolling().corr()", old_seconds)
+    report("rolling: rolling_correlation", new_seconds, baseline=old_seconds)
+    print(f"{'':<40} max difference {max_difference(old, new['pairs']):.1e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
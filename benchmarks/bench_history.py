@@ -0,0 +1,78 @@
+"""
+Price history reads: the ORM path the API and the brain used before (Rate objects
+turned into a DataFrame row by row) against load_price_history, and the
+per-asset loop + merge of /stats/correlation against load_price_matrix.
+Reports the best wall time and the peak traced memory of each.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_history [days]
+"""
+import asyncio
+import sys
+import tracemalloc
+
+import pandas as pd
+from sqlalchemy import select
+
+from benchmarks.common import BENCH_DATABASE_URL, best_of_async, fresh_database, report, seed_prices
+from src.shared.history import load_price_history, load_price_matrix
+from src.shared.models import GoldPrice, Rate
+
+CODES = ["USD", "EUR", "CHF", "GBP", "JPY", "CAD", "AUD", "NOK"]
+
+
+async def orm_history(session, code: str) -> pd.DataFrame:
+    result = await session.execute(select(Rate).where(Rate.currency_code == code).order_by(Rate.effective_date.asc()))
+    df = pd.DataFrame([{'date': d.effective_date, 'price': float(d.rate_mid)} for d in result.scalars().all()])
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+async def orm_matrix(session, tail: int) -> pd.DataFrame:
+    merged = pd.DataFrame()
+    for asset in ["GOLD"] + CODES:
+        if asset == "GOLD":
+            stmt = select(GoldPrice).order_by(GoldPrice.effective_date.desc()).limit(tail)
+            df = pd.DataFrame([{'date': d.effective_date, asset: float(d.price)} for d in (await session.execute(stmt)).scalars()])
+        else:
+            stmt = select(Rate).where(Rate.currency_code == asset).order_by(Rate.effective_date.desc()).limit(tail)
+            df = pd.DataFrame([{'date': d.effective_date, asset: float(d.rate_mid)} for d in (await session.execute(stmt)).scalars()])
+        df['date'] = pd.to_datetime(df['date'])
+        merged = df if merged.empty else pd.merge(merged, df, on='date', how='inner')
+    return merged
+
+
+async def peak_memory(fn) -> float:
+    tracemalloc.start()
+    await fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+async def compare(label: str, Session, old, new):
+    async with Session() as session:
+        # Fresh identity map per call, as in a request
+        async def run(fn):
+            session.expunge_all()
+            return await fn(session)
+
+        old_seconds, _ = await best_of_async(lambda: run(old))
+        new_seconds, _ = await best_of_async(lambda: run(new))
+        old_mb, new_mb = await peak_memory(lambda: run(old)), await peak_memory(lambda: run(new))
+    report(f"{label}: ORM", old_seconds)
+    report(f"{label}: columnar", new_seconds, baseline=old_seconds)
+    print(f"{'':<40} peak memory {old_mb:.1f} MB -> {new_mb:.1f} MB ({old_mb / new_mb:.1f}x)")
+
+
+async def main(days: int = 12000):
+    engine, Session = await fresh_database()
+    await seed_prices(engine, CODES, days)
+    print(f"{len(CODES)} currencies + gold, {days} rows each, on {BENCH_DATABASE_URL.split('://')[0]}")
+
+    await compare("full history", Session, lambda s: orm_history(s, "USD"), lambda s: load_price_history(s, "USD"))
+    await compare("matrix, last 180", Session, lambda s: orm_matrix(s, 180), lambda s: load_price_matrix(s, ["GOLD"] + CODES, tail=180))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(a) for a in sys.argv[1:])))
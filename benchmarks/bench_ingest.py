@@ -0,0 +1,72 @@
+"""
+Import of one year of Table A (33 currencies) into empty tables and again into
+tables that already hold it: the per-row SELECT + session.add path the miner used
+before against bulk_insert_ignore.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_ingest
+"""
+import asyncio
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from benchmarks.common import BENCH_DATABASE_URL, fresh_database, report
+from src.shared.models import Currency, Rate
+from src.miner.ingest import bulk_insert_ignore
+
+CODES = [f"C{i:02d}" for i in range(33)]
+
+
+def year_of_rates(days: int = 250):
+    start = date(2024, 1, 1)
+    return [
+        {'currency_code': code, 'rate_mid': Decimal("4.1234") + i, 'effective_date': start + timedelta(days=d), 'source': "NBP"}
+        for i, code in enumerate(CODES) for d in range(days)
+    ]
+
+
+async def n_plus_one(session, rows):
+    for r in rows:
+        existing = await session.execute(
+            select(Rate).where(Rate.currency_code == r['currency_code'], Rate.effective_date == r['effective_date'])
+        )
+        if not existing.scalar():
+            session.add(Rate(**r))
+    await session.commit()
+
+
+async def bulk(session, rows):
+    await bulk_insert_ignore(session, Rate, rows, conflict_columns=['currency_code', 'effective_date'])
+    await session.commit()
+
+
+async def timed_import(Session, insert, rows) -> float:
+    async with Session() as session:
+        started = time.perf_counter()
+        await insert(session, rows)
+        return time.perf_counter() - started
+
+
+async def main():
+    rows = year_of_rates()
+    print(f"{len(rows)} rows on {BENCH_DATABASE_URL.split('://')[0]}")
+    results = {}
+    for label, insert in (("per-row SELECT + add", n_plus_one), ("bulk_insert_ignore", bulk)):
+        engine, Session = await fresh_database()
+        async with Session() as session:
+            session.add_all(Currency(code=code, name=code) for code in CODES)
+            await session.commit()
+        results[label] = (await timed_import(Session, insert, rows), await timed_import(Session, insert, rows))
+        await engine.dispose()
+
+    (old_empty, old_again), (new_empty, new_again) = results.values()
+    report("per-row SELECT + add, empty table", old_empty)
+    report("bulk_insert_ignore, empty table", new_empty, baseline=old_empty)
+    report("per-row SELECT + add, rows stored", old_again)
+    report("bulk_insert_ignore, rows stored", new_again, baseline=old_again)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+render_json (NanSafeJSONResponse) against the encoder it replaced: a recursive
+NaN -> None copy of the payload, then json.dumps, after the conversion that made
+the payload JSON-ready (FastAPI's jsonable_encoder, array.tolist(), to_dict()).
+Payloads have the shapes the endpoints return; render_json runs with orjson when
+installed and with its standard library fallback. Every output is checked to
+decode equal to the old one.
+
+    python -m benchmarks.bench_render_json [rows]
+"""
+import json
+import math
+import sys
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.common import best_of, report
+from src.api import responses
+from src.api.columnar import columns_json
+from src.api.responses import render_json
+from src.shared.backtester import Backtester
+from src.shared.snapshots import CORRELATION_ASSETS, correlation_matrix, monthly_returns
+from tests.fixtures import random_walk
+
+
+def old_sanitize(obj: Any) -> Any:
+    if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+        return None
+    if isinstance(obj, dict):
+        return {k: old_sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [old_sanitize(v) for v in obj]
+    return obj
+
+
+def old_render(content: Any) -> bytes:
+    return json.dumps(old_sanitize(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+@contextmanager
+def stdlib_only():
+    saved, responses.orjson = responses.orjson, None
+    try:
+        yield
+    finally:
+        responses.orjson = saved
+
+
+def payloads(rows: int):
+    """
+    (label, content as the endpoint now renders it, how the old path got it JSON-ready).
+    The old encoder took JSON-ready data only: FastAPI's jsonable_encoder ran first
+    on returned results, arrays and DataFrames were turned into lists / records.
+    """
+    rng = np.random.default_rng(16)
+    days = [date(2000, 1, 3) + timedelta(days=i) for i in range(rows)]
+    prices = 4.0 * np.exp(np.cumsum(rng.normal(0, 0.005, rows)))
+    rates = jsonable_encoder([
+        {'id': i + 1, 'currency_code': 'USD', 'rate_mid': round(float(p), 4), 'effective_date': d, 'source': 'NBP'}
+        for i, (d, p) in enumerate(zip(days, prices))
+    ])
+    backtest = Backtester().run(random_walk(days=rows))
+    matrix = 4.0 * np.exp(np.cumsum(rng.normal(0, 0.005, (rows, len(CORRELATION_ASSETS))), axis=0))
+    correlation = correlation_matrix(CORRELATION_ASSETS, matrix)
+    seasonality = monthly_returns(random_walk(days=26 * 261))
+    predict = jsonable_encoder([
+        {'ds': date(2024, 1, 1) + timedelta(days=i), 'yhat': 4.0 + i / 100, 'yhat_lower': 3.9 + i / 100, 'yhat_upper': 4.1 + i / 100}
+        for i in range(30)
+    ])
+    # Indicator warm-up rows are NaN
+    sma = pd.Series(prices).rolling(50).mean().to_numpy()
+    columns = columns_json(days, {'rate_mid': prices, 'sma': sma}, ['rate_mid', 'sma'])
+    frame = pd.DataFrame({'date': pd.to_datetime(days), 'price': prices, 'sma': sma})
+
+    same = lambda content: content
+    return [
+        ("rates", rates, same),
+        ("backtest", backtest, jsonable_encoder),
+        ("correlation 9x9", correlation, same),
+        ("seasonality, 26 years", seasonality, jsonable_encoder),
+        ("predict, 30 days", predict, same),
+        ("columns arrays (NaN)", columns, lambda c: jsonable_encoder({k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in c.items()})),
+        ("DataFrame (NaN)", frame, lambda df: jsonable_encoder(df.to_dict(orient='records'))),
+    ]
+
+
+def main(rows: int = 5000):
+    print(f"{rows} rows, render_json with orjson: {responses.orjson is not None}")
+    for label, content, prepare in payloads(rows):
+        old_seconds, old = best_of(lambda: old_render(prepare(content)), repeat=10)
+        fast_seconds, fast = best_of(lambda: render_json(content), repeat=10)
+        with stdlib_only():
+            stdlib_seconds, stdlib = best_of(lambda: render_json(content), repeat=10)
+        report(f"{label}: old path", old_seconds)
+        if responses.orjson is not None:
+            report(f"{label}: render_json", fast_seconds, baseline=old_seconds)
+        report(f"{label}: stdlib fallback", stdlib_seconds, baseline=old_seconds)
+        assert json.loads(fast) == json.loads(old) == json.loads(stdlib), label
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
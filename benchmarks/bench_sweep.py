@@ -0,0 +1,59 @@
+"""
+Parameter sweep throughput (combinations per second): one Backtester.run per
+combination against run_sweep_chunk (shared indicator cache), in one process and
+split across a process pool like POST /backtest/sweep.
+
+    python -m benchmarks.bench_sweep [days] [workers]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import best_of
+from src.shared.backtester import Backtester
+from src.shared.sweep import expand_grid, run_sweep_chunk, split_combinations
+from tests.fixtures import random_walk
+
+GRID = {
+    'macd_fast': [8, 12, 16],
+    'macd_slow': [21, 26, 34],
+    'rsi_window': [7, 14, 21],
+    'bb_window': [15, 20],
+    'bb_std': [1.5, 2.0, 2.5],
+    'adx_threshold': [20, 25, 30],
+    'rsi_oversold': [25, 30],
+    'rsi_overbought': [70, 75],
+}
+NAIVE_SAMPLE = 60 # combinations timed with the per-combination path
+
+
+def rate(label: str, combos: int, seconds: float, baseline: float = None):
+    per_second = combos / seconds
+    speedup = f"  ({per_second / baseline:.1f}x)" if baseline else ""
+    print(f"{label:<40} {per_second:10.0f} combos/s{speedup}")
+    return per_second
+
+
+def main(days: int = 3000, workers: int = os.cpu_count() or 1):
+    history = random_walk(days=days)
+    combos = expand_grid(GRID)
+    print(f"{len(combos)} combinations, {days} bars, {workers} worker(s)")
+
+    sample = combos[:NAIVE_SAMPLE]
+    naive, _ = best_of(lambda: [Backtester(params=p).run(history) for p in sample], repeat=1)
+    baseline = rate("Backtester.run per combination", len(sample), naive)
+
+    chunk, results = best_of(lambda: run_sweep_chunk(history, combos, 10000.0), repeat=3)
+    rate("run_sweep_chunk, one process", len(results), chunk, baseline)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batches = split_combinations(combos, workers * 4)
+        list(pool.map(run_sweep_chunk, [history] * workers, [batches[0]] * workers, [10000.0] * workers)) # warm up
+        started = time.perf_counter()
+        evaluated = sum(len(r) for r in pool.map(run_sweep_chunk, [history] * len(batches), batches, [10000.0] * len(batches)))
+        rate(f"process pool, {len(batches)} batches", evaluated, time.perf_counter() - started, baseline)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
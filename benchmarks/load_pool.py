@@ -0,0 +1,87 @@
+"""
+Load test of the connection pool profiles (src/shared/database.py): `clients`
+concurrent tasks each run `requests` short sessions (one query, then `hold_ms`
+of work with the connection checked out, like an API request), against an
+engine built from engine_options() for every profile. Reports throughput,
+session latency and the MeteredQueuePool counters (wait, overflow, timeouts).
+
+With an asyncpg URL the PgBouncer mode (NullPool, no prepared statement cache)
+is measured too; point it at PgBouncer to load the real thing.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.load_pool [clients] [requests] [hold_ms]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import BENCH_DATABASE_URL
+
+# src.shared.database creates its engine on import
+os.environ.setdefault("DATABASE_URL", BENCH_DATABASE_URL)
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.shared import database
+from src.shared.database import POOL_PROFILES, engine_options, pool_metrics
+
+
+async def run_load(engine, clients: int, requests: int, hold_ms: float):
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    await asyncio.sleep(hold_ms / 1000)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - started, np.array(latencies), errors
+
+
+async def measure(label: str, url: str, profile: str, clients: int, requests: int, hold_ms: float):
+    engine = create_async_engine(url, **engine_options(url, profile))
+    pool_metrics.__init__()
+    try:
+        elapsed, latencies, errors = await run_load(engine, clients, requests, hold_ms)
+    finally:
+        await engine.dispose()
+    m = pool_metrics
+    print(
+        f"{label:<12} {len(latencies) / elapsed:8.0f}/s  p50 {np.percentile(latencies, 50) * 1000:7.1f} ms"
+        f"  p95 {np.percentile(latencies, 95) * 1000:7.1f} ms  wait max {m.wait_seconds_max * 1000:7.1f} ms"
+        f"  overflow {m.overflow_events:3d}  timeouts {m.timeouts:3d}  errors {errors}"
+    )
+
+
+async def main(clients: int = 50, requests: int = 20, hold_ms: float = 5.0):
+    url = BENCH_DATABASE_URL
+    print(f"{make_url(url).get_backend_name()}: {clients} clients x {requests} sessions, {hold_ms} ms held each")
+    for profile, settings in POOL_PROFILES.items():
+        label = f"{profile} {settings['pool_size']}+{settings['max_overflow']}"
+        await measure(label, url, profile, clients, requests, hold_ms)
+
+    if make_url(url).get_driver_name() == "asyncpg":
+        database.DB_PGBOUNCER = True
+        try:
+            await measure("pgbouncer", url, "api", clients, requests, hold_ms)
+        finally:
+            database.DB_PGBOUNCER = False
+    else:
+        print("pgbouncer    skipped: needs a postgresql+asyncpg URL")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(float(a) if i == 2 else int(a) for i, a in enumerate(sys.argv[1:]))))
@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+import httpx
+from fastapi import FastAPI, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from src.api.columnar import preferred_format
+from src.shared.history import GOLD_CODE
+
+logger = logging.getLogger("api.cache")
+
+# Entries are evicted when their data changes, the TTL is only a safety net
+CACHE_TTL = int(os.getenv("CACHE_TTL", "86400"))
+# Cache-Control sent to clients instead of the server-side TTL: browsers cannot be
+# reached by the eviction, so they revalidate (the ETag makes that a 304)
+CACHE_CONTROL = os.getenv("CACHE_CONTROL", "no-cache")
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "false").lower() in ("1", "true", "yes")
+CACHE_WARMUP_ASSETS = [c.strip().upper() for c in os.getenv("CACHE_WARMUP_ASSETS", "GOLD,USD,EUR").split(",") if c.strip()]
+# In-process (L1) tier in front of Redis, per API worker
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+
+INGEST_CHANNEL = "rates.ingested"     # miner: new rows stored
+ANALYSIS_CHANNEL = "analysis.refreshed" # brain: snapshots / forecast models rebuilt
+INVALIDATE_CHANNEL = "cache.invalidate" # API workers: drop L1 copies of cleared keys
+
+# Endpoint families (cache namespaces)
+CURRENCIES = "currencies"
+RATES = "rates"
+GOLD = "gold"
+CORRELATION = "correlation"
+SEASONALITY = "seasonality"
+PREDICT = "predict"
+
+# Asset segment of keys that do not belong to a single asset (not a glob character)
+ANY_ASSET = "_"
+
+# Requests issued by the warm-up, matching the dashboard's calls (src/frontend/src/lib/api.ts)
+WARMUP_PATHS: Dict[str, str] = {
+    CURRENCIES: "/currencies",
+    RATES: "/rates?code={asset}&limit=5000",
+    GOLD: "/gold?limit=5000",
+    CORRELATION: "/stats/correlation",
+    SEASONALITY: "/stats/seasonality?asset_code={asset}",
+    PREDICT: "/predict?asset_code={asset}",
+}
+
+_KEY_TYPES = (str, int, float, bool, date, type(None))
+
+
+def cached(family: str, asset_param: Optional[str] = None, asset: str = ANY_ASSET, expire: int = CACHE_TTL):
+    """
+    fastapi_cache's @cache with keys '<prefix>:<family>:<ASSET>:<hash>', so every
+    entry of an endpoint family for one asset can be evicted by pattern.
+    The asset comes from the `asset_param` query argument, or is fixed to `asset`.
+    Only plain query arguments are hashed (never injected objects like the DB session),
+    plus the compact format the Accept header negotiates, if any.
+    Responses carry CACHE_CONTROL rather than fastapi_cache's max-age=<expire>.
+    """
+    def key_builder(func: Callable, namespace: str = "", *, request=None, response=None, args: Tuple, kwargs: Dict[str, Any]) -> str:
+        params = {k: v for k, v in kwargs.items() if isinstance(v, _KEY_TYPES)}
+        # A compact encoding negotiated by @columnar is its own entry
+        media_type = preferred_format(request.headers.get("accept")) if request is not None else None
+        if media_type is not None:
+            params["__format"] = media_type
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        key_asset = str(kwargs.get(asset_param) or asset).upper() if asset_param else asset
+        return f"{namespace}:{key_asset}:{digest}"
+
+    def wrapper(func):
+        inner = cache(expire=expire, namespace=family, key_builder=key_builder)(func)
+        response_param = next(p for p in inner.__signature__.parameters.values() if p.annotation is Response)
+
+        @wraps(inner)
+        async def with_client_headers(*args, **kwargs):
+            result = await inner(*args, **kwargs)
+            response = kwargs.get(response_param.name)
+            if response is not None and "cache-control" in response.headers:
+                response.headers["Cache-Control"] = CACHE_CONTROL
+            return result
+        return with_client_headers
+    return wrapper
+
+
+def affected_entries(channel: str, event: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    """
+    (family, asset) pairs whose cached responses an event makes stale.
+    Derived families are evicted both on ingest (live fallbacks) and when the
+    brain reports the rebuilt snapshots / models.
+    """
+    kind = event.get('type')
+    codes = [GOLD_CODE] if kind == 'gold' else [c.upper() for c in event.get('codes', [])]
+    entries = set()
+
+    if channel == INGEST_CHANNEL:
+        if kind == 'gold':
+            entries.add((GOLD, GOLD_CODE))
+        else:
+            entries.add((CURRENCIES, ANY_ASSET))
+            entries.update((RATES, code) for code in codes)
+        entries.update((SEASONALITY, code) for code in codes)
+        entries.update((PREDICT, code) for code in codes)
+    elif kind == 'snapshots':
+        entries.update((SEASONALITY, code) for code in codes)
+    elif kind == 'forecasts':
+        entries.update((PREDICT, code) for code in codes)
+
+    # Correlation entries can cover any asset list, not only the snapshot's assets
+    if kind != 'forecasts' and codes:
+        entries.add((CORRELATION, ANY_ASSET))
+    return entries
+
+
+class ScanRedisBackend(RedisBackend):
+    """
+    RedisBackend whose namespace clear walks the keyspace with SCAN + UNLINK
+    instead of a blocking KEYS call.
+    """
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            keys = [k async for k in self.redis.scan_iter(match=f"{namespace}:*", count=1000)]
+            return await self.redis.unlink(*keys) if keys else 0
+        return await super().clear(namespace, key)
+
+
+class TieredBackend(ScanRedisBackend):
+    """
+    Two-tier fastapi_cache backend: a bounded in-process LRU (L1) in front of Redis (L2).
+
+    L1 entries expire together with their Redis copy: values read from Redis keep
+    the remaining Redis TTL, values written get the same expiry as in Redis.
+    L1 is bounded by total value size and entry count, evicting least recently used.
+    clear() drops the keys in both tiers and broadcasts on INVALIDATE_CHANNEL,
+    so other workers (listen()) drop their L1 copies too.
+    """
+
+    def __init__(self, redis, max_bytes: int = CACHE_L1_MAX_BYTES, max_entries: int = CACHE_L1_MAX_ENTRIES):
+        super().__init__(redis)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.origin = uuid.uuid4().hex
+        # key -> (monotonic expiry or None, value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "l1_evictions": 0, "l2_hits": 0, "l2_misses": 0}
+
+    def _l1_get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at is not None and expires_at <= now:
+            self._l1_drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return (int(expires_at - now) if expires_at is not None else -1), value
+
+    def _l1_put(self, key: str, value: bytes, ttl: Optional[int]):
+        self._l1_drop(key)
+        if len(value) > self.max_bytes or (ttl is not None and ttl <= 0):
+            return
+        self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.counters["l1_evictions"] += 1
+
+    def _l1_drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _l1_invalidate(self, namespace: Optional[str] = None, key: Optional[str] = None):
+        if namespace:
+            for k in [k for k in self._entries if k.startswith(f"{namespace}:")]:
+                self._l1_drop(k)
+        elif key:
+            self._l1_drop(key)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        hit = self._l1_get(key)
+        if hit is not None:
+            self.counters["l1_hits"] += 1
+            return hit
+        self.counters["l1_misses"] += 1
+
+        ttl, value = await super().get_with_ttl(key)
+        if value is None:
+            self.counters["l2_misses"] += 1
+            return ttl, value
+        self.counters["l2_hits"] += 1
+        # Redis reports -1 for keys without expiry
+        self._l1_put(key, value, ttl if ttl >= 0 else None)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await super().set(key, value, expire)
+        self._l1_put(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        removed = await super().clear(namespace, key)
+        self._l1_invalidate(namespace, key)
+        try:
+            await self.redis.publish(INVALIDATE_CHANNEL, json.dumps({"origin": self.origin, "namespace": namespace, "key": key}))
+        except Exception as e:
+            logger.error(f"Failed to broadcast cache invalidation: {e}")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters
+        return {
+            "l1": {
+                "hits": c["l1_hits"], "misses": c["l1_misses"], "evictions": c["l1_evictions"],
+                "entries": len(self._entries), "bytes": self._bytes,
+                "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+            },
+            "l2": {"hits": c["l2_hits"], "misses": c["l2_misses"]},
+        }
+
+    def metric_families(self) -> Iterator[Any]:
+        """
+        The counters in Prometheus form, read at scrape time; hit rate per tier is
+        hits / (hits + misses) of charon_cache_requests.
+        """
+        c = self.counters
+        requests = CounterMetricFamily("charon_cache_requests", "Cache lookups per tier and result", labels=["tier", "result"])
+        for tier in ("l1", "l2"):
+            requests.add_metric([tier, "hit"], c[f"{tier}_hits"])
+            requests.add_metric([tier, "miss"], c[f"{tier}_misses"])
+        yield requests
+        yield CounterMetricFamily("charon_cache_l1_evictions", "L1 entries evicted for size", value=c["l1_evictions"])
+        yield GaugeMetricFamily("charon_cache_l1_entries", "L1 entries", value=len(self._entries))
+        yield GaugeMetricFamily("charon_cache_l1_bytes", "L1 value bytes", value=self._bytes)
+
+    async def listen(self):
+        """
+        Applies clear() calls made by other workers to this worker's L1.
+        """
+        pubsub = self.redis.pubsub()
+        while True:
+            try:
+                if not pubsub.subscribed:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message:
+                    continue
+                data = json.loads(message['data'])
+                if data.get('origin') != self.origin:
+                    self._l1_invalidate(data.get('namespace'), data.get('key'))
+            except asyncio.CancelledError:
+                await pubsub.close()
+                raise
+            except Exception as e:
+                logger.error(f"L1 invalidation listener error: {e}")
+                await asyncio.sleep(5)
+
+
+async def evict(entries: Set[Tuple[str, str]]) -> int:
+    removed = 0
+    for family, asset in sorted(entries):
+        removed += await FastAPICache.clear(namespace=f"{family}:{asset}")
+    return removed
+
+
+async def warm_up(app: FastAPI, entries: Set[Tuple[str, str]]):
+    """
+    Re-requests the hot variants of the evicted entries in-process, so the first
+    dashboard hit after an ingest is served from cache.
+    """
+    paths = [
+        WARMUP_PATHS[family].format(asset=asset)
+        for family, asset in sorted(entries)
+        if family in WARMUP_PATHS and (asset == ANY_ASSET or asset in CACHE_WARMUP_ASSETS)
+    ]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for path in paths:
+            try:
+                await client.get(path)
+            except Exception as e:
+                logger.warning(f"Cache warm-up of {path} failed: {e}")
+    logger.info(f"Cache warmed up: {len(paths)} entries")
+
+
+async def listen_for_invalidations(app: FastAPI, redis_client):
+    """
+    Evicts cached responses when the miner ingests data or the brain refreshes
+    derived analysis. Runs for the lifetime of the API process.
+    """
+    pubsub = redis_client.pubsub()
+    while True:
+        try:
+            if not pubsub.subscribed:
+                await pubsub.subscribe(INGEST_CHANNEL, ANALYSIS_CHANNEL)
+                logger.info(f"Cache invalidation subscribed to {INGEST_CHANNEL}, {ANALYSIS_CHANNEL}")
+
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if not message:
+                continue
+            channel = message['channel']
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            entries = affected_entries(channel, json.loads(message['data']))
+            if not entries:
+                continue
+
+            removed = await evict(entries)
+            logger.info(f"Evicted {removed} cache entries after {channel}: {sorted(entries)}")
+            if CACHE_WARMUP:
+                await warm_up(app, entries)
+        except asyncio.CancelledError:
+            await pubsub.close()
+            raise
+        except Exception as e:
+            logger.error(f"Cache invalidation error: {e}")
+            await asyncio.sleep(5)
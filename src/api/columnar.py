@@ -0,0 +1,185 @@
+import inspect
+import json
+import struct
+from functools import wraps
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from src.api.responses import NanSafeJSONResponse
+from src.shared.metrics import request_timer
+
+try:
+    import pyarrow as pa
+except ImportError: # optional: Arrow IPC is only offered when pyarrow is installed
+    pa = None
+
+# Media types of the compact time-series encodings (negotiated via Accept)
+COLUMNS_JSON = "application/vnd.charon.columns+json"
+PACKED_F32 = "application/vnd.charon.f32"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def preferred_format(accept: Optional[str]) -> Optional[str]:
+    """
+    The first compact media type in the Accept header (by q-value, then order),
+    or None when the client wants regular JSON.
+    """
+    supported = {COLUMNS_JSON, PACKED_F32} | ({ARROW_STREAM} if pa is not None else set())
+    ranked = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranked.append((-q, position, media_type.lower()))
+
+    for negative_q, _, media_type in sorted(ranked):
+        if media_type in supported and negative_q < 0:
+            return media_type
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+def to_columns(rows: Sequence[Dict[str, Any]], date_field: str, value_fields: Sequence[str]) -> Tuple[List[Any], Dict[str, np.ndarray]]:
+    """
+    Splits row records into the date column and float64 value columns (None -> NaN).
+    """
+    dates = [row[date_field] for row in rows]
+    values = {
+        field: np.array([row[field] for row in rows], dtype=np.float64)
+        for field in value_fields
+    }
+    return dates, values
+
+
+def columns_json(dates: List[Any], values: Dict[str, np.ndarray], value_fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    {"dates": [...], "values": [...first value field...], <other value fields>: [...]}
+    Value columns stay arrays; NanSafeJSONResponse writes them directly (NaN as null).
+    """
+    primary, *others = value_fields
+    body = {"dates": dates, "values": values[primary]}
+    for field in others:
+        body[field] = values[field]
+    return body
+
+
+def _day_numbers(dates: List[Any]) -> np.ndarray:
+    return (np.array([str(d)[:10] for d in dates], dtype="datetime64[D]") - _EPOCH).astype("<i4")
+
+
+def packed_f32(dates: List[Any], values: Dict[str, np.ndarray], value_fields: Sequence[str]) -> bytes:
+    """
+    Binary layout (little-endian):
+      uint32 header length | JSON header {"rows", "columns", "date_unit"}
+      int32[rows]   dates as days since 1970-01-01
+      float32[rows] per column, in header order (NaN kept as NaN)
+    """
+    header = json.dumps({"rows": len(dates), "columns": list(value_fields), "date_unit": "days since 1970-01-01"}).encode()
+    parts = [struct.pack("<I", len(header)), header, _day_numbers(dates).tobytes()]
+    parts.extend(values[field].astype("<f4").tobytes() for field in value_fields)
+    return b"".join(parts)
+
+
+def arrow_ipc(dates: List[Any], values: Dict[str, np.ndarray], value_fields: Sequence[str]) -> bytes:
+    table = pa.table({
+        "date": pa.array(_day_numbers(dates).astype("int32"), type=pa.int32()).cast(pa.date32()),
+        **{field: pa.array(values[field], from_pandas=True) for field in value_fields},
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _vary_on_accept(response: Response):
+    vary = [v.strip() for v in response.headers.get("vary", "").split(",") if v.strip()]
+    if "accept" not in (v.lower() for v in vary):
+        response.headers["Vary"] = ", ".join([*vary, "Accept"])
+
+
+def columnar(date_field: str, value_fields: Sequence[str], rows_key: Optional[str] = None):
+    """
+    Lets a time-series endpoint answer in a compact encoding chosen by the Accept header:
+    column-oriented JSON, packed float32 or (with pyarrow) Arrow IPC. Regular JSON
+    requests get the endpoint's result unchanged.
+
+    Goes between @app.get and @cached, so the cache keeps storing the regular result.
+    rows_key names the list of records inside a dict result (e.g. "equity_curve");
+    paginated pages use their "items". For JSON the rest of the dict is kept as is,
+    binary encodings carry the rows only. Every response, JSON included, carries
+    Vary: Accept so browser and proxy caches keep the representations apart.
+    """
+    def wrapper(func):
+        signature = inspect.signature(func)
+        # The endpoint's own Request / Response parameters (@cached adds them), or injected ones
+        injected = []
+
+        def locate(name: str, annotation):
+            param = next((p for p in signature.parameters.values() if p.annotation is annotation), None)
+            if param is None:
+                param = inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation)
+                injected.append(param)
+            return param
+
+        request_param = locate("__columnar_request", Request)
+        response_param = locate("__columnar_response", Response)
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request: Request = kwargs[request_param.name]
+            response: Response = kwargs[response_param.name]
+            for param in injected:
+                del kwargs[param.name]
+            result = await func(*args, **kwargs)
+            media_type = preferred_format(request.headers.get("accept"))
+            # A NanSafeJSONResponse still holds the endpoint's data; other responses (a 304) are final
+            final = isinstance(result, Response) and not isinstance(result, NanSafeJSONResponse)
+            if media_type is None or final:
+                _vary_on_accept(result if isinstance(result, Response) else response)
+                return result
+
+            with request_timer("serialize"):
+                # NanSafeJSONResponse content is JSON-ready for render_json: no encoder copy
+                data = result.content if isinstance(result, NanSafeJSONResponse) else jsonable_encoder(result)
+                key = rows_key or ("items" if isinstance(data, dict) else None)
+                if key is not None and not (isinstance(data, dict) and isinstance(data.get(key), list)):
+                    _vary_on_accept(response)
+                    return result # e.g. an {"error": ...} result
+                rows = data[key] if key is not None else data
+                dates, values = to_columns(rows, date_field, value_fields)
+                if media_type == ARROW_STREAM:
+                    encoded = Response(arrow_ipc(dates, values, value_fields), media_type=ARROW_STREAM)
+                elif media_type == PACKED_F32:
+                    encoded = Response(packed_f32(dates, values, value_fields), media_type=PACKED_F32)
+                else:
+                    columns = columns_json(dates, values, value_fields)
+                    if key is not None:
+                        columns = {**data, key: columns}
+                    encoded = None
+            if encoded is None:
+                # Rendering the JSON body records its own serialize time
+                encoded = NanSafeJSONResponse(columns, media_type=COLUMNS_JSON)
+            # The headers @cached set on the endpoint's response (not applied to a returned Response)
+            for header, value in response.headers.items():
+                if header not in ("content-length", "content-type"):
+                    encoded.headers[header] = value
+            _vary_on_accept(encoded)
+            return encoded
+
+        if injected:
+            parameters = list(signature.parameters.values())
+            inner.__signature__ = signature.replace(parameters=[*parameters, *injected])
+        return inner
+    return wrapper
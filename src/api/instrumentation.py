@@ -0,0 +1,38 @@
+import time
+
+from src.shared.metrics import HTTP_DB_SECONDS, HTTP_REQUEST_SECONDS, HTTP_SERIALIZE_SECONDS, request_timings
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording each request's latency per route template, and how
+    much of it went to database calls and to encoding the response body.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        with request_timings() as timings:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # The router stores the matched route in the scope; unmatched paths share one label
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+                HTTP_DB_SECONDS.labels(route).observe(timings["db"])
+                HTTP_SERIALIZE_SECONDS.labels(route).observe(timings["serialize"])
@@ -1,68 +1,73 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from typing import List, Optional, Any
+from sqlalchemy import select
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple, Union
 from datetime import date
-import math
-import json
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from contextlib import asynccontextmanager
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
 import redis.asyncio as redis
-import os
-import sys
-
-sys.path.append('/app')
-
-from src.shared.database import get_db, init_db
-from src.shared.models import Rate, GoldPrice, Signal, JobLog, Currency
-from src.shared.backtester import Backtester
 import pandas as pd
 import os
 import sys
 
 sys.path.append('/app')
 
-from src.shared.database import get_db, init_db
-from src.shared.models import Rate, GoldPrice, Signal, JobLog, Currency
+from src.shared.database import engine, get_db, pool_stats, release_connection
+from src.shared.events import INGEST_CHANNEL, add_events, stream_key
+from src.shared.metrics import BACKTEST_SECONDS, METRICS_CONTENT_TYPE, METRICS_ENABLED, register_collector, render_metrics, timer
+from src.shared.migrations import wait_for_schema
+from src.shared.models import AssetCoverage, Rate, GoldPrice, Signal, JobLog, Currency, ForecastModel
+from src.api.responses import NanSafeJSONResponse, render_json
+from src.api.columnar import columnar
+from src.api.instrumentation import RequestMetricsMiddleware
+from src.api.pagination import EXPORT_FORMATS, InvalidCursor, Keyset, fetch_page, stream_rows
+from src.api.cache import (
+    CORRELATION, CURRENCIES, GOLD, PREDICT, RATES, SEASONALITY,
+    TieredBackend, cached, listen_for_invalidations,
+)
+from src.shared.backtester import Backtester
+from src.shared.history import count_rows_until, load_price_history, load_price_matrix
+from src.shared.sweep import expand_grid, rank_results, run_sweep_chunk, split_combinations
+from src.shared.forecasting import MIN_FORECAST_ROWS, forecast, load_model, stored_model_date
+from src.shared.snapshots import (
+    ALL_ASSETS, CORRELATION_ASSETS, CORRELATION_WINDOWS, FULL_HISTORY,
+    correlation_matrix, get_snapshot, latest_data_date, monthly_returns, rolling_correlation,
+)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+SWEEP_MAX_COMBINATIONS = int(os.getenv("SWEEP_MAX_COMBINATIONS", "20000"))
+# Seconds /predict clients are told to wait while the brain fits a missing model
+FORECAST_RETRY_SECONDS = int(os.getenv("FORECAST_RETRY_SECONDS", "30"))
 
-
-def _sanitize_nan(obj: Any) -> Any:
-    """Recursively replace NaN/Inf floats with None so JSON serialization succeeds."""
-    if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-        return None
-    if isinstance(obj, dict):
-        return {k: _sanitize_nan(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_sanitize_nan(v) for v in obj]
-    return obj
+logger = logging.getLogger("api")
 
 
-class NanSafeJSONResponse(JSONResponse):
-    """JSONResponse subclass that converts NaN/Inf to null before serialization."""
-
-    def render(self, content: Any) -> bytes:
-        return json.dumps(
-            _sanitize_nan(content),
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    await wait_for_schema(engine)
     redis_client = redis.from_url(REDIS_URL, encoding="utf8") # Removed decode_responses=True
-    FastAPICache.init(RedisBackend(redis_client), prefix="fastapi-cache")
+    app.state.redis = redis_client
+    backend = TieredBackend(redis_client)
+    FastAPICache.init(backend, prefix="fastapi-cache")
+    register_collector("cache", backend.metric_families)
+    listeners = [
+        asyncio.create_task(listen_for_invalidations(app, redis_client)),
+        asyncio.create_task(backend.listen()),
+    ]
     yield
     # Shutdown
+    for task in listeners:
+        task.cancel()
 
 app = FastAPI(title="Charon API", lifespan=lifespan, default_response_class=NanSafeJSONResponse)
 
@@ -73,73 +78,208 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware)
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 @app.get("/currencies")
-@cache(expire=3600)
+@cached(CURRENCIES)
 async def get_currencies(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Currency).where(Currency.active == True))
     return result.scalars().all()
 
+# Keyset (seek) pagination keys, newest first
+RATES_KEYSET = Keyset("rates", Rate.effective_date, Rate.id)
+GOLD_KEYSET = Keyset("gold", GoldPrice.effective_date, GoldPrice.id)
+SIGNALS_KEYSET = Keyset("signals", Signal.generated_at, Signal.id)
+JOBS_KEYSET = Keyset("jobs", JobLog.started_at, JobLog.id)
+
+CURSOR_DESCRIPTION = "Opaque cursor (next_cursor of the previous page); switches the response to {items, next_cursor}"
+PAGINATE_DESCRIPTION = "Return the first page as {items, next_cursor}"
+
+
+async def _list_or_page(db: AsyncSession, query, keyset: Keyset, limit: int, cursor: Optional[str], paginate: bool):
+    """
+    Plain list of the newest `limit` rows (the original response), or a keyset page
+    when a cursor is given or pagination is requested.
+    """
+    try:
+        page = await fetch_page(db, query, keyset, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await release_connection(db)
+    return page if cursor or paginate else page["items"]
+
+
+def _rates_query(code: str, start_date: Optional[date], end_date: Optional[date], entity=Rate):
+    query = select(entity).where(Rate.currency_code == code)
+    if start_date:
+        query = query.where(Rate.effective_date >= start_date)
+    if end_date:
+        query = query.where(Rate.effective_date <= end_date)
+    return query
+
+
 @app.get("/rates")
-@cache(expire=60)
+@columnar("effective_date", ["rate_mid"])
+@cached(RATES, asset_param="code")
 async def get_rates(
     code: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    paginate: bool = Query(False, description=PAGINATE_DESCRIPTION),
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(Rate).where(Rate.currency_code == code).order_by(desc(Rate.effective_date))
-    
-    if start_date:
-        query = query.where(Rate.effective_date >= start_date)
-    if end_date:
-        query = query.where(Rate.effective_date <= end_date)
-        
-    query = query.limit(limit)
-    
-    result = await db.execute(query)
-    return result.scalars().all()
+    query = _rates_query(code, start_date, end_date)
+    return await _list_or_page(db, query, RATES_KEYSET, limit, cursor, paginate)
 
 @app.get("/gold")
-@cache(expire=60)
+@columnar("effective_date", ["price"])
+@cached(GOLD, asset="GOLD")
 async def get_gold(
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    paginate: bool = Query(False, description=PAGINATE_DESCRIPTION),
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(GoldPrice).order_by(desc(GoldPrice.effective_date)).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    return await _list_or_page(db, select(GoldPrice), GOLD_KEYSET, limit, cursor, paginate)
 
 @app.get("/signals")
 async def get_signals(
     asset_code: Optional[str] = None,
-    limit: int = 20,
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    paginate: bool = Query(False, description=PAGINATE_DESCRIPTION),
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(Signal).order_by(desc(Signal.generated_at))
+    query = select(Signal)
     if asset_code:
         query = query.where(Signal.asset_code == asset_code)
-    
-    query = query.limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    return await _list_or_page(db, query, SIGNALS_KEYSET, limit, cursor, paginate)
 
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 @app.get("/stats/miner")
 async def get_miner_stats(
-    limit: int = 10,
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    paginate: bool = Query(False, description=PAGINATE_DESCRIPTION),
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(JobLog).order_by(desc(JobLog.started_at)).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    return await _list_or_page(db, select(JobLog), JOBS_KEYSET, limit, cursor, paginate)
+
+@app.get("/stats/coverage")
+async def get_coverage_stats(
+    source: Optional[str] = Query(None, description="Miner source: rates, rates_b, rates_c or gold"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Data coverage per miner source and asset against the NBP publication calendar, as
+    of the miner's last gap repair: publication days (weeks for weekly sources)
+    expected, stored and missing, the missing date ranges, and the days NBP has no
+    data for. Each source's own figures count the days missing for all its assets.
+    """
+    query = select(AssetCoverage).order_by(AssetCoverage.source, AssetCoverage.asset_code)
+    if source:
+        query = query.where(AssetCoverage.source == source)
+    rows = (await db.execute(query)).scalars().all()
+    await release_connection(db)
+
+    sources: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        stats = {
+            "first_date": row.first_date,
+            "last_date": row.last_date,
+            "expected": row.expected_count,
+            "stored": row.stored_count,
+            "missing": row.missing_count,
+            "coverage_pct": round(100 * (1 - row.missing_count / row.expected_count), 2) if row.expected_count else None,
+            "missing_ranges": row.missing_ranges or [],
+            "no_data": row.no_data or [],
+            "updated_at": row.updated_at,
+        }
+        entry = sources.setdefault(row.source, {"assets": {}})
+        if row.asset_code:
+            entry["assets"][row.asset_code] = stats
+        else:
+            entry.update(stats)
+    if source and not sources:
+        raise HTTPException(status_code=404, detail=f"No coverage for source {source}")
+    return sources
+
+@app.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", description="ndjson or csv"),
+    code: Optional[str] = Query(None, description="rates: currency code (required); signals: asset code"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Streams a whole table (rates, gold, signals or jobs), oldest first, as NDJSON or CSV.
+    Rows are written as they are read from a server-side cursor.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format: {format}")
+
+    if dataset == "rates":
+        if not code:
+            raise HTTPException(status_code=400, detail="code is required for rates")
+        query = _rates_query(code.upper(), start_date, end_date, entity=Rate.__table__).order_by(Rate.effective_date, Rate.id)
+    elif dataset == "gold":
+        query = select(GoldPrice.__table__).order_by(GoldPrice.effective_date, GoldPrice.id)
+        if start_date:
+            query = query.where(GoldPrice.effective_date >= start_date)
+        if end_date:
+            query = query.where(GoldPrice.effective_date <= end_date)
+    elif dataset == "signals":
+        query = select(Signal.__table__).order_by(Signal.generated_at, Signal.id)
+        if code:
+            query = query.where(Signal.asset_code == code.upper())
+    elif dataset == "jobs":
+        query = select(JobLog.__table__).order_by(JobLog.started_at, JobLog.id)
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset}")
+
+    return StreamingResponse(
+        stream_rows(query, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'},
+    )
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """
+    Hit / miss counters per cache tier of this API worker.
+    """
+    backend = FastAPICache.get_backend()
+    if not isinstance(backend, TieredBackend):
+        raise HTTPException(status_code=404, detail="Tiered cache is not enabled")
+    return backend.stats()
+
+@app.get("/stats/db")
+async def get_db_pool_stats():
+    """
+    Connection pool of this API worker: profile, connections in use, checkout
+    wait times, overflow connections and checkout timeouts.
+    """
+    return pool_stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Prometheus metrics of this API worker: request latency per endpoint (with its
+    DB and serialize share), cache hits per tier, connection pool, backtest durations.
+    """
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/stats/upcoming")
 async def get_upcoming_jobs():
@@ -168,75 +308,234 @@ async def get_upcoming_jobs():
     }
 
 @app.post("/backtest")
+@columnar("date", ["equity", "drawdown"], rows_key="equity_curve")
 async def run_backtest(
     asset_code: str = Query(..., description="Currency code (e.g. USD) or 'GOLD'"),
     initial_capital: float = 10000.0,
+    mode: str = Query("full", description="'full' (single pass over the whole history) or 'walk_forward'"),
+    train_days: int = Query(252, ge=1, description="walk_forward: in-sample bars before each test window"),
+    test_days: int = Query(63, ge=1, description="walk_forward: bars per out-of-sample test window"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Runs a backtest simulation for the specified asset using the current strategy.
+    mode=walk_forward reports rolling train/test windows and aggregate out-of-sample metrics.
     """
+    if mode not in ("full", "walk_forward"):
+        raise HTTPException(status_code=400, detail=f"Unknown backtest mode: {mode}")
+
     # 1. Fetch History
-    if asset_code.upper() == "GOLD":
-        stmt = select(GoldPrice).order_by(GoldPrice.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        # Normalize
-        df = pd.DataFrame([{'date': d.effective_date, 'price': float(d.price)} for d in data])
-    else:
-        stmt = select(Rate).where(Rate.currency_code == asset_code.upper()).order_by(Rate.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        df = pd.DataFrame([{'date': d.effective_date, 'price': float(d.rate_mid)} for d in data])
+    df = await load_price_history(db, asset_code)
+    await release_connection(db)
         
     if df.empty:
         raise HTTPException(status_code=404, detail=f"No data found for {asset_code}")
         
     # 2. Run Backtest
     backtester = Backtester(initial_capital=initial_capital)
-    results = backtester.run(df)
-    
-    return results
+    with timer(BACKTEST_SECONDS, mode=mode):
+        if mode == "walk_forward":
+            results = backtester.walk_forward(df, train_days=train_days, test_days=test_days)
+        else:
+            results = backtester.run(df)
+
+    # Returned as a response, the equity curve skips FastAPI's jsonable_encoder copy
+    return NanSafeJSONResponse(results)
+
+
+class SweepRequest(BaseModel):
+    asset_code: str = Field(..., description="Currency code (e.g. USD) or 'GOLD'")
+    initial_capital: float = 10000.0
+    # Strategy parameter -> values to try, e.g. {"rsi_window": [10, 14, 21], "adx_threshold": [20, 25, 30]}
+    grid: Dict[str, List[Union[int, float]]]
+    sort_by: str = "total_return_pct"
+    top: int = Field(50, ge=1)
+    stream: bool = False
+
+
+_sweep_executor: Optional[ProcessPoolExecutor] = None
+
+
+async def _sweep_batches(df: pd.DataFrame, combos: List[Dict[str, Any]], initial_capital: float) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Runs the combinations across the sweep process pool and yields
+    (combinations in batch, results) as each batch finishes. An exception raised
+    in a worker is raised here, and the remaining batches are cancelled.
+    """
+    global _sweep_executor
+    if _sweep_executor is None:
+        _sweep_executor = ProcessPoolExecutor(max_workers=SWEEP_WORKERS)
+
+    loop = asyncio.get_running_loop()
+    # A few batches per worker so partial results arrive early
+    batches = split_combinations(combos, SWEEP_WORKERS * 4)
+    futures = {
+        loop.run_in_executor(_sweep_executor, run_sweep_chunk, df, batch, initial_capital): len(batch)
+        for batch in batches
+    }
+    try:
+        with timer(BACKTEST_SECONDS, mode="sweep"):
+            pending = set(futures)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield futures[future], future.result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): the next sweep starts a new pool
+        _sweep_executor = None
+        raise
+    finally:
+        # Client went away: drop the batches that have not started yet
+        for future in futures:
+            future.cancel()
+
+
+def _ndjson_line(obj: Any) -> bytes:
+    return render_json(obj) + b"\n"
+
+
+@app.post("/backtest/sweep")
+async def run_backtest_sweep(request: SweepRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Grid search over strategy parameters: backtests every combination of the
+    given ranges in worker processes and ranks them by `sort_by`.
+    With stream=true, responds with NDJSON: one "progress" line per finished
+    batch (its results, best first) and a final "result" line with the ranking,
+    or an "error" line if a batch failed.
+    """
+    try:
+        combos = expand_grid(request.grid)
+        rank_results([], request.sort_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not combos:
+        raise HTTPException(status_code=400, detail="No valid parameter combinations")
+    if len(combos) > SWEEP_MAX_COMBINATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many combinations ({len(combos)}), the limit is {SWEEP_MAX_COMBINATIONS}"
+        )
+
+    code = request.asset_code.upper()
+    df = await load_price_history(db, code)
+    await release_connection(db)
+    if df.empty:
+        raise HTTPException(status_code=404, detail=f"No data found for {code}")
+
+    def summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "asset_code": code,
+            "combinations": len(combos),
+            "evaluated": len(results),
+            "sort_by": request.sort_by,
+            "results": rank_results(results, request.sort_by, request.top),
+        }
+
+    if not request.stream:
+        results = []
+        try:
+            async for _, batch in _sweep_batches(df, combos, request.initial_capital):
+                results.extend(batch)
+        except Exception as e:
+            logger.exception(f"Sweep for {code} failed")
+            raise HTTPException(status_code=500, detail=f"Sweep failed: {e}")
+        return summary(results)
+
+    async def ndjson():
+        results = []
+        processed = 0
+        try:
+            async for size, batch in _sweep_batches(df, combos, request.initial_capital):
+                processed += size
+                results.extend(batch)
+                yield _ndjson_line({
+                    "type": "progress",
+                    "processed": processed,
+                    "combinations": len(combos),
+                    "results": rank_results(batch, request.sort_by),
+                })
+        except Exception as e:
+            # The 200 status is already sent: end the stream with an error line
+            logger.exception(f"Sweep for {code} failed")
+            yield _ndjson_line({"type": "error", "processed": processed, "detail": f"Sweep failed: {e}"})
+            return
+        yield _ndjson_line({"type": "result", **summary(results)})
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 @app.get("/stats/correlation")
-@cache(expire=3600)
-async def get_correlation_matrix(db: AsyncSession = Depends(get_db)):
+@cached(CORRELATION)
+async def get_correlation_matrix(
+    assets: Optional[str] = Query(None, description="Comma-separated asset codes (default: Gold and top currencies)"),
+    window: int = Query(180, ge=2, description="Last N observations of each asset"),
+    rolling: Optional[int] = Query(None, ge=2, description="Also return pairwise correlation over a rolling window of this many days"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Calculates correlation matrix between Gold and Top currencies for the last 180 days
+    (or any asset list / window). The default assets and the standard windows, with
+    a standard rolling window up to `window`, are served from the brain's precomputed
+    snapshot; anything else, or a missing snapshot, is computed live from a single query.
+    With `rolling`, responds with {"matrix": ..., "rolling": {"window", "dates", "pairs"}}.
+    """
+    codes = [c.strip().upper() for c in assets.split(",") if c.strip()] if assets else CORRELATION_ASSETS
+    if not codes:
+        raise HTTPException(status_code=400, detail="No assets given")
+
+    if codes == CORRELATION_ASSETS and window in CORRELATION_WINDOWS:
+        snapshot = await get_snapshot(db, ALL_ASSETS, window)
+        data = snapshot.stats['data'] if snapshot is not None else {}
+        if rolling is None and data:
+            await release_connection(db)
+            return data['matrix']
+        if str(rolling) in data.get('rolling', {}):
+            await release_connection(db)
+            return {"matrix": data['matrix'], "rolling": data['rolling'][str(rolling)]}
+
+    dates, found, prices = await load_price_matrix(db, codes, tail=window)
+    await release_connection(db)
+    matrix = correlation_matrix(found, prices)
+    if rolling is None:
+        return matrix
+    return {"matrix": matrix, "rolling": rolling_correlation(found, dates, prices, rolling)}
+
+# Deserialized Prophet models by asset: (last data date, model)
+_forecast_models: Dict[str, Tuple[date, Any]] = {}
+
+
+async def _get_forecast_model(db: AsyncSession, code: str) -> Optional[Any]:
     """
-    Calculates correlation matrix between Gold and Top currencies for the last 180 days.
+    The stored model of an asset (deserialized once per fit), or None when the
+    brain has not fitted one yet.
     """
-    assets = ["GOLD", "USD", "EUR", "CHF", "GBP", "JPY", "CAD", "AUD", "NOK"]
-    merged_df = pd.DataFrame()
+    last_date = await stored_model_date(db, code)
+    if last_date is None:
+        return None
+    cached = _forecast_models.get(code)
+    if cached is not None and cached[0] == last_date:
+        return cached[1]
+
+    record = await db.get(ForecastModel, code)
+    await release_connection(db)
+    model = await asyncio.to_thread(load_model, record.model)
+    _forecast_models[code] = (record.last_date, model)
+    return model
 
-    for asset in assets:
-        if asset == "GOLD":
-            stmt = select(GoldPrice).order_by(GoldPrice.effective_date.desc()).limit(180)
-            result = await db.execute(stmt)
-            data = result.scalars().all()
-            df = pd.DataFrame([{'date': d.effective_date, asset: float(d.price)} for d in data])
-        else:
-            stmt = select(Rate).where(Rate.currency_code == asset).order_by(Rate.effective_date.desc()).limit(180)
-            result = await db.execute(stmt)
-            data = result.scalars().all()
-            df = pd.DataFrame([{'date': d.effective_date, asset: float(d.rate_mid)} for d in data])
-        
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-            if merged_df.empty:
-                merged_df = df
-            else:
-                merged_df = pd.merge(merged_df, df, on='date', how='inner')
-
-    if merged_df.empty:
-        return {}
-
-    # Drop date for correlation calc
-    corr_matrix = merged_df.drop(columns=['date']).corr()
-    
-    # Format for JSON response (dict of dicts)
-    return corr_matrix.to_dict()
+
+async def _request_forecast_model(code: str):
+    """
+    Asks the brain to fit a model for an asset, at most once per FORECAST_RETRY_SECONDS.
+    """
+    client = app.state.redis
+    try:
+        if await client.set(f"forecast:requested:{code}", 1, nx=True, ex=FORECAST_RETRY_SECONDS):
+            await add_events(client, stream_key(INGEST_CHANNEL), [{"type": "forecast", "codes": [code]}])
+    except Exception as e:
+        logger.error(f"Failed to request a forecast model for {code}: {e}")
 
 @app.get("/predict")
-@cache(expire=3600)
+@columnar("ds", ["yhat", "yhat_lower", "yhat_upper"])
+@cached(PREDICT, asset_param="asset_code")
 async def predict_future(
     asset_code: str = Query(..., description="Currency code (e.g. USD) or 'GOLD'"),
     days: int = 7,
@@ -244,81 +543,74 @@ async def predict_future(
 ):
     """
     Predicts future prices for the next X days using Facebook Prophet.
+    Serves from the model store (fitted by the brain after each ingest). When no
+    model is stored yet, the brain is asked to fit one and 503 is returned with
+    Retry-After; Prophet never runs inside a request.
     """
-    from prophet import Prophet
-    
-    # 1. Fetch History (last 2 years for better seasonality)
-    if asset_code.upper() == "GOLD":
-        stmt = select(GoldPrice).order_by(GoldPrice.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        df = pd.DataFrame([{'ds': d.effective_date, 'y': float(d.price)} for d in data])
-    else:
-        stmt = select(Rate).where(Rate.currency_code == asset_code.upper()).order_by(Rate.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        df = pd.DataFrame([{'ds': d.effective_date, 'y': float(d.rate_mid)} for d in data])
-
-    if len(df) < 30:
-        raise HTTPException(status_code=400, detail="Not enough data for prediction")
-
-    # Prophet expects 'ds' to be datetime naive
-    df['ds'] = pd.to_datetime(df['ds']).dt.tz_localize(None)
-
-    # 2. Train Model
-    m = Prophet(daily_seasonality=False) # NBP is daily anyway
-    m.fit(df)
-
-    # 3. Forecast
-    future = m.make_future_dataframe(periods=days)
-    forecast = m.predict(future)
-
-    # Return only the future part
-    predictions = forecast.iloc[-days:][['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
-    
-    return predictions.to_dict(orient='records')
+    code = asset_code.upper()
+    model = await _get_forecast_model(db, code)
+    if model is None:
+        rows = (await count_rows_until(db, {code: date.max}))[code]
+        await release_connection(db)
+        if rows < MIN_FORECAST_ROWS:
+            raise HTTPException(status_code=400, detail="Not enough data for prediction")
+        await _request_forecast_model(code)
+        raise HTTPException(
+            status_code=503, detail=f"Forecast model for {code} is being prepared; retry later",
+            headers={"Retry-After": str(FORECAST_RETRY_SECONDS)},
+        )
+    await release_connection(db)
+
+    return await asyncio.to_thread(forecast, model, days)
 
 @app.get("/stats/seasonality")
-@cache(expire=3600)
+@cached(SEASONALITY, asset_param="asset_code")
 async def get_seasonality(
     asset_code: str = Query(..., description="Currency code or 'GOLD'"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Calculates monthly returns heat map data.
+    Served from the brain's precomputed snapshot; computed live only when it is missing.
     """
+    snapshot = await get_snapshot(db, asset_code, FULL_HISTORY)
+    if snapshot is not None:
+        await release_connection(db)
+        return snapshot.stats['data']
+
     # 1. Fetch Full History
-    if asset_code.upper() == "GOLD":
-        stmt = select(GoldPrice).order_by(GoldPrice.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        df = pd.DataFrame([{'date': d.effective_date, 'price': float(d.price)} for d in data])
-    else:
-        stmt = select(Rate).where(Rate.currency_code == asset_code.upper()).order_by(Rate.effective_date.asc())
-        result = await db.execute(stmt)
-        data = result.scalars().all()
-        df = pd.DataFrame([{'date': d.effective_date, 'price': float(d.rate_mid)} for d in data])
+    df = await load_price_history(db, asset_code)
+    await release_connection(db)
         
     if df.empty:
         raise HTTPException(status_code=404, detail="No data")
 
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month
-    
-    # Resample to monthly closing price to calculate monthly return
-    # Group by Year-Month, take the LAST price of the month
-    monthly_df = df.sort_values('date').groupby(['year', 'month']).last().reset_index()
-    
-    # Calculate Percentage Change
-    monthly_df['pct_change'] = monthly_df['price'].pct_change() * 100
-    
-    # Pivot for Heatmap: Index=Year, Columns=Month, Values=PctChange
-    pivot_df = monthly_df.pivot(index='year', columns='month', values='pct_change')
-    
-    # Fill NaN (first month usually) with 0
-    pivot_df = pivot_df.fillna(0)
-    
-    # Return structure suitable for frontend reconstruction
-    # reset_index to keep year as column
-    return pivot_df.reset_index().to_dict(orient='records')
+    return monthly_returns(df)
+
+@app.get("/stats/snapshot")
+async def get_analysis_snapshot(
+    asset_code: str = Query(..., description="Currency code, 'GOLD', or '*' for cross-asset snapshots"),
+    window_days: int = Query(90, description="Window in days; 0 = full history"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns a precomputed analysis snapshot with its schema version and staleness metadata.
+    """
+    code = asset_code.upper()
+    snapshot = await get_snapshot(db, code, window_days)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot for {code} ({window_days} days)")
+
+    data_until = date.fromisoformat(snapshot.stats['data_until'])
+    latest = await latest_data_date(db, code)
+    return {
+        "asset_code": snapshot.asset_code,
+        "window_days": snapshot.window_days,
+        "kind": snapshot.stats['kind'],
+        "schema_version": snapshot.stats['schema_version'],
+        "generated_at": snapshot.generated_at,
+        "data_until": data_until,
+        "latest_data_date": latest,
+        "stale": latest is not None and data_until < latest,
+        "stats": snapshot.stats['data'],
+    }
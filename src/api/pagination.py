@@ -0,0 +1,129 @@
+import base64
+import csv
+import enum
+import io
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlalchemy import desc, inspect as sa_inspect, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from src.shared.database import AsyncSessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Keyset:
+    """
+    Seek pagination over a unique, descending sort key (e.g. effective_date, id).
+    Cursors are opaque url-safe strings holding the key of the last row served,
+    tagged with the keyset name so a cursor cannot be replayed on another endpoint.
+    """
+
+    def __init__(self, name: str, *columns):
+        self.name = name
+        self.columns = columns
+
+    def order(self, stmt: Select) -> Select:
+        return stmt.order_by(*(desc(c) for c in self.columns))
+
+    def after(self, stmt: Select, cursor: str) -> Select:
+        return stmt.where(tuple_(*self.columns) < tuple_(*self.decode(cursor)))
+
+    def encode(self, obj: Any) -> str:
+        values = [getattr(obj, c.key) for c in self.columns]
+        raw = json.dumps([self.name] + [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            name, values = raw[0], raw[1:]
+            if name != self.name or len(values) != len(self.columns):
+                raise ValueError
+            return [self._parse(c, v) for c, v in zip(self.columns, values)]
+        except (ValueError, TypeError, IndexError):
+            raise InvalidCursor(f"Invalid cursor for {self.name}")
+
+    @staticmethod
+    def _parse(column, value):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+        return python_type(value)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def as_records(objs: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    ORM objects as dicts of JSON-ready column values (the same JSON as before),
+    so response and cache encoding do not walk the ORM objects.
+    """
+    if not objs:
+        return []
+    keys = [attr.key for attr in sa_inspect(type(objs[0])).column_attrs]
+    return [{key: _plain(getattr(obj, key)) for key in keys} for obj in objs]
+
+
+async def fetch_page(db: AsyncSession, stmt: Select, keyset: Keyset, limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    One page of ORM rows as records: {"items": [...], "next_cursor": str | None}.
+    Reads limit + 1 rows to know whether another page exists.
+    """
+    stmt = keyset.order(stmt)
+    if cursor:
+        stmt = keyset.after(stmt, cursor)
+    rows = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    items = rows[:limit]
+    next_cursor = keyset.encode(items[-1]) if len(rows) > limit else None
+    return {"items": as_records(items), "next_cursor": next_cursor}
+
+
+async def stream_rows(stmt: Select, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Streams a Core select as NDJSON or CSV, reading it through a server-side
+    cursor in batches of EXPORT_BATCH_SIZE, so memory stays flat whatever the size.
+    Uses its own session: the response body outlives the request's dependencies.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns: Sequence[str] = list(result.keys())
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode("utf-8")
+
+        async for batch in result.partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([_plain(v) for v in row] for row in batch)
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n" for row in batch
+                ).encode("utf-8")
@@ -0,0 +1,104 @@
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+from src.shared.metrics import request_timer
+
+try:
+    import orjson
+except ImportError: # optional: falls back to the standard library encoder
+    orjson = None
+
+
+def _sanitize_nan(obj: Any) -> Any:
+    """Recursively replace NaN/Inf floats with None so JSON serialization succeeds."""
+    if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+        return None
+    if isinstance(obj, dict):
+        return {k: _sanitize_nan(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize_nan(v) for v in obj]
+    return obj
+
+
+def _masked(values: np.ndarray) -> List[Any]:
+    """
+    An array as a JSON-ready list, with missing values (NaN, Inf, NaT, None) masked
+    to None in one vectorized pass. Datetimes become ISO strings.
+    """
+    if values.dtype.kind == "f":
+        out = values.astype(object)
+        out[~np.isfinite(values)] = None
+        return out.tolist()
+    if values.dtype.kind == "M":
+        out = np.datetime_as_string(values, unit="s").astype(object)
+        out[np.isnat(values)] = None
+        return out.tolist()
+    if values.dtype.kind == "O":
+        out = values.copy()
+        out[pd.isna(values)] = None
+        return [_default(v) if isinstance(v, (np.generic, Decimal)) else v for v in out.tolist()]
+    return values.tolist()
+
+
+def _default(obj: Any) -> Any:
+    """
+    Encoder hook for what JSON has no type for: NumPy / pandas data is converted
+    column-wise without a per-element Python copy of the whole payload.
+    """
+    if isinstance(obj, pd.DataFrame):
+        names = [str(c) for c in obj.columns]
+        columns = [_masked(obj[c].to_numpy()) for c in obj.columns]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return _masked(obj.to_numpy())
+    if isinstance(obj, np.ndarray):
+        return _masked(obj)
+    if isinstance(obj, np.datetime64):
+        return None if np.isnat(obj) else pd.Timestamp(obj).isoformat()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def render_json(content: Any) -> bytes:
+    """
+    Compact JSON with NaN/Inf as null. NumPy arrays, pandas objects, dates and
+    Decimals are accepted as is.
+
+    With orjson, NaN/Inf and arrays are handled natively during encoding. The
+    standard library fallback encodes strictly first and only builds a sanitized
+    copy when the payload really holds NaN/Inf floats outside of arrays.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+    options = dict(default=_default, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+    try:
+        return json.dumps(content, **options).encode("utf-8")
+    except ValueError:
+        return json.dumps(_sanitize_nan(content), **options).encode("utf-8")
+
+
+class NanSafeJSONResponse(JSONResponse):
+    """JSONResponse subclass that writes NaN/Inf as null and serializes arrays / DataFrames directly."""
+
+    def __init__(self, content: Any, *args, **kwargs):
+        # Endpoints return it to skip FastAPI's jsonable_encoder copy; @columnar re-encodes the content
+        self.content = content
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        with request_timer("serialize"):
+            return render_json(content)
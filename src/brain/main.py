@@ -4,22 +4,46 @@ import math
 import os
 import sys
 import json
-import pandas as pd
-from sqlalchemy import select, desc
-from sqlalchemy.ext.asyncio import AsyncSession
-import redis.asyncio as redis
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import select, insert
 
 sys.path.append('/app')
 
-from src.shared.database import init_db, AsyncSessionLocal
-from src.shared.models import Rate, GoldPrice, Signal, SignalType, AssetType
-from src.shared.analysis import TechnicalAnalyzer
+from src.shared.database import engine, AsyncSessionLocal
+from src.shared.events import EVENT_CLAIM_IDLE_MS, INGEST_CHANNEL, RefreshQueue, StreamConsumer, coalesce, connect, stream_key
+from src.shared.metrics import (
+    BRAIN_ANALYSES, BRAIN_ANALYSES_SAVED, BRAIN_EVENTS, BRAIN_WINDOW_EVENTS, EVENT_TO_SIGNAL_SECONDS,
+    INDICATOR_SECONDS, inc, observe, serve_metrics,
+)
+from src.shared.migrations import wait_for_schema
+from src.shared.models import Signal, SignalType, AssetType, IndicatorState, ForecastModel
+from src.shared.history import GOLD_CODE, load_price_histories, count_rows_until
+from src.shared.incremental import IncrementalIndicators, advance_states
+from src.shared.forecasting import refresh_forecast_model, stored_model_date
+from src.shared.snapshots import CORRELATION_ASSETS, build_asset_snapshots, build_correlation_snapshots
+from src.shared.retention import apply_signal_retention
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("brain")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-REDIS_CHANNEL = "rates.ingested"
+# Consumer group of the brain replicas on the ingest stream (src/shared/events.py)
+BRAIN_GROUP = os.getenv("BRAIN_GROUP", "brain")
+# Events arriving within this many seconds of the first one are analyzed together,
+# once per asset (backfills, imports fired close together); 0 disables the window
+BRAIN_COALESCE_SECONDS = float(os.getenv("BRAIN_COALESCE_SECONDS", "5"))
+# A window is closed early once it holds this many events
+BRAIN_COALESCE_MAX_EVENTS = int(os.getenv("BRAIN_COALESCE_MAX_EVENTS", "1000"))
+# Announces rebuilt snapshots / forecast models (the API evicts its cached responses)
+ANALYSIS_CHANNEL = "analysis.refreshed"
+BRAIN_WORKERS = int(os.getenv("BRAIN_WORKERS", "2"))
+# Assets whose forecast models are kept fitted even before anyone requested them
+FORECAST_PRELOAD = [c.strip().upper() for c in os.getenv("FORECAST_PRELOAD", "GOLD,USD,EUR").split(",") if c.strip()]
+FORECAST_REFRESH_SECONDS = int(os.getenv("FORECAST_REFRESH_SECONDS", "21600"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "86400"))
 
 def _to_safe_float(value) -> float | None:
     """Convert a value to float and replace NaN/Inf with None.
@@ -35,167 +59,277 @@ def _to_safe_float(value) -> float | None:
 
 class BrainService:
     def __init__(self):
-        self.analyzer = TechnicalAnalyzer()
-        self.redis = redis.from_url(REDIS_URL)
+        self.redis = connect(REDIS_URL)
+        self.events = StreamConsumer(self.redis, stream_key(INGEST_CHANNEL), BRAIN_GROUP)
+        if BRAIN_COALESCE_SECONDS * 1000 >= EVENT_CLAIM_IDLE_MS:
+            logger.warning("BRAIN_COALESCE_SECONDS reaches EVENT_CLAIM_IDLE_MS; other replicas will take over buffered events")
+        # Indicator updates (full rebuilds especially) are CPU-bound; keep them off the event loop
+        self.executor = ProcessPoolExecutor(max_workers=BRAIN_WORKERS)
+        # Prophet fits take seconds each; a separate pool keeps them from delaying signals
+        self.forecast_executor = ProcessPoolExecutor(max_workers=1)
+        self._background = set()
+        # One snapshot and one forecast refresh in flight; later windows' codes wait for the next run
+        self.snapshot_refreshes = RefreshQueue("Snapshot", lambda batch: self.refresh_snapshots(list(batch)))
+        self.forecast_refreshes = RefreshQueue("Forecast", self._refresh_forecast_batch)
 
-    async def process_currency(self, code: str):
-        logger.info(f"Analyzing currency: {code}")
+    async def process_assets(self, asset_type: AssetType, codes: List[str]):
+        """
+        Batch mode: loads indicator states and new rows for all assets with a
+        constant number of queries, advances the states in a worker process and
+        writes all signals with one bulk insert. Assets whose state is missing,
+        from an older version, or stale (history was backfilled before its last
+        date) are rebuilt from their full history.
+        """
+        codes = list(dict.fromkeys(c.upper() for c in codes))
+        logger.info(f"Analyzing {asset_type.value}: {', '.join(codes)}")
         async with AsyncSessionLocal() as session:
-            # Fetch last 100 days to ensure enough data for EMA26
-            stmt = select(Rate).where(Rate.currency_code == code).order_by(Rate.effective_date.asc())
-            result = await session.execute(stmt)
-            rates = result.scalars().all()
-            
-            if not rates or len(rates) < 26:
-                logger.warning(f"Not enough data for {code} to calculate MACD")
-                return
+            result = await session.execute(select(IndicatorState).where(IndicatorState.asset_code.in_(codes)))
+            records = {r.asset_code: r for r in result.scalars()}
 
-            df = pd.DataFrame([{
-                'date': r.effective_date,
-                'price': float(r.rate_mid)
-            } for r in rates])
-            
-            macd_df = self.analyzer.calculate_macd(df['price'])
-            rsi_series = self.analyzer.calculate_rsi(df['price'])
-            sma_series = self.analyzer.calculate_sma(df['price'], window=50)
-            bb_df = self.analyzer.calculate_bollinger_bands(df['price'])
-            adx_series = self.analyzer.calculate_adx(df)
-            
-            # Weekly Trend
-            df_weekly = self.analyzer.resample_to_weekly(df)
-            curr_weekly_trend = self.analyzer.get_weekly_trend(df_weekly)
-            
-            # Check the last row for the latest signal
-            current_idx = -1
-            prev_idx = -2
-            
-            curr_hist = macd_df.iloc[current_idx]['hist']
-            prev_hist = macd_df.iloc[prev_idx]['hist']
-            curr_rsi = float(rsi_series.iloc[current_idx])
-            curr_price = float(df.iloc[current_idx]['price'])
-            curr_sma = float(sma_series.iloc[current_idx])
-            curr_bb_lower = float(bb_df.iloc[current_idx]['bb_lower'])
-            curr_bb_upper = float(bb_df.iloc[current_idx]['bb_upper'])
-            curr_adx = float(adx_series.iloc[current_idx])
-            
-            signal_decision = self.analyzer.determine_signal(
-                curr_hist, prev_hist, curr_rsi, curr_price, curr_sma, curr_bb_lower, curr_bb_upper, curr_adx, curr_weekly_trend
-            )
-            
-            # Save signal
-            new_signal = Signal(
-                asset_type=AssetType.CURRENCY,
-                asset_code=code,
-                signal=SignalType(signal_decision),
-                macd=_to_safe_float(macd_df.iloc[current_idx]['macd']),
-                signal_line=_to_safe_float(macd_df.iloc[current_idx]['signal']),
-                histogram=_to_safe_float(curr_hist),
-                rsi=_to_safe_float(curr_rsi),
-                adx=_to_safe_float(curr_adx),
-                weekly_trend=curr_weekly_trend,
-                price_at_signal=_to_safe_float(df.iloc[current_idx]['price']),
-                horizon_days=1 
+            candidates = {
+                code: r.last_date for code, r in records.items()
+                if r.version == IncrementalIndicators.VERSION
+            }
+            counts = await count_rows_until(session, candidates)
+            fresh = {code: records[code] for code in candidates if counts[code] == records[code].row_count}
+            for code in records.keys() - fresh.keys():
+                logger.info(f"Indicator state for {code} is stale; rebuilding")
+
+            histories = await load_price_histories(
+                session, codes, after={code: r.last_date for code, r in fresh.items()}
             )
-            
-            session.add(new_signal)
+            jobs = {
+                code: (fresh[code].state if code in fresh else None, dates.tolist(), prices.tolist())
+                for code, (dates, prices) in histories.items()
+            }
+
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, advance_states, jobs)
+
+            signals = []
+            for code, (state, values, decision, seconds) in results.items():
+                observe(INDICATOR_SECONDS, seconds, asset=code)
+                if state['count'] == 0:
+                    logger.warning(f"No data for {code}")
+                    continue
+
+                record = records.get(code)
+                if record is None:
+                    record = IndicatorState(asset_code=code)
+                    session.add(record)
+                record.version = IncrementalIndicators.VERSION
+                record.last_date = date.fromisoformat(state['last_date'])
+                record.row_count = state['count']
+                record.state = state
+
+                if decision is None:
+                    logger.warning(f"Not enough data for {code} to calculate MACD")
+                    continue
+
+                signals.append({
+                    'asset_type': asset_type,
+                    'asset_code': code,
+                    'signal': SignalType(decision),
+                    'macd': _to_safe_float(values['macd']),
+                    'signal_line': _to_safe_float(values['signal']),
+                    'histogram': _to_safe_float(values['hist']),
+                    'rsi': _to_safe_float(values['rsi']),
+                    'adx': _to_safe_float(values['adx']),
+                    'weekly_trend': values['weekly_trend'],
+                    'price_at_signal': _to_safe_float(values['price']),
+                    'horizon_days': 1 if asset_type == AssetType.CURRENCY else 0,
+                })
+                logger.info(f"Signal generated for {code}: {decision}")
+
+            if signals:
+                await session.execute(insert(Signal), signals)
             await session.commit()
-            logger.info(f"Signal generated for {code}: {signal_decision}")
+
+    async def process_currency(self, code: str):
+        await self.process_assets(AssetType.CURRENCY, [code])
 
     async def process_gold(self):
-        logger.info("Analyzing Gold")
+        await self.process_assets(AssetType.GOLD, [GOLD_CODE])
+
+    async def refresh_forecasts(self, codes: List[str], requested: bool = False):
+        """
+        Refits forecast models for the given assets that are in the model store
+        (someone asked for them) or in FORECAST_PRELOAD, or for all of them when
+        the API requested them. Runs in the background.
+        """
+        codes = [c.upper() for c in codes]
+        refitted = []
         async with AsyncSessionLocal() as session:
-            stmt = select(GoldPrice).order_by(GoldPrice.effective_date.asc())
-            result = await session.execute(stmt)
-            prices = result.scalars().all()
-            
-            if not prices or len(prices) < 26:
+            result = await session.execute(select(ForecastModel.asset_code).where(ForecastModel.asset_code.in_(codes)))
+            stored = set(result.scalars())
+            for code in codes:
+                if not requested and code not in stored and code not in FORECAST_PRELOAD:
+                    continue
+                try:
+                    previous = await stored_model_date(session, code)
+                    record = await refresh_forecast_model(session, code, self.forecast_executor)
+                    if record is not None and record.last_date != previous:
+                        refitted.append(code)
+                except Exception as e:
+                    await session.rollback()
+                    logger.error(f"Forecast model refresh failed for {code}: {e}")
+
+        if refitted:
+            await self.publish_event(ANALYSIS_CHANNEL, {"type": "forecasts", "codes": refitted})
+
+    async def _refresh_forecast_batch(self, batch: Dict[str, bool]):
+        # Codes flagged by forecast_refreshes were requested by the API
+        scheduled = [code for code, requested in batch.items() if not requested]
+        requested = [code for code, requested in batch.items() if requested]
+        if scheduled:
+            await self.refresh_forecasts(scheduled)
+        if requested:
+            await self.refresh_forecasts(requested, requested=True)
+
+    async def refresh_snapshots(self, codes: List[str]):
+        """
+        Materializes AnalysisSnapshot rows (monthly returns, window stats and, when a
+        correlated asset changed, the correlation matrices) for the API to serve.
+        """
+        codes = [c.upper() for c in codes]
+        async with AsyncSessionLocal() as session:
+            try:
+                for code in codes:
+                    await build_asset_snapshots(session, code)
+                if any(code in CORRELATION_ASSETS for code in codes):
+                    await build_correlation_snapshots(session)
+                await session.commit()
+                logger.info(f"Analysis snapshots refreshed for {', '.join(codes)}")
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Snapshot refresh failed: {e}")
                 return
 
-            df = pd.DataFrame([{
-                'date': p.effective_date,
-                'price': float(p.price)
-            } for p in prices])
-            
-            macd_df = self.analyzer.calculate_macd(df['price'])
-            rsi_series = self.analyzer.calculate_rsi(df['price'])
-            sma_series = self.analyzer.calculate_sma(df['price'], window=50)
-            bb_df = self.analyzer.calculate_bollinger_bands(df['price'])
-            adx_series = self.analyzer.calculate_adx(df)
-            
-            # Weekly Trend
-            df_weekly = self.analyzer.resample_to_weekly(df)
-            curr_weekly_trend = self.analyzer.get_weekly_trend(df_weekly)
-            
-            curr_hist = macd_df.iloc[-1]['hist']
-            prev_hist = macd_df.iloc[-2]['hist']
-            curr_rsi = float(rsi_series.iloc[-1])
-            curr_price = float(df.iloc[-1]['price'])
-            curr_sma = float(sma_series.iloc[-1])
-            curr_bb_lower = float(bb_df.iloc[-1]['bb_lower'])
-            curr_bb_upper = float(bb_df.iloc[-1]['bb_upper'])
-            curr_adx = float(adx_series.iloc[-1])
-            
-            signal_decision = self.analyzer.determine_signal(
-                curr_hist, prev_hist, curr_rsi, curr_price, curr_sma, curr_bb_lower, curr_bb_upper, curr_adx, curr_weekly_trend
-            )
-            
-            new_signal = Signal(
-                asset_type=AssetType.GOLD,
-                asset_code="GOLD",
-                signal=SignalType(signal_decision),
-                macd=_to_safe_float(macd_df.iloc[-1]['macd']),
-                signal_line=_to_safe_float(macd_df.iloc[-1]['signal']),
-                histogram=_to_safe_float(curr_hist),
-                rsi=_to_safe_float(curr_rsi),
-                adx=_to_safe_float(curr_adx),
-                weekly_trend=curr_weekly_trend,
-                price_at_signal=_to_safe_float(df.iloc[-1]['price'])
-            )
-            
-            session.add(new_signal)
-            await session.commit()
-            logger.info(f"Signal generated for GOLD: {signal_decision}")
+        await self.publish_event(ANALYSIS_CHANNEL, {"type": "snapshots", "codes": codes})
 
-    async def handle_message(self, message):
+    async def publish_event(self, channel: str, payload: dict):
         try:
-            data = json.loads(message['data'])
-            logger.info(f"Received event: {data}")
-            
-            if data['type'] == 'currency':
-                codes = data.get('codes', [])
-                if not codes:
-                    logger.warning("Received currency event without codes list; skipping reprocessing.")
-                    return
-                for code in codes:
-                    await self.process_currency(code)
-            
-            elif data['type'] == 'gold':
-                await self.process_gold()
-                
+            await self.redis.publish(channel, json.dumps(payload))
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            logger.error(f"Failed to publish to Redis: {e}")
+
+    async def forecast_schedule(self):
+        """
+        Periodically refreshes every stored and preloaded model, so models also
+        exist after a cold start even if no ingest event arrives.
+        """
+        while True:
+            async with AsyncSessionLocal() as session:
+                stored = list((await session.execute(select(ForecastModel.asset_code))).scalars())
+            await self.forecast_refreshes.add(FORECAST_PRELOAD + stored)
+            await asyncio.sleep(FORECAST_REFRESH_SECONDS)
+
+    async def retention_schedule(self):
+        """
+        Periodically compacts / purges old signals (see src/shared/retention.py).
+        """
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    compacted, purged = await apply_signal_retention(session)
+                    await session.commit()
+                logger.info(f"Signal retention: {compacted} compacted, {purged} purged")
+            except Exception as e:
+                logger.error(f"Signal retention failed: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _observe_delay(self, event: dict):
+        # Events from miners that predate published_at carry no timestamp
+        if 'published_at' in event:
+            observe(EVENT_TO_SIGNAL_SECONDS, max(0.0, time.time() - event['published_at']), kind=event['type'])
+
+    async def handle_events(self, events: List[Dict[str, Any]]):
+        """
+        Processes a window of ingest events: overlapping events are merged per asset
+        (see coalesce()), so each asset is analyzed once, with one process_assets call
+        per asset type. Raises when the analysis fails, so the window is not acked.
+        """
+        for event in events:
+            logger.info(f"Received event: {event}")
+            if event.get('type') == 'currency' and not event.get('codes'):
+                logger.warning("Received currency event without codes list; skipping reprocessing.")
+
+        merged = coalesce(events)
+        codes = [code for kind, code in merged if kind == 'currency']
+        gold = ('gold', None) in merged
+        analyses = len(codes) + gold
+        saved = sum(m["events"] for key, m in merged.items() if key[0] in ('currency', 'gold')) - analyses
+        inc(BRAIN_EVENTS, len(events))
+        observe(BRAIN_WINDOW_EVENTS, len(events))
+        inc(BRAIN_ANALYSES, analyses)
+        inc(BRAIN_ANALYSES_SAVED, saved)
+        if saved:
+            ranges = ", ".join(f"{code or 'GOLD'} {m['from']}..{m['to']}" for (_, code), m in merged.items())
+            logger.info(f"Coalesced {len(events)} events into {analyses} analyses ({saved} saved): {ranges}")
+
+        if codes:
+            await self.process_assets(AssetType.CURRENCY, codes)
+        if gold:
+            await self.process_gold()
+        # One snapshot / forecast refresh for the whole window (the correlation matrices
+        # are rebuilt once even when both currencies and gold changed)
+        refreshed = codes + ([GOLD_CODE] if gold else [])
+        if refreshed:
+            self.snapshot_refreshes.add(refreshed)
+            self.forecast_refreshes.add(refreshed)
+        # Models the API was asked for but has none of (see /predict)
+        requested = [code for kind, code in merged if kind == 'forecast']
+        if requested:
+            self.forecast_refreshes.add(requested, flag=True)
+
+        for event in events:
+            self._observe_delay(event)
+
+    async def read_window(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Reads stream entries until BRAIN_COALESCE_SECONDS after the first one arrived
+        (or BRAIN_COALESCE_MAX_EVENTS are buffered). The window is fixed, not extended
+        by later events, so a long backfill is still processed every window.
+        """
+        batch = await self.events.read()
+        if not batch or BRAIN_COALESCE_SECONDS <= 0:
+            return batch
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BRAIN_COALESCE_SECONDS
+        while len(batch) < BRAIN_COALESCE_MAX_EVENTS:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            batch.extend(await self.events.read(block_ms=int(remaining * 1000)))
+        return batch
 
     async def run(self):
-        pubsub = self.redis.pubsub()
-        await pubsub.subscribe(REDIS_CHANNEL)
-        logger.info(f"Subscribed to {REDIS_CHANNEL}")
+        await self.events.ensure_group()
+        logger.info(f"Consuming {self.events.stream} as {self.events.consumer} (group {BRAIN_GROUP})")
+        self._spawn(self.forecast_schedule())
+        self._spawn(self.retention_schedule())
 
         while True:
             try:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if message:
-                    await self.handle_message(message)
-                
-                # Keep alive / watchdog logic could go here
-                
+                batch = await self.read_window()
+                if not batch:
+                    continue
+                await self.handle_events([event for _, event in batch])
+                await self.events.ack([entry_id for entry_id, _ in batch])
             except Exception as e:
-                logger.error(f"Listener error: {e}")
+                # Unacked entries are retried once EVENT_CLAIM_IDLE_MS has passed
+                logger.error(f"Event processing failed: {e}")
                 await asyncio.sleep(5)
 
 async def main():
+    serve_metrics()
     logger.info("Waiting for database...")
-    await asyncio.sleep(5)
-    await init_db()
+    await wait_for_schema(engine)
     
     service = BrainService()
     await service.run()
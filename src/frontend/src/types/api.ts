@@ -54,6 +54,7 @@ export interface MinerUpcoming {
 export interface EquityPoint {
   date: string;
   equity: number;
+  drawdown?: number;
 }
 
 export interface Trade {
@@ -70,6 +71,10 @@ export interface BacktestResult {
   final_value: number;
   total_return_pct: number;
   total_trades: number;
+  max_drawdown_pct?: number;
+  sharpe_ratio?: number | null;
+  hit_rate_pct?: number | null;
+  exposure_pct?: number;
   trades: Trade[];
   equity_curve: EquityPoint[];
 }
@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+from sqlalchemy import select
+
+# Fix import path for shared modules in Docker
+sys.path.append('/app')
+
+from src.shared.database import engine, AsyncSessionLocal
+from src.shared.events import INGEST_CHANNEL
+from src.shared.migrations import wait_for_schema
+from src.shared.models import Currency, JobLog, JobStatus
+from src.miner.ingest import bulk_insert_ignore, copy_insert_ignore
+from src.miner.main import MinerService
+from src.miner.nbp_client import NBP_TIMEOUT
+from src.miner.sources import SOURCES, Source, enabled_sources
+
+logger = logging.getLogger("backfill")
+
+# Archive files loaded at the same time
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+
+_UNIT_CODE = re.compile(r"^(\d+)([A-Z]{3})$")
+
+
+def _decode(data: bytes) -> str:
+    # NBP publishes its archive CSVs in windows-1250
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1250")
+
+
+def _iso_date(value: str) -> Optional[str]:
+    for fmt in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _number(value: str) -> Optional[Decimal]:
+    try:
+        return Decimal(value.strip().replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+def mid_table_csv(text: str) -> List[Dict[str, Any]]:
+    """
+    NBP's yearly archive of a mid-rate table (A or B): a header "data;1USD;100HUF;...",
+    one row per publication with the rate per the header's number of units, and
+    footer rows with the ISO codes and names. Returns records shaped like the API's.
+    """
+    rows = list(csv.reader(io.StringIO(text), delimiter=";"))
+    if not rows:
+        return []
+    columns = {i: (int(m.group(1)), m.group(2)) for i, h in enumerate(rows[0]) if (m := _UNIT_CODE.match(h.strip()))}
+    names = {}
+    for row in rows:
+        if row and row[0].strip().lower() == "nazwa waluty":
+            names = {code: row[i].strip() for i, (_, code) in columns.items() if i < len(row) and row[i].strip()}
+
+    records = []
+    for row in rows[1:]:
+        effective_date = _iso_date(row[0]) if row else None
+        if effective_date is None:
+            continue
+        for i, (units, code) in columns.items():
+            mid = _number(row[i]) if i < len(row) else None
+            if mid is None:
+                continue
+            records.append({'code': code, 'currency': names.get(code, code), 'mid': mid / units, 'effectiveDate': effective_date})
+    return records
+
+
+def gold_csv(text: str) -> List[Dict[str, Any]]:
+    """
+    Gold price archive: "date;price" rows; headers and other lines are skipped.
+    """
+    records = []
+    for row in csv.reader(io.StringIO(text), delimiter=";"):
+        if len(row) < 2:
+            continue
+        effective_date, price = _iso_date(row[0]), _number(row[1])
+        if effective_date is not None and price is not None:
+            records.append({'data': effective_date, 'cena': price})
+    return records
+
+
+def archive_records(source: Source, extension: str, data: bytes) -> List[Dict[str, Any]]:
+    if extension == "json":
+        # The API's JSON for the whole year
+        return source.records(json.loads(data))
+    if not source.tables:
+        return gold_csv(_decode(data))
+    if "rate_mid" in source.fields:
+        return mid_table_csv(_decode(data))
+    raise ValueError(f"No CSV layout for {source.name}; provide {source.archive.format(year='<year>')}.json")
+
+
+class Archive:
+    """
+    Yearly archive files in a directory, or on an HTTP mirror of them. A file is
+    looked up as `<name>.json` (the API's JSON), then `<name>.csv` (NBP's CSV).
+    """
+
+    def __init__(self, location: str):
+        self.location = location.rstrip("/")
+        self.remote = location.startswith(("http://", "https://"))
+        self._client = httpx.AsyncClient(timeout=NBP_TIMEOUT) if self.remote else None
+
+    async def read(self, name: str) -> Optional[Tuple[str, bytes]]:
+        for extension in ("json", "csv"):
+            filename = f"{name}.{extension}"
+            data = await (self._get(filename) if self.remote else self._open(filename))
+            if data is not None:
+                return extension, data
+        return None
+
+    async def _open(self, filename: str) -> Optional[bytes]:
+        path = Path(self.location) / filename
+        if not path.is_file():
+            return None
+        return await asyncio.to_thread(path.read_bytes)
+
+    async def _get(self, filename: str) -> Optional[bytes]:
+        response = await self._client.get(f"{self.location}/{filename}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class Backfill:
+    """
+    Loads archive files, one chunk per (source, year), `concurrency` chunks at a time,
+    each in its own transaction through the COPY path. Every chunk is logged in JobLog
+    as backfill_<source>_<year>, committed together with its rows, so chunks already
+    loaded are skipped when an interrupted backfill is run again. One ingest event per
+    source at the end has the brain recompute the indicators once.
+    """
+
+    def __init__(self, archive: Archive, sources: List[Source], years: Iterable[int],
+                 concurrency: int = BACKFILL_CONCURRENCY, force: bool = False):
+        self.archive = archive
+        self.sources = [s for s in sources if s.archive]
+        self.years = list(years)
+        self.concurrency = concurrency
+        self.force = force
+        self.failed = 0
+        self._finished = 0
+
+    @staticmethod
+    def job_type(source: Source, year: int) -> str:
+        return f"backfill_{source.name}_{year}"
+
+    async def loaded_chunks(self) -> Set[str]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(JobLog.job_type).where(JobLog.job_type.like("backfill_%"), JobLog.status == JobStatus.SUCCESS)
+            )
+            return set(result.scalars())
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Loads the missing chunks and returns the rows inserted per source.
+        """
+        chunks = [(source, year) for source in self.sources for year in self.years]
+        loaded = set() if self.force else await self.loaded_chunks()
+        todo = [(source, year) for source, year in chunks if self.job_type(source, year) not in loaded]
+        logger.info(f"Backfill: {len(todo)} of {len(chunks)} chunks to load ({len(chunks) - len(todo)} already loaded)")
+
+        # SQLite (local runs) has a single writer
+        concurrency = self.concurrency if engine.dialect.name == "postgresql" else 1
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(source: Source, year: int):
+            async with semaphore:
+                return await self.load_chunk(source, year, len(todo))
+
+        results = await asyncio.gather(*(bounded(source, year) for source, year in todo))
+
+        rows: Dict[str, int] = {}
+        codes: Dict[str, Set[str]] = {}
+        for (source, _), (count, chunk_codes) in zip(todo, results):
+            rows[source.name] = rows.get(source.name, 0) + count
+            codes.setdefault(source.name, set()).update(chunk_codes)
+        await self.publish(rows, codes)
+        return rows
+
+    async def load_chunk(self, source: Source, year: int, total: int) -> Tuple[int, List[str]]:
+        job_type = self.job_type(source, year)
+        async with AsyncSessionLocal() as session:
+            job = JobLog(job_type=job_type, status=JobStatus.PENDING)
+            session.add(job)
+            await session.commit()
+
+            try:
+                found = await self.archive.read(source.archive.format(year=year))
+                if found is None:
+                    logger.warning(f"{job_type}: no archive file {source.archive.format(year=year)}.json/.csv")
+                    job.status = JobStatus.SKIPPED
+                    job.error_message = "archive file not found"
+                    job.finished_at = datetime.now()
+                    await session.commit()
+                    return 0, []
+
+                records = await asyncio.to_thread(archive_records, source, *found)
+                codes = []
+                if source.per_currency:
+                    unique_currencies = {r['code']: r['currency'] for r in records}
+                    codes = list(unique_currencies.keys())
+                    await bulk_insert_ignore(
+                        session, Currency,
+                        [{'code': code, 'name': name} for code, name in unique_currencies.items()],
+                        conflict_columns=['code']
+                    )
+                    # Committed apart from the rows: concurrent chunks insert the same
+                    # currencies and would otherwise wait for each other's whole load
+                    await session.commit()
+                rows_count = await copy_insert_ignore(
+                    session, source.model, [source.row(r) for r in records], source.conflict_columns
+                )
+
+                job.status = JobStatus.SUCCESS
+                job.rows_written = rows_count
+                job.finished_at = datetime.now()
+                await session.commit()
+                self._finished += 1
+                logger.info(f"Backfill {self._finished}/{total}: {job_type} {rows_count} of {len(records)} rows inserted")
+                return rows_count, codes
+
+            except Exception as e:
+                logger.error(f"{job_type} failed: {e}")
+                await session.rollback()
+                job.status = JobStatus.FAILED
+                job.error_message = str(e)
+                job.finished_at = datetime.now()
+                await session.commit()
+                self.failed += 1
+                return 0, []
+
+    async def publish(self, rows: Dict[str, int], codes: Dict[str, Set[str]]):
+        service = MinerService()
+        for source in self.sources:
+            if not rows.get(source.name) or not source.event_type:
+                continue
+            event = {"type": source.event_type}
+            if source.per_currency:
+                event["codes"] = sorted(codes[source.name])
+            await service.publish_event(INGEST_CHANNEL, {
+                **event,
+                "from": str(date(min(self.years), 1, 1)),
+                "to": str(date(max(self.years), 12, 31)),
+                "count": rows[source.name]
+            })
+
+
+async def main(argv: List[str]) -> int:
+    archived = [name for name, source in SOURCES.items() if source.archive]
+    parser = argparse.ArgumentParser(prog="python -m src.miner.backfill", description="Loads NBP yearly archive files")
+    parser.add_argument("location", help="Directory with the archive files, or base URL of a mirror")
+    parser.add_argument("--from-year", type=int, required=True)
+    parser.add_argument("--to-year", type=int, default=date.today().year)
+    parser.add_argument("--sources", default=",".join(archived), help=f"Comma-separated, from {archived}")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--force", action="store_true", help="Load chunks again even if already loaded")
+    args = parser.parse_args(argv)
+
+    version = await wait_for_schema(engine)
+    logger.info(f"Database ready (schema version {version}).")
+
+    archive = Archive(args.location)
+    backfill = Backfill(
+        archive, enabled_sources(args.sources), range(args.from_year, args.to_year + 1),
+        concurrency=args.concurrency, force=args.force,
+    )
+    try:
+        rows = await backfill.run()
+    finally:
+        await archive.aclose()
+    logger.info(f"Backfill finished: {rows}, {backfill.failed} chunk(s) failed")
+    return 1 if backfill.failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main(sys.argv[1:])))
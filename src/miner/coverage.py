@@ -0,0 +1,217 @@
+import logging
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.shared.models import AssetCoverage
+from src.miner.sources import Source
+
+logger = logging.getLogger("coverage")
+
+SOURCE_WIDE = "" # asset_code of a source's own row: days missing for every asset
+GOLD_CODE = "GOLD"
+# Missing days this close together are fetched as one range (one request instead of several)
+MERGE_DAYS = 7
+# Ranges kept per asset in asset_coverage.missing_ranges
+MAX_STORED_RANGES = 100
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+@lru_cache(maxsize=None)
+def polish_holidays(year: int) -> Set[date]:
+    """
+    Public holidays in Poland (no NBP tables). Other days without a publication
+    are learned by the gap repair (asset_coverage.no_data).
+    """
+    easter = _easter(year)
+    days = {
+        date(year, 1, 1), date(year, 5, 1), date(year, 5, 3), date(year, 8, 15),
+        date(year, 11, 1), date(year, 11, 11), date(year, 12, 25), date(year, 12, 26),
+        easter + timedelta(days=1), # Easter Monday
+        easter + timedelta(days=60), # Corpus Christi
+    }
+    if year >= 2011:
+        days.add(date(year, 1, 6))
+    if year >= 2025:
+        days.add(date(year, 12, 24))
+    return days
+
+
+def slot(source: Source, day: date) -> date:
+    """
+    The calendar slot a publication fills: its day, or the Monday of its week for
+    weekly sources (Table B moves off Wednesday when it is a holiday).
+    """
+    return day - timedelta(days=day.weekday()) if source.weekly else day
+
+
+def expected_slots(source: Source, first: date, last: date) -> List[date]:
+    """
+    Slots between two dates (inclusive) in which the source publishes: business
+    days, or the weeks for weekly sources.
+    """
+    day, end = slot(source, first), slot(source, last)
+    step = timedelta(days=7 if source.weekly else 1)
+    slots = []
+    while day <= end:
+        if source.weekly or (day.weekday() < 5 and day not in polish_holidays(day.year)):
+            slots.append(day)
+        day += step
+    return slots
+
+
+def slot_range(source: Source, day: date) -> Tuple[date, date]:
+    return (day, day + timedelta(days=4)) if source.weekly else (day, day)
+
+
+def merge_ranges(ranges: Iterable[Tuple[date, date]], gap_days: int = 1) -> List[Tuple[date, date]]:
+    """
+    Sorts ranges and joins those that start within gap_days of the previous one's end.
+    """
+    merged: List[List[date]] = []
+    for start, end in sorted(ranges):
+        if merged and (start - merged[-1][1]).days <= gap_days:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class SourceCoverage:
+    """
+    Coverage index of one source: per asset the slots stored, expected and missing.
+    An asset is expected in the source's publication slots between its own first and
+    last date (a currency listed late or delisted is not missing outside them); the
+    source as a whole (SOURCE_WIDE) is expected in every business day / week between
+    its first and last date. Slots a re-fetch confirmed NBP has no data for are no
+    longer expected.
+    """
+
+    def __init__(self, source: Source, stored: Dict[str, Set[date]], no_data: Dict[str, Set[date]]):
+        self.source = source
+        self.stored = stored
+        self.no_data = no_data
+        self.published = set().union(*stored.values()) if stored else set()
+        self.expected: Dict[str, List[date]] = {}
+        self.missing: Dict[str, List[date]] = {}
+        if not self.published:
+            return
+
+        confirmed = no_data.get(SOURCE_WIDE, set())
+        calendar = [s for s in expected_slots(source, min(self.published), max(self.published)) if s not in confirmed]
+        self.expected[SOURCE_WIDE] = calendar
+        self.missing[SOURCE_WIDE] = [s for s in calendar if s not in self.published]
+        for code, slots in stored.items():
+            first, last = min(slots), max(slots)
+            skip = no_data.get(code, set())
+            # Publication days of the source plus the days missing for all of them
+            expected = [s for s in calendar if first <= s <= last and s not in skip]
+            self.expected[code] = expected
+            self.missing[code] = [s for s in expected if s not in slots]
+
+    def missing_ranges(self, code: str = None, gap_days: int = 1) -> List[Tuple[date, date]]:
+        """
+        Date ranges to fetch for one asset, or for all of them (code None).
+        """
+        codes = [code] if code is not None else list(self.missing)
+        return merge_ranges(
+            (slot_range(self.source, s) for c in codes for s in self.missing.get(c, [])), gap_days=gap_days
+        )
+
+    def fetch_ranges(self) -> List[Tuple[date, date]]:
+        return self.missing_ranges(gap_days=MERGE_DAYS)
+
+    def confirm_no_data(self, before: "SourceCoverage", fetched: List[Tuple[date, date]]) -> int:
+        """
+        Records the slots that were missing before a re-fetch of `fetched` and still are:
+        NBP has nothing for them. Returns how many were recorded.
+        """
+        def in_fetched(s: date) -> bool:
+            start, end = slot_range(self.source, s)
+            return any(f_start <= start and end <= f_end for f_start, f_end in fetched)
+
+        recorded = 0
+        for code, slots in before.missing.items():
+            still = set(self.missing.get(code, slots))
+            confirmed = {s for s in slots if s in still and in_fetched(s)}
+            if confirmed:
+                self.no_data.setdefault(code, set()).update(confirmed)
+                recorded += len(confirmed)
+        return recorded
+
+    def rows(self) -> List[Dict]:
+        rows = []
+        for code in sorted(self.expected):
+            slots = self.published if code == SOURCE_WIDE else self.stored[code]
+            ranges = self.missing_ranges(code)
+            rows.append({
+                'source': self.source.name,
+                'asset_code': code,
+                'first_date': min(slots),
+                'last_date': max(slots),
+                'expected_count': len(self.expected[code]),
+                'stored_count': len(slots),
+                'missing_count': len(self.missing[code]),
+                'missing_ranges': [[str(s), str(e)] for s, e in ranges[-MAX_STORED_RANGES:]],
+                'no_data': sorted(str(d) for d in self.no_data.get(code, ())),
+            })
+        return rows
+
+
+def _asset_column(source: Source):
+    return source.model.currency_code if source.per_currency else None
+
+
+async def load_no_data(session: AsyncSession, source: Source) -> Dict[str, Set[date]]:
+    result = await session.execute(
+        select(AssetCoverage.asset_code, AssetCoverage.no_data).where(AssetCoverage.source == source.name)
+    )
+    return {code: {date.fromisoformat(d) for d in days or []} for code, days in result.all()}
+
+
+async def load_coverage(session: AsyncSession, source: Source, no_data: Optional[Dict[str, Set[date]]] = None) -> SourceCoverage:
+    """
+    Builds a source's coverage index from its stored dates (one index-backed scan of
+    the asset and date columns).
+    """
+    if no_data is None:
+        no_data = await load_no_data(session, source)
+    column = _asset_column(source)
+    model = source.model
+    stmt = select(column if column is not None else model.effective_date, model.effective_date).where(
+        model.source == source.tag
+    )
+    stored: Dict[str, Set[date]] = {}
+    result = await session.stream(stmt.execution_options(yield_per=10000))
+    async for partition in result.partitions():
+        for code, day in partition:
+            stored.setdefault(code if column is not None else GOLD_CODE, set()).add(slot(source, day))
+    return SourceCoverage(source, stored, no_data)
+
+
+async def save_coverage(session: AsyncSession, coverage: SourceCoverage):
+    """
+    Replaces the source's rows in asset_coverage. The caller owns the commit.
+    """
+    await session.execute(delete(AssetCoverage).where(AssetCoverage.source == coverage.source.name))
+    rows = coverage.rows()
+    if rows:
+        session.add_all(AssetCoverage(**row) for row in rows)
+    await session.flush()
@@ -0,0 +1,97 @@
+import logging
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.shared.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# asyncpg caps a statement at 32767 bind parameters; 1000 rows keeps us far below it
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def dedupe_rows(rows: Iterable[Dict[str, Any]], key_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Drops in-memory duplicates on the conflict key (first occurrence wins).
+    """
+    unique = {}
+    for row in rows:
+        key = tuple(row[c] for c in key_columns)
+        unique.setdefault(key, row)
+    return list(unique.values())
+
+
+async def bulk_insert_ignore(
+    session: AsyncSession,
+    model,
+    rows: Iterable[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Inserts rows in chunked multi-row INSERT ... ON CONFLICT DO NOTHING statements.
+    conflict_columns must match a unique index on the table (e.g. idx_rates_code_date_cover).
+    Returns the number of rows actually inserted (counted via RETURNING), so rows
+    that already existed are not reported. The caller owns the commit.
+    """
+    rows = dedupe_rows(rows, conflict_columns)
+    if not rows:
+        return 0
+
+    pk = model.__table__.primary_key.columns.values()[0]
+    inserted = 0
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        stmt = (
+            dialect_insert(session, model)
+            .values(chunk)
+            .on_conflict_do_nothing(index_elements=list(conflict_columns))
+            .returning(pk)
+        )
+        result = await session.execute(stmt)
+        inserted += len(result.all())
+
+    logger.info(f"{model.__tablename__}: {inserted} of {len(rows)} rows inserted")
+    return inserted
+
+
+async def copy_insert_ignore(
+    session: AsyncSession,
+    model,
+    rows: Iterable[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+) -> int:
+    """
+    Bulk path for large loads (archive backfills). On PostgreSQL the rows are COPYed
+    into a temporary staging table shaped like the target and moved with a single
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING; other dialects fall back to
+    bulk_insert_ignore. All rows must have the same keys. Returns the number of rows
+    actually inserted. The caller owns the commit.
+    """
+    rows = dedupe_rows(rows, conflict_columns)
+    if not rows:
+        return 0
+    if session.bind.dialect.name != "postgresql":
+        return await bulk_insert_ignore(session, model, rows, conflict_columns)
+
+    table = model.__tablename__
+    stage = f"{table}_stage"
+    columns = list(rows[0])
+    column_list = ", ".join(columns)
+    conn = await session.connection()
+    await conn.execute(text(f"CREATE TEMP TABLE {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"))
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        stage, records=[tuple(row[c] for c in columns) for row in rows], columns=columns,
+    )
+    result = await conn.execute(text(
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} "
+        f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+    ))
+    # Dropped now rather than at commit, so one transaction can load several chunks
+    await conn.execute(text(f"DROP TABLE {stage}"))
+
+    logger.info(f"{table}: {result.rowcount} of {len(rows)} rows inserted (COPY)")
+    return result.rowcount
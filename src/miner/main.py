@@ -2,21 +2,26 @@ import asyncio
 import logging
 import os
 import sys
+import time
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import List, Tuple
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import select, func, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-import redis.asyncio as redis
 import json
 
 # Fix import path for shared modules in Docker
 sys.path.append('/app')
 
-from src.shared.database import init_db, AsyncSessionLocal
-from src.shared.models import Currency, Rate, GoldPrice, JobLog, JobStatus
+from src.shared.database import engine, AsyncSessionLocal
+from src.shared.events import INGEST_CHANNEL, add_events, asset_events, connect, stream_key
+from src.shared.metrics import INGEST_ROWS, JOB_SECONDS, observe, serve_metrics, timer
+from src.shared.migrations import wait_for_schema
+from src.shared.models import Currency, JobLog, JobStatus
 from src.miner.nbp_client import NBPClient
+from src.miner.ingest import bulk_insert_ignore
+from src.miner.sources import HISTORY_START, Source, enabled_sources
+from src.miner.coverage import SOURCE_WIDE, SourceCoverage, load_coverage, save_coverage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -24,43 +29,95 @@ logger = logging.getLogger("miner")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 REDIS_ENABLED = os.getenv("REDIS_ENABLED", "1") == "1"
+# Hour of the daily gap repair (minute 30)
+COVERAGE_REPAIR_HOUR = int(os.getenv("COVERAGE_REPAIR_HOUR", "3"))
 
 class MinerService:
     def __init__(self):
         self.nbp_client = NBPClient()
-        self.redis = redis.from_url(REDIS_URL) if REDIS_ENABLED else None
+        self.redis = connect(REDIS_URL) if REDIS_ENABLED else None
 
-    async def get_last_rate_date(self, session: AsyncSession) -> date:
-        result = await session.execute(select(func.max(Rate.effective_date)))
+    async def get_last_date(self, session: AsyncSession, source: Source) -> date:
+        result = await session.execute(source.last_date_query())
         last_date = result.scalar()
-        return last_date if last_date else date(2023, 1, 1) # Default start history
-
-    async def get_last_gold_date(self, session: AsyncSession) -> date:
-        result = await session.execute(select(func.max(GoldPrice.effective_date)))
-        last_date = result.scalar()
-        return last_date if last_date else date(2023, 1, 1)
+        return last_date if last_date else HISTORY_START
 
     async def publish_event(self, channel: str, payload: dict):
         if self.redis:
+            # Lets consumers measure their delay from ingest
+            payload = {**payload, "published_at": time.time()}
             try:
+                # Work for the brain replicas, one entry per asset, kept until processed
+                await add_events(self.redis, stream_key(channel), asset_events(payload))
+                # Broadcast to every API worker (cache invalidation)
                 await self.redis.publish(channel, json.dumps(payload))
                 logger.info(f"Published event to {channel}: {payload}")
             except Exception as e:
                 logger.error(f"Failed to publish to Redis: {e}")
 
-    async def run_import_rates(self):
-        logger.info("Starting Rates Import Job")
+    async def _store(self, session: AsyncSession, source: Source, records: List[dict]) -> Tuple[int, List[str]]:
+        """
+        Inserts a source's records (existing rows are kept) and commits. Returns the
+        rows inserted and the currency codes the records cover.
+        """
+        if not records:
+            return 0, []
+        codes = []
+        if source.per_currency:
+            # Ensure currencies exist
+            unique_currencies = {r['code']: r['currency'] for r in records}
+            codes = list(unique_currencies.keys())
+            await bulk_insert_ignore(
+                session, Currency,
+                [{'code': code, 'name': name} for code, name in unique_currencies.items()],
+                conflict_columns=['code']
+            )
+
+        rows_count = await bulk_insert_ignore(
+            session, source.model,
+            (source.row(r) for r in records),
+            conflict_columns=source.conflict_columns
+        )
+        await session.commit()
+        return rows_count, codes
+
+    async def _publish_ingest(self, source: Source, codes: List[str], start_date: date, end_date: date, count: int):
+        if not source.event_type:
+            return
+        event = {"type": source.event_type}
+        if source.per_currency:
+            event["codes"] = codes
+        await self.publish_event(INGEST_CHANNEL, {
+            **event,
+            "from": str(start_date),
+            "to": str(end_date),
+            "count": count
+        })
+
+    async def run_imports(self, sources: List[Source]):
+        """
+        Imports several sources concurrently; their NBP requests share the client's
+        concurrency and rate limits. A failing source does not stop the others.
+        """
+        await asyncio.gather(*(self.run_import(source) for source in sources))
+
+    async def run_import(self, source: Source):
+        with timer(JOB_SECONDS, job=source.job_type):
+            await self._run_import(source)
+
+    async def _run_import(self, source: Source):
+        logger.info(f"Starting {source.name} import job")
         async with AsyncSessionLocal() as session:
-            job = JobLog(job_type="import_rates", status=JobStatus.PENDING)
+            job = JobLog(job_type=source.job_type, status=JobStatus.PENDING)
             session.add(job)
             await session.commit()
             
             try:
-                last_date = await self.get_last_rate_date(session)
+                last_date = await self.get_last_date(session, source)
                 today = date.today()
                 
                 if last_date >= today:
-                    logger.info("Rates are up to date.")
+                    logger.info(f"{source.name} is up to date.")
                     job.status = JobStatus.SKIPPED
                     job.finished_at = datetime.now()
                     await session.commit()
@@ -68,132 +125,118 @@ class MinerService:
 
                 # Fetch from next day
                 start_date = last_date + timedelta(days=1)
-                rates_data = await self.nbp_client.fetch_exchange_rates(start_date, today)
+                records = await self.nbp_client.fetch(source, start_date, today)
                 
-                rows_count = 0
-                if rates_data:
-                    # Ensure currencies exist
-                    unique_currencies = {r['code']: r['currency'] for r in rates_data}
-                    
-                    # Simple check and insert currencies (could be optimized)
-                    for code, name in unique_currencies.items():
-                        curr_res = await session.execute(select(Currency).where(Currency.code == code))
-                        if not curr_res.scalar():
-                            session.add(Currency(code=code, name=name))
-                    
-                    await session.commit() # Commit currencies first
-
-                    for r in rates_data:
-                        # Check specific existence to avoid constraint errors on re-runs (or use ON CONFLICT DO NOTHING in raw SQL)
-                        # Here we rely on the loop logic mostly, but let's be safe
-                        stmt = select(Rate).where(Rate.currency_code == r['code'], Rate.effective_date == date.fromisoformat(r['effectiveDate']))
-                        exists = await session.execute(stmt)
-                        if not exists.scalar():
-                            new_rate = Rate(
-                                currency_code=r['code'],
-                                rate_mid=r['mid'],
-                                effective_date=date.fromisoformat(r['effectiveDate'])
-                            )
-                            session.add(new_rate)
-                            rows_count += 1
-                    
-                    await session.commit()
+                rows_count, codes = await self._store(session, source, records)
 
                 job.status = JobStatus.SUCCESS
                 job.rows_written = rows_count
                 job.finished_at = datetime.now()
                 await session.commit()
-                logger.info(f"Rates import finished. Rows: {rows_count}")
+                logger.info(f"{source.name} import finished. Rows: {rows_count}")
+                observe(INGEST_ROWS, rows_count, kind=source.name)
 
                 if rows_count > 0:
-                     await self.publish_event("rates.ingested", {
-                         "type": "currency",
-                         "codes": list(unique_currencies.keys()),
-                         "from": str(start_date),
-                         "to": str(today),
-                         "count": rows_count
-                     })
+                    await self._publish_ingest(source, codes, start_date, today, rows_count)
 
             except Exception as e:
-                logger.error(f"Job failed: {e}")
+                logger.error(f"{source.name} job failed: {e}")
                 job.status = JobStatus.FAILED
                 job.error_message = str(e)
                 job.finished_at = datetime.now()
                 await session.commit()
 
-    async def run_import_gold(self):
-        logger.info("Starting Gold Import Job")
+    async def run_repairs(self, sources: List[Source]):
+        """
+        Repairs the gaps of several sources concurrently (shared NBP limits).
+        """
+        await asyncio.gather(*(self.run_repair(source) for source in sources))
+
+    async def run_repair(self, source: Source):
+        with timer(JOB_SECONDS, job=f"repair_{source.name}"):
+            await self._run_repair(source)
+
+    async def _run_repair(self, source: Source):
+        """
+        Re-fetches only the ranges the coverage index finds missing (merged when close
+        together), then stores the updated index; days still missing after a successful
+        re-fetch are recorded as having no NBP data. A failed range stays missing and
+        is tried again on the next run.
+        """
+        logger.info(f"Starting {source.name} gap repair")
         async with AsyncSessionLocal() as session:
-            job = JobLog(job_type="import_gold", status=JobStatus.PENDING)
+            job = JobLog(job_type=f"repair_{source.name}", status=JobStatus.PENDING)
             session.add(job)
             await session.commit()
-            
+
             try:
-                last_date = await self.get_last_gold_date(session)
-                today = date.today()
-                
-                if last_date >= today:
-                    logger.info("Gold prices are up to date.")
-                    job.status = JobStatus.SKIPPED
+                before = await load_coverage(session, source)
+                ranges = before.fetch_ranges()
+                if not ranges:
+                    await save_coverage(session, before)
+                    job.status = JobStatus.SUCCESS
                     job.finished_at = datetime.now()
                     await session.commit()
+                    logger.info(f"{source.name} has no gaps.")
                     return
 
-                start_date = last_date + timedelta(days=1)
-                gold_data = await self.nbp_client.fetch_gold_prices(start_date, today)
-                
-                rows_count = 0
-                if gold_data:
-                    for g in gold_data:
-                        stmt = select(GoldPrice).where(GoldPrice.effective_date == date.fromisoformat(g['data']))
-                        exists = await session.execute(stmt)
-                        if not exists.scalar():
-                            new_price = GoldPrice(
-                                price=g['cena'],
-                                effective_date=date.fromisoformat(g['data'])
-                            )
-                            session.add(new_price)
-                            rows_count += 1
-                    
-                    await session.commit()
-
-                job.status = JobStatus.SUCCESS
+                results = await asyncio.gather(
+                    *(self.nbp_client.fetch(source, start, end) for start, end in ranges), return_exceptions=True
+                )
+                fetched = [r for r, result in zip(ranges, results) if not isinstance(result, BaseException)]
+                errors = [f"{s}..{e}: {result}" for (s, e), result in zip(ranges, results) if isinstance(result, BaseException)]
+                records = [record for result in results if not isinstance(result, BaseException) for record in result]
+                rows_count, codes = await self._store(session, source, records)
+
+                after = await load_coverage(session, source, before.no_data)
+                confirmed = after.confirm_no_data(before, fetched)
+                if confirmed:
+                    after = SourceCoverage(source, after.stored, after.no_data)
+                await save_coverage(session, after)
+
+                job.status = JobStatus.FAILED if errors else JobStatus.SUCCESS
+                job.error_message = "; ".join(errors)[:1000] if errors else None
                 job.rows_written = rows_count
                 job.finished_at = datetime.now()
                 await session.commit()
-                logger.info(f"Gold import finished. Rows: {rows_count}")
+                missing = len(after.missing.get(SOURCE_WIDE, []))
+                logger.info(
+                    f"{source.name} gap repair: {len(ranges)} ranges fetched ({len(errors)} failed), {rows_count} rows, "
+                    f"{confirmed} days confirmed without data, {missing} days still missing"
+                )
+                observe(INGEST_ROWS, rows_count, kind=source.name)
 
                 if rows_count > 0:
-                     await self.publish_event("rates.ingested", {
-                         "type": "gold",
-                         "from": str(start_date),
-                         "to": str(today),
-                         "count": rows_count
-                     })
+                    await self._publish_ingest(source, codes, fetched[0][0], fetched[-1][1], rows_count)
 
             except Exception as e:
-                logger.error(f"Job failed: {e}")
+                logger.error(f"{source.name} gap repair failed: {e}")
+                await session.rollback()
                 job.status = JobStatus.FAILED
                 job.error_message = str(e)
                 job.finished_at = datetime.now()
                 await session.commit()
 
 async def main():
+    serve_metrics()
     logger.info("Waiting for database...")
-    await asyncio.sleep(5) # Simple wait for DB to be ready in Docker
-    await init_db()
-    logger.info("Database initialized.")
+    version = await wait_for_schema(engine)
+    logger.info(f"Database ready (schema version {version}).")
 
     service = MinerService()
     
+    sources = enabled_sources()
+    logger.info(f"Importing sources: {[s.name for s in sources]}")
+
     # Run immediately on startup
-    await service.run_import_rates()
-    await service.run_import_gold()
+    await service.run_imports(sources)
 
     scheduler = AsyncIOScheduler()
-    # Schedule every hour
-    scheduler.add_job(service.run_import_rates, 'cron', minute=0)
-    scheduler.add_job(service.run_import_gold, 'cron', minute=2)
+    # Schedule every hour; sources due at the same minute run together
+    for minute in sorted({s.minute for s in sources}):
+        scheduler.add_job(service.run_imports, 'cron', minute=minute, args=[[s for s in sources if s.minute == minute]])
+    # Daily, after the night's imports: re-fetch whatever the coverage index finds missing
+    scheduler.add_job(service.run_repairs, 'cron', hour=COVERAGE_REPAIR_HOUR, minute=30, args=[sources])
     
     scheduler.start()
     logger.info("Scheduler started. Keeping process alive...")
@@ -203,6 +246,8 @@ async def main():
             await asyncio.sleep(1)
     except (KeyboardInterrupt, SystemExit):
         pass
+    finally:
+        await service.nbp_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,82 +1,166 @@
 import httpx
 import logging
+import os
+import random
+import time
 from datetime import date, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import asyncio
 
+from src.miner.sources import NBP_MAX_DAYS, Source
+from src.shared.metrics import NBP_FETCH_FAILURES, NBP_FETCH_SECONDS, inc, timer
+
 logger = logging.getLogger(__name__)
 
+NBP_MAX_CONCURRENCY = int(os.getenv("NBP_MAX_CONCURRENCY", "4"))
+NBP_RATE_LIMIT = float(os.getenv("NBP_RATE_LIMIT", "5"))  # requests per second
+NBP_MAX_RETRIES = int(os.getenv("NBP_MAX_RETRIES", "4"))
+NBP_TIMEOUT = float(os.getenv("NBP_TIMEOUT", "30"))
+
+
+class NBPFetchError(Exception):
+    """Raised when a window could not be fetched after all retries."""
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: allows bursts up to `capacity` requests
+    and refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
 class NBPClient:
     BASE_URL = "http://api.nbp.pl/api"
-    MAX_DAYS_RANGE = 93 # NBP API limit
+    MAX_DAYS_RANGE = NBP_MAX_DAYS
 
-    async def fetch_exchange_rates(self, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        max_concurrency: int = NBP_MAX_CONCURRENCY,
+        rate_limit: float = NBP_RATE_LIMIT,
+        max_retries: int = NBP_MAX_RETRIES,
+        timeout: float = NBP_TIMEOUT,
+        backoff_base: float = 0.5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_limit)
+        self._max_concurrency = max_concurrency
+        self._transport = transport # a stub server in tests (e.g. httpx.MockTransport)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
         """
-        Fetches exchange rates (Table A) handling the 93-day limit by splitting requests.
+        One keep-alive client per NBPClient lifetime, created lazily inside the running loop.
         """
-        all_rates = []
-        current_start = start_date
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={"Accept": "application/json"},
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency,
+                ),
+                transport=self._transport,
+            )
+        return self._client
 
-        while current_start <= end_date:
-            current_end = min(current_start + timedelta(days=self.MAX_DAYS_RANGE), end_date)
-            
-            url = f"{self.BASE_URL}/exchangerates/tables/A/{current_start}/{current_end}/"
-            logger.info(f"Fetching rates from {url}")
-            
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(url, headers={"Accept": "application/json"})
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        # Flatten the structure: one rate = one dict with effectiveDate
-                        for entry in data:
-                            eff_date = entry['effectiveDate']
-                            for rate in entry['rates']:
-                                rate['effectiveDate'] = eff_date
-                                all_rates.append(rate)
-                    elif response.status_code == 404:
-                        logger.warning(f"No data found for range {current_start} to {current_end}")
-                    else:
-                        logger.error(f"Error fetching rates: {response.status_code} - {response.text}")
-            
-            except Exception as e:
-                logger.error(f"Request failed: {e}")
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-            current_start = current_end + timedelta(days=1)
-            await asyncio.sleep(0.1) # Be nice to the API
+    async def __aenter__(self):
+        return self
 
-        return all_rates
+    async def __aexit__(self, *exc):
+        await self.aclose()
 
-    async def fetch_gold_prices(self, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    def _windows(self, start_date: date, end_date: date, max_days: int = MAX_DAYS_RANGE) -> List[Tuple[date, date]]:
         """
-        Fetches gold prices handling the limit.
+        Splits [start_date, end_date] into consecutive ranges within the day limit.
         """
-        all_prices = []
+        windows = []
         current_start = start_date
-
         while current_start <= end_date:
-            current_end = min(current_start + timedelta(days=self.MAX_DAYS_RANGE), end_date)
-            
-            url = f"{self.BASE_URL}/cenyzlota/{current_start}/{current_end}"
-            logger.info(f"Fetching gold from {url}")
-            
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(url, headers={"Accept": "application/json"})
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        all_prices.extend(data)
-                    elif response.status_code == 404:
-                        logger.warning(f"No gold data found for range {current_start} to {current_end}")
+            current_end = min(current_start + timedelta(days=max_days), end_date)
+            windows.append((current_start, current_end))
+            current_start = current_end + timedelta(days=1)
+        return windows
+
+    def _backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def _get_json(self, url: str, kind: str) -> Optional[Any]:
+        """
+        GETs a single window. Returns parsed JSON, or None when NBP has no data (404).
+        Retries 5xx, 429 and timeouts/transport errors with exponential backoff;
+        raises NBPFetchError once retries are exhausted or on other client errors.
+        The window's latency (retries included, queueing excluded) is recorded per `kind`.
+        """
+        async with self._semaphore:
+            with timer(NBP_FETCH_SECONDS, kind=kind):
+                for attempt in range(self.max_retries + 1):
+                    await self._bucket.acquire()
+                    try:
+                        response = await self.client.get(url)
+                    except (httpx.TimeoutException, httpx.TransportError) as e:
+                        error = f"{type(e).__name__}: {e}"
                     else:
-                        logger.error(f"Error fetching gold: {response.status_code} - {response.text}")
+                        if response.status_code == 200:
+                            return response.json()
+                        if response.status_code == 404:
+                            logger.warning(f"No data found for {url}")
+                            return None
+                        error = f"{response.status_code} - {response.text}"
+                        if response.status_code < 500 and response.status_code != 429:
+                            inc(NBP_FETCH_FAILURES, kind=kind)
+                            raise NBPFetchError(f"Error fetching {url}: {error}")
 
-            except Exception as e:
-                logger.error(f"Request failed: {e}")
+                    if attempt < self.max_retries:
+                        delay = self._backoff(attempt)
+                        logger.warning(f"Retrying {url} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries}): {error}")
+                        await asyncio.sleep(delay)
 
-            current_start = current_end + timedelta(days=1)
-            await asyncio.sleep(0.1)
+                inc(NBP_FETCH_FAILURES, kind=kind)
+                raise NBPFetchError(f"Giving up on {url} after {self.max_retries + 1} attempts: {error}")
 
-        return all_prices
+    async def fetch(self, source: Source, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """
+        Fetches a source's records for [start_date, end_date], split into windows within
+        its day limit and fetched concurrently (bounded by the semaphore and rate limiter,
+        shared by all sources). Records come in window order; any failed window fails
+        the whole fetch.
+        """
+        urls = [
+            source.path.format(base=self.base_url, start=s, end=e)
+            for s, e in self._windows(start_date, end_date, source.max_days)
+        ]
+        for url in urls:
+            logger.info(f"Fetching {url}")
+        windows = await asyncio.gather(*(self._get_json(url, source.name) for url in urls))
+        return [record for data in windows if data is not None for record in source.records(data)]
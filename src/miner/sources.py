@@ -0,0 +1,122 @@
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import Date, func, select
+from sqlalchemy.sql import Select
+
+from src.shared.models import GoldPrice, Rate, RateQuote
+
+NBP_MAX_DAYS = 93 # NBP API limit per request
+HISTORY_START = date(2023, 1, 1) # Default start of a source's history
+
+
+class Source:
+    """
+    One NBP series the miner imports: the endpoint and how many days one request may
+    span, the JSON field behind each column of the target table, and the ingest event
+    announcing new rows (None: nothing downstream consumes the series yet).
+    `archive` names its yearly archive file, without extension, for backfills.
+    Rows are tagged with `tag` in the table's source column, so series sharing a
+    table (Tables A and B in rates) resume from their own last date.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        model,
+        fields: Dict[str, str],
+        conflict_columns: Sequence[str],
+        event_type: Optional[str] = None,
+        tag: str = "NBP",
+        max_days: int = NBP_MAX_DAYS,
+        minute: int = 0,
+        tables: bool = True,
+        archive: Optional[str] = None,
+        weekly: bool = False,
+    ):
+        self.name = name
+        self.path = path # "{base}", "{start}" and "{end}" are filled in per window
+        self.model = model
+        self.fields = fields
+        self.conflict_columns = list(conflict_columns)
+        self.event_type = event_type
+        self.tag = tag
+        self.max_days = max_days
+        self.minute = minute # Minute of the hourly schedule
+        # Exchange rate tables nest the rates of one publication under its dates
+        self.tables = tables
+        self.archive = archive # "{year}" is filled in
+        # Published once a week rather than every business day (coverage checks)
+        self.weekly = weekly
+        self._date_columns = [c for c in fields if isinstance(model.__table__.c[c].type, Date)]
+
+    @property
+    def job_type(self) -> str:
+        return f"import_{self.name}"
+
+    @property
+    def per_currency(self) -> bool:
+        return "currency_code" in self.fields
+
+    def records(self, payload: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Flattens one window's JSON into one dict per row.
+        """
+        if not self.tables:
+            return list(payload)
+        return [
+            {**{k: v for k, v in table.items() if k != 'rates'}, **rate}
+            for table in payload for rate in table['rates']
+        ]
+
+    def row(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        row = {column: record[field] for column, field in self.fields.items()}
+        for column in self._date_columns:
+            if row[column] is not None:
+                row[column] = date.fromisoformat(row[column])
+        row['source'] = self.tag
+        return row
+
+    def last_date_query(self) -> Select:
+        return select(func.max(self.model.effective_date)).where(self.model.source == self.tag)
+
+
+SOURCES: Dict[str, Source] = {s.name: s for s in (
+    # Table A: mid rates of the main currencies, every business day
+    Source(
+        "rates", "{base}/exchangerates/tables/A/{start}/{end}/", Rate,
+        {'currency_code': 'code', 'rate_mid': 'mid', 'effective_date': 'effectiveDate'},
+        ['currency_code', 'effective_date'], event_type="currency", archive="archiwum_tab_a_{year}",
+    ),
+    # Table B: mid rates of the other (exotic) currencies, published on Wednesdays
+    Source(
+        "rates_b", "{base}/exchangerates/tables/B/{start}/{end}/", Rate,
+        {'currency_code': 'code', 'rate_mid': 'mid', 'effective_date': 'effectiveDate'},
+        ['currency_code', 'effective_date'], event_type="currency", tag="NBP-B", archive="archiwum_tab_b_{year}",
+        weekly=True,
+    ),
+    # Table C: bid / ask rates of the most traded currencies
+    Source(
+        "rates_c", "{base}/exchangerates/tables/C/{start}/{end}/", RateQuote,
+        {'currency_code': 'code', 'bid': 'bid', 'ask': 'ask',
+         'effective_date': 'effectiveDate', 'trading_date': 'tradingDate'},
+        ['currency_code', 'effective_date'], archive="archiwum_tab_c_{year}",
+    ),
+    Source(
+        "gold", "{base}/cenyzlota/{start}/{end}", GoldPrice,
+        {'price': 'cena', 'effective_date': 'data'},
+        ['effective_date'], event_type="gold", minute=2, tables=False, archive="zloto_{year}",
+    ),
+)}
+
+# Comma-separated source names the miner imports (default: all)
+MINER_SOURCES = os.getenv("MINER_SOURCES", ",".join(SOURCES))
+
+
+def enabled_sources(names: str = MINER_SOURCES) -> List[Source]:
+    unknown = [n for n in names.split(",") if n.strip() and n.strip() not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown sources {unknown}; available: {list(SOURCES)}")
+    return [SOURCES[n.strip()] for n in names.split(",") if n.strip()]
@@ -93,7 +93,8 @@ class TechnicalAnalyzer:
         
         # WAIT! If the user really wants ADX, we need High/Low.
         # NBP API actually provides Table C (Bid/Ask). Table A is Mid.
-        # We only fetch Table A.
+        # The miner stores Table C in rate_quotes (ask/bid as a high/low-style spread),
+        # but only for ~13 currencies; signals still use Table A mids.
         
         # ADAPTATION: We will calculate a "Trend Intensity" based on the consistency of returns.
         # Ratio of abs(Sum of returns) / Sum of abs(returns). (Efficiency Ratio).
@@ -186,3 +187,50 @@ class TechnicalAnalyzer:
                 signal = "HOLD"
                 
         return signal
+
+    def determine_signals(self, current_hist: np.ndarray, prev_hist: np.ndarray, rsi: np.ndarray, current_price: np.ndarray, sma_val: np.ndarray, bb_lower: np.ndarray, bb_upper: np.ndarray, adx: np.ndarray, weekly_trend: np.ndarray, adx_threshold: float = 25, rsi_oversold: float = 30, rsi_overbought: float = 70) -> np.ndarray:
+        """
+        Vectorized counterpart of determine_signal.
+        Takes whole indicator arrays (one element per bar) and returns an array of
+        "BUY" / "SELL" / "HOLD" strings, element-wise identical to calling
+        determine_signal with the scalar values of each bar.
+        The thresholds default to determine_signal's fixed values (ADX 25, RSI 30/70).
+        """
+        current_hist = np.asarray(current_hist, dtype=float)
+        prev_hist = np.asarray(prev_hist, dtype=float)
+        rsi = np.asarray(rsi, dtype=float)
+        current_price = np.asarray(current_price, dtype=float)
+        sma_val = np.asarray(sma_val, dtype=float)
+        bb_lower = np.asarray(bb_lower, dtype=float)
+        bb_upper = np.asarray(bb_upper, dtype=float)
+        adx = np.asarray(adx, dtype=float)
+        weekly_trend = np.asarray(weekly_trend).astype(str)
+
+        # Trend Context (Daily) - a missing SMA counts as both bullish and bearish
+        sma_missing = np.isnan(sma_val)
+        bullish_trend = sma_missing | (current_price > sma_val)
+        bearish_trend = sma_missing | (current_price < sma_val)
+
+        # BB Reversals (NaN bands compare False, same as the scalar path)
+        below_bb = current_price < bb_lower
+        above_bb = current_price > bb_upper
+
+        # --- STRATEGY SELECTION ---
+        trend_mode = adx > adx_threshold
+
+        macd_buy = (prev_hist < 0) & (current_hist > 0)
+        macd_sell = (prev_hist > 0) & (current_hist < 0)
+        trend_buy = macd_buy & bullish_trend
+        trend_sell = ~trend_buy & macd_sell & bearish_trend
+
+        range_buy = (rsi < rsi_oversold) | below_bb
+        range_sell = ~range_buy & ((rsi > rsi_overbought) | above_bb)
+
+        buy = np.where(trend_mode, trend_buy, range_buy)
+        sell = np.where(trend_mode, trend_sell, range_sell)
+
+        # --- MTF FILTER (The Safety Net) ---
+        buy &= ~((weekly_trend == "BEARISH") & (rsi > rsi_oversold))
+        sell &= ~((weekly_trend == "BULLISH") & (rsi < rsi_overbought))
+
+        return np.select([buy, sell], ["BUY", "SELL"], default="HOLD")
@@ -1,56 +1,90 @@
+import numbers
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Mapping, Optional, Tuple
 from .analysis import TechnicalAnalyzer
 
+# Strategy parameters; the defaults are the values TechnicalAnalyzer.determine_signal hard-codes
+DEFAULT_PARAMS = {
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'rsi_window': 14,
+    'sma_window': 50,
+    'bb_window': 20,
+    'bb_std': 2.0,
+    'adx_threshold': 25,
+    'rsi_oversold': 30,
+    'rsi_overbought': 70,
+}
+
+TRADING_DAYS = 252 # for annualizing the Sharpe ratio
+# Indicator windows, in bars
+WINDOW_PARAMS = ('macd_fast', 'macd_slow', 'macd_signal', 'rsi_window', 'sma_window', 'bb_window')
+
+
+def check_param(name: str, value: Any) -> Any:
+    """
+    Validates one strategy parameter value: windows must be whole numbers of at
+    least 1 (returned as int, so 14.0 and 14 are the same window) and the Bollinger
+    band width positive. Raises ValueError otherwise.
+    """
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or not np.isfinite(value):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    if name in WINDOW_PARAMS:
+        if value != int(value) or value < 1:
+            raise ValueError(f"{name} must be a whole number of at least 1, got {value!r}")
+        return int(value)
+    if name == 'bb_std' and value <= 0:
+        raise ValueError(f"bb_std must be positive, got {value!r}")
+    return value
+
+
 class Backtester:
-    def __init__(self, initial_capital: float = 10000.0):
+    def __init__(self, initial_capital: float = 10000.0, params: Optional[Dict[str, Any]] = None):
+        unknown = set(params or {}) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown strategy parameters: {', '.join(sorted(unknown))}")
         self.initial_capital = initial_capital
+        self.params = {**DEFAULT_PARAMS, **{name: check_param(name, v) for name, v in (params or {}).items()}}
         self.analyzer = TechnicalAnalyzer()
 
-    def run(self, df_prices: pd.DataFrame) -> Dict[str, Any]:
+    @property
+    def warmup(self) -> int:
+        # Trade starting from day 50 (or the SMA window, if longer) to have SMA/MACD valid
+        return max(50, self.params['sma_window'])
+
+    def weekly_trend(self, df_prices: pd.DataFrame) -> np.ndarray:
         """
-        Runs the backtest simulation.
-        df_prices must have 'date' and 'price' columns and be sorted ascending by date.
+        Weekly trend per daily bar (BULLISH / BEARISH, NEUTRAL before the first weekly close).
+        Independent of the strategy parameters.
         """
-        capital = self.initial_capital
-        position = 0.0 # Amount of asset held
-        equity_curve = []
-        trades = []
-        
-        # Pre-calculate indicators for the whole series to speed up lookups
-        # (In real-time trading we calculate step-by-step, but here vectorized calc is safe 
-        # as long as we access index i using data up to i)
-        
-        # Ensure we have enough data
-        if len(df_prices) < 50:
-            return {"error": "Not enough data for backtest (min 50 days)"}
-
-        # Calculate indicators over full history
-        prices_series = df_prices['price']
-        macd_df = self.analyzer.calculate_macd(prices_series)
-        rsi_series = self.analyzer.calculate_rsi(prices_series)
-        sma_series = self.analyzer.calculate_sma(prices_series, window=50)
-        bb_df = self.analyzer.calculate_bollinger_bands(prices_series)
-        adx_series = self.analyzer.calculate_adx(df_prices)
-        
-        # Weekly Trend Pre-calculation (Vectorized)
         df_weekly = self.analyzer.resample_to_weekly(df_prices)
         # Calculate SMA 20 on Weekly
         df_weekly['sma20_weekly'] = df_weekly['price'].rolling(window=20).mean()
-        df_weekly['weekly_trend'] = df_weekly.apply(
-            lambda x: "BULLISH" if pd.notna(x['sma20_weekly']) and x['price'] > x['sma20_weekly'] else "BEARISH", axis=1
+        df_weekly['weekly_trend'] = np.where(
+            df_weekly['sma20_weekly'].notna() & (df_weekly['price'] > df_weekly['sma20_weekly']),
+            "BULLISH", "BEARISH"
         )
-        # Merge back to Daily (Forward Fill to propagate weekly status to subsequent days)
-        # We need to join on date. Daily dates fall between weekly dates.
-        # Use asof merge or reindex with ffill.
-        df_daily_trend = df_prices[['date']].set_index('date')
-        df_weekly_trend = df_weekly[['weekly_trend']] # indexed by date
-        
         # Merge weekly trend to daily dates (forward fill the last known weekly trend)
-        df_daily_trend = df_daily_trend.join(df_weekly_trend).ffill().fillna("NEUTRAL")
-        weekly_trend_series = df_daily_trend['weekly_trend'].values
-        
-        # Merge all into one df for easier iteration
+        df_daily_trend = df_prices[['date']].set_index('date')
+        df_daily_trend = df_daily_trend.join(df_weekly[['weekly_trend']]).ffill().fillna("NEUTRAL")
+        return df_daily_trend['weekly_trend'].values
+
+    def prepare_indicators(self, df_prices: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculates every indicator used by the strategy over the full history.
+        Returns a copy of df_prices with columns:
+        ['macd', 'signal_line', 'hist', 'rsi', 'sma', 'bb_lower', 'bb_upper', 'adx', 'weekly_trend']
+        """
+        p = self.params
+        prices_series = df_prices['price']
+        macd_df = self.analyzer.calculate_macd(prices_series, fast=p['macd_fast'], slow=p['macd_slow'], signal=p['macd_signal'])
+        rsi_series = self.analyzer.calculate_rsi(prices_series, window=p['rsi_window'])
+        sma_series = self.analyzer.calculate_sma(prices_series, window=p['sma_window'])
+        bb_df = self.analyzer.calculate_bollinger_bands(prices_series, window=p['bb_window'], num_std=p['bb_std'])
+        adx_series = self.analyzer.calculate_adx(df_prices)
+
         df = df_prices.copy()
         df['macd'] = macd_df['macd']
         df['signal_line'] = macd_df['signal']
@@ -60,81 +94,226 @@ class Backtester:
         df['bb_lower'] = bb_df['bb_lower']
         df['bb_upper'] = bb_df['bb_upper']
         df['adx'] = adx_series
-        df['weekly_trend'] = weekly_trend_series
-        
-        # Iterate starting from day 50 (to have SMA/MACD valid)
-        for i in range(50, len(df)):
-            row = df.iloc[i]
-            prev_row = df.iloc[i-1]
-            prev2_row = df.iloc[i-2] # Need prev-prev for crossover check sometimes
-            
-            date = row['date']
-            price = row['price']
-            
-            # Logic Context
-            curr_hist = row['hist']
-            prev_hist = prev_row['hist']
-            curr_rsi = row['rsi']
-            curr_sma = row['sma']
-            curr_bb_lower = row['bb_lower']
-            curr_bb_upper = row['bb_upper']
-            curr_adx = row['adx']
-            curr_weekly_trend = row['weekly_trend']
-            
-            # Re-use the EXACT logic from TechnicalAnalyzer
-            # Note: The analyzer function expects pure floats
-            signal = self.analyzer.determine_signal(
-                current_hist=float(curr_hist),
-                prev_hist=float(prev_hist),
-                rsi=float(curr_rsi),
-                current_price=float(price),
-                sma_val=float(curr_sma),
-                bb_lower=float(curr_bb_lower),
-                bb_upper=float(curr_bb_upper),
-                adx=float(curr_adx),
-                weekly_trend=str(curr_weekly_trend)
-            )
-            
-            # Execute Trade
-            if signal == "BUY" and position == 0:
-                # Buy with all capital
-                position = capital / price
-                capital = 0
-                trades.append({
-                    "date": date,
-                    "type": "BUY",
-                    "price": price,
-                    "value": position * price
-                })
-            
-            elif signal == "SELL" and position > 0:
-                # Sell all position
-                capital = position * price
-                position = 0
-                trades.append({
-                    "date": date,
-                    "type": "SELL",
-                    "price": price,
-                    "value": capital
-                })
-            
-            # Record Equity
-            current_value = capital + (position * price)
-            equity_curve.append({
-                "date": date,
-                "equity": current_value,
-                "drawdown": 0 # TODO calc drawdown
-            })
+        df['weekly_trend'] = self.weekly_trend(df_prices)
+        return df
+
+    def generate_signals(self, df: Mapping[str, Any]) -> np.ndarray:
+        """
+        Evaluates the strategy on every bar of an indicator frame from prepare_indicators
+        (or any mapping of the same columns to arrays).
+        The first bar has no previous histogram and always yields "HOLD".
+        """
+        hist = np.asarray(df['hist'], dtype=float)
+        prev_hist = np.concatenate(([np.nan], hist[:-1]))
+        return self.analyzer.determine_signals(
+            current_hist=hist,
+            prev_hist=prev_hist,
+            rsi=np.asarray(df['rsi'], dtype=float),
+            current_price=np.asarray(df['price'], dtype=float),
+            sma_val=np.asarray(df['sma'], dtype=float),
+            bb_lower=np.asarray(df['bb_lower'], dtype=float),
+            bb_upper=np.asarray(df['bb_upper'], dtype=float),
+            adx=np.asarray(df['adx'], dtype=float),
+            weekly_trend=np.asarray(df['weekly_trend']),
+            adx_threshold=self.params['adx_threshold'],
+            rsi_oversold=self.params['rsi_oversold'],
+            rsi_overbought=self.params['rsi_overbought'],
+        )
+
+    def equity(self, prices: np.ndarray, signals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        All-in / all-out position state machine over signal arrays.
+        Starting flat, a BUY executes only when flat and a SELL only when holding,
+        so a signal executes exactly when it differs from the previous non-HOLD signal.
+        Returns (indices of executed trades, equity per bar, holding-a-position mask per bar).
+        """
+        prices = np.asarray(prices, dtype=float)
+        n = len(prices)
+
+        active_idx = np.flatnonzero(signals != "HOLD")
+        active = signals[active_idx]
+        previous = np.concatenate((["SELL"], active[:-1]))
+        trade_idx = active_idx[active != previous]
+
+        # Cash / units only change on trade bars, so walk the (few) trades
+        # and broadcast the resulting state over the bars in between.
+        capital = self.initial_capital
+        position = 0.0
+        seg_capital = np.empty(len(trade_idx) + 1)
+        seg_position = np.empty(len(trade_idx) + 1)
+        seg_capital[0], seg_position[0] = capital, position
 
-        # Finalize
-        final_value = capital + (position * df.iloc[-1]['price'])
-        total_return_pct = ((final_value - self.initial_capital) / self.initial_capital) * 100
-        
+        for k, i in enumerate(trade_idx):
+            if signals[i] == "BUY":
+                position = capital / prices[i]
+                capital = 0.0
+            else:
+                capital = position * prices[i]
+                position = 0.0
+            seg_capital[k + 1], seg_position[k + 1] = capital, position
+
+        segment = np.searchsorted(trade_idx, np.arange(n), side='right')
+        return trade_idx, seg_capital[segment] + seg_position[segment] * prices, seg_position[segment] > 0
+
+    @staticmethod
+    def drawdown(equity: np.ndarray) -> np.ndarray:
+        """
+        Drawdown per bar in % (0 at a new equity high, negative below it).
+        """
+        peak = np.maximum.accumulate(equity)
+        return (equity - peak) / peak * 100
+
+    @staticmethod
+    def round_trips(trade_idx: np.ndarray, equity: np.ndarray) -> Tuple[int, int]:
+        """
+        (winning, closed) BUY -> SELL round trips. Trades alternate starting with a BUY,
+        and the equity on a trade bar is the traded value.
+        """
+        sells = trade_idx[1::2]
+        buys = trade_idx[0::2][:len(sells)]
+        return int((equity[sells] > equity[buys]).sum()), len(sells)
+
+    def summary(self, trade_idx: np.ndarray, equity: np.ndarray, holding: np.ndarray, round_trips: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """
+        Performance metrics of an equity curve:
+        return, max drawdown, annualized Sharpe ratio (risk-free rate 0),
+        hit rate (share of profitable closed round trips) and exposure (share of bars in the market).
+        round_trips overrides the (winning, closed) counts derived from trade_idx.
+        """
+        if not len(equity):
+            return {
+                "final_value": self.initial_capital, "total_return_pct": 0.0, "total_trades": 0,
+                "max_drawdown_pct": 0.0, "sharpe_ratio": None, "hit_rate_pct": None, "exposure_pct": 0.0,
+            }
+
+        final_value = float(equity[-1])
+        returns = np.diff(equity) / equity[:-1]
+        std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+        wins, closed = round_trips if round_trips is not None else self.round_trips(trade_idx, equity)
         return {
-            "initial_capital": self.initial_capital,
             "final_value": final_value,
-            "total_return_pct": total_return_pct,
-            "total_trades": len(trades),
+            "total_return_pct": ((final_value - self.initial_capital) / self.initial_capital) * 100,
+            "total_trades": len(trade_idx),
+            "max_drawdown_pct": float(self.drawdown(equity).min()),
+            "sharpe_ratio": float(returns.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else None,
+            "hit_rate_pct": wins / closed * 100 if closed else None,
+            "exposure_pct": float(holding.mean() * 100),
+        }
+
+    def simulate(self, dates: List[Any], prices: np.ndarray, signals: np.ndarray) -> Dict[str, Any]:
+        """
+        Full simulation report (metrics, trades and daily equity curve) for signal arrays.
+        """
+        prices = np.asarray(prices, dtype=float)
+        trade_idx, equity, holding = self.equity(prices, signals)
+
+        # On a trade bar the equity is exactly the traded value
+        trades = [
+            {"date": dates[i], "type": str(signals[i]), "price": float(prices[i]), "value": float(equity[i])}
+            for i in trade_idx
+        ]
+
+        return {
+            "initial_capital": self.initial_capital,
+            **self.summary(trade_idx, equity, holding),
             "trades": trades,
-            "equity_curve": equity_curve
+            "equity_curve": self.equity_curve(dates, equity),
+        }
+
+    def equity_curve(self, dates: List[Any], equity: np.ndarray) -> List[Dict[str, Any]]:
+        return [
+            {"date": d, "equity": e, "drawdown": dd}
+            for d, e, dd in zip(dates, equity.tolist(), self.drawdown(equity).tolist())
+        ]
+
+    def evaluate(self, prices: np.ndarray, signals: np.ndarray) -> Dict[str, Any]:
+        """
+        Summary metrics only (no per-day records), for parameter sweeps.
+        """
+        return self.summary(*self.equity(prices, signals))
+
+    def _prepare(self, df_prices: pd.DataFrame) -> Tuple[List[Any], np.ndarray, np.ndarray]:
+        """
+        Indicators and signals over the full history: (dates, prices, signals).
+        """
+        df = self.prepare_indicators(df_prices)
+        signals = self.generate_signals(df)
+
+        dates = df['date']
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            # Report plain calendar dates regardless of how the history was loaded
+            dates = dates.dt.date
+        return dates.tolist(), df['price'].to_numpy(dtype=float), signals
+
+    def run(self, df_prices: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Runs the backtest simulation.
+        df_prices must have 'date' and 'price' columns and be sorted ascending by date.
+        """
+        start = self.warmup
+        # Ensure we have enough data
+        if len(df_prices) < start:
+            return {"error": f"Not enough data for backtest (min {start} days)"}
+
+        dates, prices, signals = self._prepare(df_prices)
+        return self.simulate(dates[start:], prices[start:], signals[start:])
+
+    def walk_forward(self, df_prices: pd.DataFrame, train_days: int = 252, test_days: int = 63) -> Dict[str, Any]:
+        """
+        Rolling walk-forward evaluation: after the warm-up, history is cut into
+        consecutive test windows of `test_days` bars, each preceded by the
+        `train_days` bars before it (in-sample reference). Every window is
+        simulated on its own, starting flat with the initial capital.
+
+        Indicators and signals are computed once over the full series and only
+        sliced per window, so the cost stays linear in the history length.
+        The aggregate compounds the out-of-sample (test) windows back to back.
+        """
+        if train_days < 1 or test_days < 1:
+            raise ValueError("train_days and test_days must be positive")
+
+        first_test = self.warmup + train_days
+        if len(df_prices) <= first_test:
+            return {"error": f"Not enough data for walk-forward backtest (min {first_test + 1} days)"}
+
+        dates, prices, signals = self._prepare(df_prices)
+        n = len(prices)
+
+        windows = []
+        oos_equity, oos_holding = [], []
+        wins = closed = total_trades = 0
+        capital = self.initial_capital
+        for test_start in range(first_test, n, test_days):
+            train = slice(test_start - train_days, test_start)
+            test = slice(test_start, min(test_start + test_days, n))
+            trade_idx, equity, holding = self.equity(prices[test], signals[test])
+
+            windows.append({
+                "train_start": dates[train.start],
+                "train_end": dates[train.stop - 1],
+                "test_start": dates[test.start],
+                "test_end": dates[test.stop - 1],
+                "train": self.evaluate(prices[train], signals[train]),
+                "test": self.summary(trade_idx, equity, holding),
+            })
+
+            # Equity scales linearly with the starting capital: chain the windows
+            oos_equity.append(equity * (capital / self.initial_capital))
+            oos_holding.append(holding)
+            capital = float(oos_equity[-1][-1])
+            w, c = self.round_trips(trade_idx, equity)
+            wins, closed, total_trades = wins + w, closed + c, total_trades + len(trade_idx)
+
+        equity = np.concatenate(oos_equity)
+        aggregate = self.summary(np.empty(0, dtype=int), equity, np.concatenate(oos_holding), round_trips=(wins, closed))
+        aggregate["total_trades"] = total_trades
+
+        return {
+            "mode": "walk_forward",
+            "initial_capital": self.initial_capital,
+            "train_days": train_days,
+            "test_days": test_days,
+            "windows": windows,
+            "aggregate": aggregate,
+            "equity_curve": self.equity_curve(dates[first_test:], equity),
         }
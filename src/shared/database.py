@@ -1,11 +1,166 @@
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from .models import Base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from typing import Any, Dict, Iterator
+from uuid import uuid4
 import os
+import time
+
+from .metrics import instrument_engine, register_collector
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Connection pool per service: the API serves many short concurrent sessions,
+# the miner and the brain hold a few long ones, one-shot commands need almost none.
+# Every value can be overridden with DB_<NAME> (e.g. DB_POOL_SIZE=30).
+POOL_PROFILES: Dict[str, Dict[str, int]] = {
+    "api": {"pool_size": 20, "max_overflow": 30, "pool_timeout": 10, "pool_recycle": 1800, "statement_cache_size": 500},
+    "worker": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 60, "pool_recycle": 3600, "statement_cache_size": 100},
+    "cli": {"pool_size": 2, "max_overflow": 2, "pool_timeout": 60, "pool_recycle": 3600, "statement_cache_size": 100},
+}
+DB_POOL_PROFILE = os.getenv("DB_POOL_PROFILE", "worker")
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# PgBouncer in transaction mode in front of PostgreSQL: PgBouncer does the pooling,
+# and prepared statements cannot be cached since they do not survive between transactions
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+
+def pool_settings(profile: str = DB_POOL_PROFILE) -> Dict[str, int]:
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"Unknown DB_POOL_PROFILE {profile}; choose one of {', '.join(POOL_PROFILES)}")
+    return {name: int(os.getenv(f"DB_{name.upper()}", value)) for name, value in POOL_PROFILES[profile].items()}
+
+
+class PoolMetrics:
+    """
+    Counters of the engine's pool: checkouts, time spent waiting for a connection,
+    overflow connections opened beyond pool_size, and checkouts that timed out.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checked_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float):
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that reports waits, overflow and timeouts to pool_metrics.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start)
+
+    def _inc_overflow(self) -> bool:
+        incremented = super()._inc_overflow()
+        # The counter starts at -pool_size; above 0 it is a connection beyond the pool
+        if incremented and self._overflow > 0:
+            pool_metrics.overflow_events += 1
+        return incremented
+
+
+def engine_options(url: str, profile: str = DB_POOL_PROFILE) -> Dict[str, Any]:
+    """
+    create_async_engine() arguments for a pool profile, and for PgBouncer when enabled.
+    """
+    settings = pool_settings(profile)
+    if DB_PGBOUNCER:
+        return {
+            "poolclass": NullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            },
+        }
+
+    options = {
+        "poolclass": MeteredQueuePool,
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_recycle": settings["pool_recycle"],
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings["statement_cache_size"]}
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+    pool_metrics.checked_out += 1
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.checked_out -= 1
+
+
+def pool_stats() -> Dict[str, Any]:
+    pool = engine.pool
+    m = pool_metrics
+    stats = {
+        "profile": DB_POOL_PROFILE,
+        "pgbouncer": DB_PGBOUNCER,
+        "pool": type(pool).__name__,
+        "checked_out": m.checked_out,
+        "checkouts": m.checkouts,
+        "wait_ms_avg": round(m.wait_seconds_total / m.checkouts * 1000, 3) if m.checkouts else 0.0,
+        "wait_ms_max": round(m.wait_seconds_max * 1000, 3),
+        "wait_seconds_total": round(m.wait_seconds_total, 6),
+        "overflow_events": m.overflow_events,
+        "timeouts": m.timeouts,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "checked_out": pool.checkedout(),
+            "size": pool.size(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool_settings()["max_overflow"],
+        })
+    return stats
+
+
+def _pool_metric_families() -> Iterator[Any]:
+    stats = pool_stats()
+    yield GaugeMetricFamily("charon_db_pool_checked_out", "Connections currently checked out", value=stats["checked_out"])
+    if "size" in stats:
+        yield GaugeMetricFamily("charon_db_pool_size", "Configured pool size", value=stats["size"])
+        yield GaugeMetricFamily("charon_db_pool_overflow", "Open connections beyond pool_size", value=stats["overflow"])
+    yield CounterMetricFamily("charon_db_pool_checkouts", "Connection checkouts", value=stats["checkouts"])
+    yield CounterMetricFamily("charon_db_pool_wait_seconds", "Time spent waiting for a connection", value=stats["wait_seconds_total"])
+    yield CounterMetricFamily("charon_db_pool_overflow_events", "Overflow connections opened", value=stats["overflow_events"])
+    yield CounterMetricFamily("charon_db_pool_timeouts", "Checkouts that timed out", value=stats["timeouts"])
+
+
+instrument_engine(engine)
+register_collector("db_pool", _pool_metric_families)
+
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -13,10 +168,14 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def release_connection(session: AsyncSession):
+    """
+    Hands the session's connection back to the pool once everything is read, so
+    CPU-bound work on the results (and response encoding) does not hold it.
+    Loaded objects stay usable; the session checks out a new connection if used again.
+    """
+    await session.close()
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from .memory_redis import MemoryRedis
+from .metrics import EVENTS_TOTAL, inc
+
+logger = logging.getLogger("events")
+
+INGEST_CHANNEL = "rates.ingested"
+# Entries kept per stream (approximate trim on every add)
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+# Entries one consumer takes per read
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "64"))
+EVENT_BLOCK_MS = int(os.getenv("EVENT_BLOCK_MS", "5000"))
+# Entries taken but not acked for this long (consumer died or failed) go to another consumer
+EVENT_CLAIM_IDLE_MS = int(os.getenv("EVENT_CLAIM_IDLE_MS", "60000"))
+# Deliveries after which an entry is moved to the dead-letter stream instead
+EVENT_MAX_DELIVERIES = int(os.getenv("EVENT_MAX_DELIVERIES", "5"))
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def connect(url: str):
+    """
+    A Redis client for `url`; memory:// gives the in-process stand-in (tests, local runs).
+    """
+    if url.startswith("memory://"):
+        return MemoryRedis.from_url(url)
+    return redis.from_url(url)
+
+
+def stream_key(channel: str) -> str:
+    return f"stream:{channel}"
+
+
+def dead_letter_key(stream: str) -> str:
+    return f"{stream}:dead"
+
+
+def asset_events(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Splits an ingest event into one event per asset, the unit of work consumers
+    share. The row count only exists for the whole import and is dropped.
+    """
+    codes = event.get('codes')
+    if not codes:
+        return [event]
+    common = {k: v for k, v in event.items() if k not in ('codes', 'count')}
+    return [{**common, 'codes': [code]} for code in codes]
+
+
+def coalesce(events: List[Dict[str, Any]]) -> Dict[Tuple[str, Optional[str]], Dict[str, Any]]:
+    """
+    Merges ingest events per asset, keyed by (type, code), code None for gold:
+    the union of their date ranges ("from" / "to", ISO dates) and how many events
+    named the asset. Events without a type are dropped. Besides ingests ('currency',
+    'gold') the stream carries 'forecast' requests from the API, also per code.
+    """
+    merged: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+    for event in events:
+        kind = event.get('type')
+        if kind is None:
+            continue
+        codes = [c.upper() for c in event.get('codes', [])] if kind in ('currency', 'forecast') else [None]
+        for code in codes:
+            entry = merged.setdefault((kind, code), {"from": None, "to": None, "events": 0})
+            entry["events"] += 1
+            if event.get('from') and (entry["from"] is None or event['from'] < entry["from"]):
+                entry["from"] = event['from']
+            if event.get('to') and (entry["to"] is None or event['to'] > entry["to"]):
+                entry["to"] = event['to']
+    return merged
+
+
+class RefreshQueue:
+    """
+    Runs `refresh` for queued asset codes in at most one background task. Codes
+    queued while a run is in flight are merged and handled by the next run, so
+    windows arriving faster than a refresh completes do not pile up overlapping
+    tasks. A code queued with `flag` set keeps it until its run ({code: flag} is
+    what `refresh` gets).
+    """
+
+    def __init__(self, name: str, refresh: Callable[[Dict[str, bool]], Awaitable[Any]]):
+        self.name = name
+        self.refresh = refresh
+        self.pending: Dict[str, bool] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, codes: Iterable[str], flag: bool = False) -> asyncio.Task:
+        for code in codes:
+            code = code.upper()
+            self.pending[code] = self.pending.get(code, False) or flag
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._drain())
+        return self.task
+
+    async def _drain(self):
+        while self.pending:
+            batch, self.pending = self.pending, {}
+            try:
+                await self.refresh(batch)
+            except Exception as e:
+                logger.error(f"{self.name} refresh failed for {', '.join(batch)}: {e}")
+
+
+async def add_events(client, stream: str, events: List[Dict[str, Any]]) -> List[str]:
+    """
+    Appends events to a stream in one transaction, so consumers see them together.
+    """
+    async with client.pipeline(transaction=True) as pipe:
+        for event in events:
+            pipe.xadd(stream, {"data": json.dumps(event)}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        ids = await pipe.execute()
+    return [_text(i) for i in ids]
+
+
+class StreamConsumer:
+    """
+    One member of a Redis Streams consumer group: every entry goes to one consumer
+    of the group and stays pending until acked. Entries a consumer left unacked
+    for EVENT_CLAIM_IDLE_MS (it crashed, or processing failed) are reclaimed by the
+    next read of any consumer; after EVENT_MAX_DELIVERIES they are moved to the
+    dead-letter stream instead of being retried forever.
+    """
+
+    def __init__(self, client, stream: str, group: str, consumer: Optional[str] = None,
+                 batch_size: int = EVENT_BATCH_SIZE, block_ms: int = EVENT_BLOCK_MS,
+                 claim_idle_ms: int = EVENT_CLAIM_IDLE_MS, max_deliveries: int = EVENT_MAX_DELIVERIES):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        # Container hostnames tell replicas apart
+        self.consumer = consumer or socket.gethostname()
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+
+    async def ensure_group(self):
+        # Starting at 0, a new group also gets the entries added before it existed
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group {self.group} on {self.stream}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _decode(self, entries) -> Tuple[List[Event], List[Tuple[str, Dict]]]:
+        events, invalid = [], []
+        for entry_id, fields in entries:
+            try:
+                events.append((_text(entry_id), json.loads(fields[b"data"])))
+            except (KeyError, TypeError, ValueError):
+                logger.error(f"Malformed entry {_text(entry_id)} on {self.stream}: {fields}")
+                invalid.append((entry_id, fields))
+        return events, invalid
+
+    async def _dead_letter(self, entries: List[Tuple[str, Dict]], reason: str):
+        """
+        Moves entries, with their original fields, to the dead-letter stream and acks them.
+        """
+        if not entries:
+            return
+        ids = [_text(entry_id) for entry_id, _ in entries]
+        async with self.client.pipeline(transaction=True) as pipe:
+            for (entry_id, fields) in entries:
+                record = {**fields, "id": _text(entry_id), "reason": reason}
+                pipe.xadd(dead_letter_key(self.stream), record, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, *ids)
+            await pipe.execute()
+        inc(EVENTS_TOTAL, len(ids), stream=self.stream, outcome="dead")
+        logger.error(f"Moved {len(ids)} entries of {self.stream} to {dead_letter_key(self.stream)}: {reason}")
+
+    async def _reclaim(self) -> List[Event]:
+        result = await self.client.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms,
+            start_id="0-0", count=self.batch_size,
+        )
+        # Entries trimmed away while pending come back as None
+        claimed = [(entry_id, fields) for entry_id, fields in result[1] if fields]
+        if not claimed:
+            return []
+
+        first, last = claimed[0][0], claimed[-1][0]
+        pending = await self.client.xpending_range(self.stream, self.group, min=first, max=last, count=len(claimed))
+        deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+        retry = [(i, f) for i, f in claimed if deliveries.get(i, 0) <= self.max_deliveries]
+        exhausted = [(i, f) for i, f in claimed if deliveries.get(i, 0) > self.max_deliveries]
+        await self._dead_letter(exhausted, f"not acked after {self.max_deliveries} deliveries")
+
+        events, invalid = self._decode(retry)
+        await self._dead_letter(invalid, "malformed")
+        if events:
+            inc(EVENTS_TOTAL, len(events), stream=self.stream, outcome="reclaimed")
+            logger.warning(f"Reclaimed {len(events)} unacked entries of {self.stream}")
+        return events
+
+    async def read(self, block_ms: Optional[int] = None) -> List[Event]:
+        """
+        Up to batch_size (entry id, event) pairs: reclaimed entries first, then new
+        ones. Blocks up to block_ms (default: the consumer's) when there is nothing
+        to do; returns [] then.
+        """
+        events = await self._reclaim()
+        if len(events) < self.batch_size:
+            # BLOCK 0 would wait forever
+            block = max(1, block_ms if block_ms is not None else self.block_ms)
+            response = await self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"},
+                count=self.batch_size - len(events), block=None if events else block,
+            )
+            for _, entries in response or []:
+                new, invalid = self._decode(entries)
+                await self._dead_letter(invalid, "malformed")
+                inc(EVENTS_TOTAL, len(new), stream=self.stream, outcome="read")
+                events.extend(new)
+        return events
+
+    async def ack(self, ids: List[str]):
+        if ids:
+            await self.client.xack(self.stream, self.group, *ids)
+            inc(EVENTS_TOTAL, len(ids), stream=self.stream, outcome="acked")
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .history import load_price_arrays
+from .models import ForecastModel
+from .upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+MIN_FORECAST_ROWS = 30
+
+
+def fit_model(dates: List[date], values: List[float]) -> str:
+    """
+    Fits a Prophet model on a daily series and returns it serialized to JSON.
+    CPU-heavy and self-contained, meant to run in a worker process.
+    """
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    df = pd.DataFrame({'ds': pd.to_datetime(dates), 'y': values})
+    m = Prophet(daily_seasonality=False) # NBP is daily anyway
+    m.fit(df)
+    return model_to_json(m)
+
+
+def load_model(model_json: str) -> Any:
+    from prophet.serialize import model_from_json
+    return model_from_json(model_json)
+
+
+def forecast(model: Any, days: int) -> List[Dict[str, Any]]:
+    """
+    Forecasts the next `days` days from a fitted model (only the future part).
+    """
+    future = model.make_future_dataframe(periods=days, include_history=False)
+    predictions = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    return predictions.to_dict(orient='records')
+
+
+async def refresh_forecast_model(session: AsyncSession, asset_code: str, executor: Executor) -> Optional[ForecastModel]:
+    """
+    Refits the stored model of an asset on its full history (in `executor`) unless
+    the stored one already covers the latest data date. Returns None when there
+    is not enough data to fit. The model is upserted, and only over an older one,
+    so concurrent refreshes of the same asset (brain replicas) both succeed.
+    """
+    code = asset_code.upper()
+    dates, prices = await load_price_arrays(session, code)
+    if len(prices) < MIN_FORECAST_ROWS:
+        return None
+
+    last_date = dates[-1].item()
+    if await stored_model_date(session, code) == last_date:
+        return await session.get(ForecastModel, code)
+
+    loop = asyncio.get_running_loop()
+    model_json = await loop.run_in_executor(executor, fit_model, dates.tolist(), prices.tolist())
+
+    written = await upsert(
+        session, ForecastModel, {'asset_code': code, 'last_date': last_date, 'model': model_json},
+        key_columns=['asset_code'], where=lambda excluded: ForecastModel.last_date <= excluded.last_date,
+    )
+    await session.commit()
+    if written:
+        logger.info(f"Forecast model for {code} fitted on data up to {last_date}")
+    return await session.get(ForecastModel, code, populate_existing=True)
+
+
+async def stored_model_date(session: AsyncSession, asset_code: str) -> Optional[date]:
+    """
+    Last data date of the stored model, without loading the (large) model body.
+    """
+    return await session.scalar(
+        select(ForecastModel.last_date).where(ForecastModel.asset_code == asset_code.upper())
+    )
@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, case, Float, String, and_, cast, literal, or_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from .models import Rate, GoldPrice
+
+GOLD_CODE = "GOLD"
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _date_array(values: Iterable[date]) -> np.ndarray:
+    """
+    datetime64[D] array from date objects, built from their ordinals
+    (~25x faster than numpy converting every date object itself).
+    """
+    days = np.fromiter((d.toordinal() for d in values), dtype=np.int64)
+    return (days - _EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+async def _fetch_rows(session: AsyncSession, stmt) -> List:
+    # Core execution on the session's connection: plain rows, no ORM result processing
+    conn = await session.connection()
+    return (await conn.execute(stmt)).all()
+
+
+def price_columns(asset_code: str) -> Tuple:
+    """
+    Resolves an asset code to (date column, price column, filters).
+    'GOLD' maps to gold_prices, anything else to rates of that currency.
+    """
+    code = asset_code.upper()
+    if code == GOLD_CODE:
+        return GoldPrice.effective_date, GoldPrice.price, ()
+    return Rate.effective_date, Rate.rate_mid, (Rate.currency_code == code,)
+
+
+def price_history_query(
+    asset_code: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    tail: Optional[int] = None,
+) -> Select:
+    """
+    Builds a two-column (effective_date, price) select for an asset.
+    The price is cast to float in SQL so the driver never builds Decimal objects.
+    With `tail`, only the last N rows (by date) are selected, newest first.
+    """
+    date_col, price_col, filters = price_columns(asset_code)
+    stmt = select(date_col, cast(price_col, Float)).where(*filters)
+    if start_date:
+        stmt = stmt.where(date_col >= start_date)
+    if end_date:
+        stmt = stmt.where(date_col <= end_date)
+    if tail:
+        return stmt.order_by(date_col.desc()).limit(tail)
+    return stmt.order_by(date_col.asc())
+
+
+async def load_price_arrays(
+    session: AsyncSession,
+    asset_code: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    tail: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Loads an asset's price history as (dates: datetime64[D], prices: float64),
+    sorted ascending. No ORM objects are hydrated.
+    """
+    rows = await _fetch_rows(session, price_history_query(asset_code, start_date, end_date, tail))
+
+    dates = _date_array(r[0] for r in rows)
+    prices = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    if tail:
+        dates, prices = dates[::-1], prices[::-1]
+    return dates, prices
+
+
+async def load_price_history(
+    session: AsyncSession,
+    asset_code: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    tail: Optional[int] = None,
+    date_column: str = 'date',
+    price_column: str = 'price',
+) -> pd.DataFrame:
+    """
+    Same as load_price_arrays but wrapped in a DataFrame with columns
+    [date_column (datetime64), price_column (float64)], e.g. ('ds', 'y') for Prophet.
+    """
+    dates, prices = await load_price_arrays(session, asset_code, start_date, end_date, tail)
+    return pd.DataFrame({date_column: dates, price_column: prices})
+
+
+async def load_price_histories(
+    session: AsyncSession,
+    asset_codes: Iterable[str],
+    after: Optional[Dict[str, date]] = None,
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Loads several assets at once: all requested currencies come from a single
+    query (GOLD, if requested, from one more). `after` optionally maps an asset
+    to a date; only rows strictly newer than it are returned for that asset.
+    Every requested asset is present in the result, possibly with empty arrays.
+    """
+    codes = [c.upper() for c in asset_codes]
+    after = {c.upper(): d for c, d in (after or {}).items()}
+    histories = {}
+
+    currencies = [c for c in codes if c != GOLD_CODE]
+    if currencies:
+        stmt = select(Rate.currency_code, Rate.effective_date, cast(Rate.rate_mid, Float)).where(
+            Rate.currency_code.in_(currencies)
+        )
+        bounded = {c: d for c, d in after.items() if c in currencies}
+        if bounded:
+            stmt = stmt.where(Rate.effective_date > case(bounded, value=Rate.currency_code, else_=date.min))
+        rows = await _fetch_rows(session, stmt.order_by(Rate.currency_code, Rate.effective_date.asc()))
+
+        codes_col = np.array([r[0] for r in rows], dtype=object)
+        dates = _date_array(r[1] for r in rows)
+        prices = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        # Rows are grouped by code, so each asset is one contiguous slice
+        boundaries = np.flatnonzero(codes_col[1:] != codes_col[:-1]) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(rows)]):
+            if end > start:
+                histories[codes_col[start]] = (dates[start:end], prices[start:end])
+
+    if GOLD_CODE in codes:
+        start_date = after.get(GOLD_CODE)
+        histories[GOLD_CODE] = await load_price_arrays(
+            session, GOLD_CODE, start_date=start_date + timedelta(days=1) if start_date else None
+        )
+
+    empty = (np.array([], dtype='datetime64[D]'), np.array([], dtype=np.float64))
+    return {code: histories.get(code, empty) for code in codes}
+
+
+async def count_rows_until(session: AsyncSession, until: Dict[str, date]) -> Dict[str, int]:
+    """
+    Counts stored rows per asset up to (and including) a per-asset date,
+    with one grouped query for all currencies.
+    """
+    until = {c.upper(): d for c, d in until.items()}
+    counts = {}
+
+    currencies = {c: d for c, d in until.items() if c != GOLD_CODE}
+    if currencies:
+        stmt = (
+            select(Rate.currency_code, func.count())
+            .where(
+                Rate.currency_code.in_(list(currencies)),
+                Rate.effective_date <= case(currencies, value=Rate.currency_code),
+            )
+            .group_by(Rate.currency_code)
+        )
+        counts.update({code: n for code, n in (await session.execute(stmt)).all()})
+
+    if GOLD_CODE in until:
+        stmt = select(func.count()).select_from(GoldPrice).where(GoldPrice.effective_date <= until[GOLD_CODE])
+        counts[GOLD_CODE] = await session.scalar(stmt)
+
+    return {code: counts.get(code, 0) for code in until}
+
+
+def _tail_start(asset_code: str, tail: int):
+    """
+    Date of an asset's N-th latest row as an uncorrelated scalar subquery
+    (one index seek, evaluated once), or date.min when it has fewer rows.
+    """
+    date_col, _, filters = price_columns(asset_code)
+    nth_latest = select(date_col).where(*filters).order_by(date_col.desc()).limit(1).offset(tail - 1)
+    return func.coalesce(nth_latest.scalar_subquery(), date.min)
+
+
+async def load_price_matrix(
+    session: AsyncSession,
+    asset_codes: Iterable[str],
+    tail: Optional[int] = None,
+) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    Loads several assets (GOLD included) with a single query and pivots them into
+    a wide matrix: (dates: datetime64[D], codes, prices[date, asset] with NaN where
+    an asset has no row). With `tail`, only the last N rows of each asset are read,
+    bounded by a per-asset start date so no window function / sort is needed.
+    Assets without any rows are left out of `codes`.
+    """
+    codes = list(dict.fromkeys(c.upper() for c in asset_codes))
+    currencies = [c for c in codes if c != GOLD_CODE]
+
+    parts = []
+    if currencies:
+        stmt = select(Rate.currency_code, Rate.effective_date, cast(Rate.rate_mid, Float))
+        if tail:
+            stmt = stmt.where(or_(*(
+                and_(Rate.currency_code == code, Rate.effective_date >= _tail_start(code, tail)) for code in currencies
+            )))
+        else:
+            stmt = stmt.where(Rate.currency_code.in_(currencies))
+        parts.append(stmt)
+    if GOLD_CODE in codes:
+        stmt = select(literal(GOLD_CODE, String), GoldPrice.effective_date, cast(GoldPrice.price, Float))
+        if tail:
+            stmt = stmt.where(GoldPrice.effective_date >= _tail_start(GOLD_CODE, tail))
+        parts.append(stmt)
+    if not parts:
+        return np.array([], dtype='datetime64[D]'), [], np.empty((0, 0))
+
+    rows = await _fetch_rows(session, union_all(*parts) if len(parts) > 1 else parts[0])
+    row_codes = np.array([r[0] for r in rows], dtype=object)
+    row_dates = _date_array(r[1] for r in rows)
+    row_prices = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+
+    present = set(row_codes.tolist())
+    codes = [c for c in codes if c in present]
+    column = {c: i for i, c in enumerate(codes)}
+
+    dates, date_idx = np.unique(row_dates, return_inverse=True)
+    matrix = np.full((len(dates), len(codes)), np.nan)
+    matrix[date_idx, np.array([column[c] for c in row_codes.tolist()], dtype=np.intp)] = row_prices
+    return dates, codes, matrix
@@ -0,0 +1,389 @@
+import math
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .analysis import TechnicalAnalyzer
+
+
+def _dump(value: float) -> Optional[float]:
+    """JSON-safe float: NaN becomes None (PostgreSQL JSON rejects NaN tokens)."""
+    return None if value is None or math.isnan(value) else value
+
+
+def _load(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+class _Ewm:
+    """
+    Exponential moving average with adjust=False, replicating the pandas
+    ewm().mean() recurrence step by step (same alpha, same operation order).
+    """
+
+    def __init__(self, span: int):
+        com = (span - 1) / 2.0
+        self.alpha = 1.0 / (1.0 + com)
+        self.value = math.nan
+
+    def add(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        elif self.value != x:
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+        return self.value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"value": _dump(self.value)}
+
+    def load(self, data: Dict[str, Any]):
+        self.value = _load(data["value"])
+
+
+class _Rolling:
+    """
+    Base for fixed-window rolling aggregations. Mirrors the online add/remove
+    accumulators pandas uses for rolling windows (Kahan-compensated), so values
+    match the batch computation exactly and not just within rounding. The one
+    exception is the variance after a window of identical prices, which pandas
+    resets in a way not replicated here; it stays within ~1e-14 of the batch value.
+    """
+    _fields = ()
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = deque(maxlen=window)
+        self.nobs = 0
+        self.prev_value = math.nan
+        self.same_count = 0
+        self.started = False
+        for name in self._fields:
+            setattr(self, name, 0.0)
+
+    def add(self, x: float) -> float:
+        if not self.started:
+            self.started = True
+            self.prev_value = x
+        elif len(self.buffer) == self.window:
+            self._remove(self.buffer[0])
+        self.buffer.append(x)
+        if x == x:
+            self.nobs += 1
+            self.same_count = self.same_count + 1 if x == self.prev_value else 1
+            self.prev_value = x
+            self._add(x)
+        return self.value()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "buffer": [_dump(v) for v in self.buffer],
+            "nobs": self.nobs,
+            "prev_value": _dump(self.prev_value),
+            "same_count": self.same_count,
+            "started": self.started,
+        }
+        data.update({name: getattr(self, name) for name in self._fields})
+        return data
+
+    def load(self, data: Dict[str, Any]):
+        self.buffer = deque((_load(v) for v in data["buffer"]), maxlen=self.window)
+        self.nobs = data["nobs"]
+        self.prev_value = _load(data["prev_value"])
+        self.same_count = data["same_count"]
+        self.started = data["started"]
+        for name in self._fields:
+            setattr(self, name, data[name])
+
+    def copy(self) -> "_Rolling":
+        clone = type(self)(self.window)
+        clone.load(self.to_dict())
+        return clone
+
+
+class _RollingSum(_Rolling):
+    _fields = ("sum_x", "comp_add", "comp_remove")
+
+    def _add(self, x: float):
+        y = x - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+
+    def _remove(self, x: float):
+        if x == x:
+            self.nobs -= 1
+            y = -x - self.comp_remove
+            t = self.sum_x + y
+            self.comp_remove = t - self.sum_x - y
+            self.sum_x = t
+
+    def value(self) -> float:
+        if self.nobs < self.window:
+            return math.nan
+        if self.same_count >= self.nobs:
+            return self.prev_value * self.nobs
+        return self.sum_x
+
+
+class _RollingMean(_Rolling):
+    _fields = ("sum_x", "comp_add", "comp_remove", "neg_ct")
+
+    def _add(self, x: float):
+        y = x - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, x) < 0:
+            self.neg_ct += 1
+
+    def _remove(self, x: float):
+        if x == x:
+            self.nobs -= 1
+            y = -x - self.comp_remove
+            t = self.sum_x + y
+            self.comp_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, x) < 0:
+                self.neg_ct -= 1
+
+    def value(self) -> float:
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_count >= self.nobs:
+            return self.prev_value
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class _RollingVar(_Rolling):
+    _fields = ("mean_x", "ssqdm_x", "comp_add", "comp_remove")
+    ddof = 1
+
+    def _add(self, x: float):
+        prev_mean = self.mean_x - self.comp_add
+        y = x - self.comp_add
+        t = y - self.mean_x
+        self.comp_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (x - prev_mean) * (x - self.mean_x)
+
+    def _remove(self, x: float):
+        if x == x:
+            self.nobs -= 1
+            if self.nobs:
+                prev_mean = self.mean_x - self.comp_remove
+                y = x - self.comp_remove
+                t = y - self.mean_x
+                self.comp_remove = t + self.mean_x - y
+                self.mean_x = self.mean_x - t / self.nobs
+                self.ssqdm_x = self.ssqdm_x - (x - prev_mean) * (x - self.mean_x)
+            else:
+                self.mean_x = 0.0
+                self.ssqdm_x = 0.0
+
+    def value(self) -> float:
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return math.nan
+        result = self.ssqdm_x / (self.nobs - self.ddof)
+        return 0.0 if result < 0 else result
+
+
+class IncrementalIndicators:
+    """
+    Persistable indicator state for one asset, updated in O(1) per new price.
+    Produces the same values TechnicalAnalyzer computes over the full history
+    (MACD 12/26/9, RSI 14, SMA 50, BB 20/2, ER-based ADX 14, weekly SMA 20 trend).
+    """
+    # Bump when the indicator set or parameters change to force a full rebuild
+    VERSION = 1
+
+    def __init__(self):
+        self.count = 0
+        self.last_date: Optional[date] = None
+        self.last_price = math.nan
+        self.ema_fast = _Ewm(12)
+        self.ema_slow = _Ewm(26)
+        self.ema_signal = _Ewm(9)
+        self.macd = math.nan
+        self.signal_line = math.nan
+        self.hist = math.nan
+        self.prev_hist = math.nan
+        self.rsi_gain = _RollingMean(14)
+        self.rsi_loss = _RollingMean(14)
+        self.sma = _RollingMean(50)
+        self.bb_mid = _RollingMean(20)
+        self.bb_var = _RollingVar(20)
+        self.er_volatility = _RollingSum(14)
+        self.er_direction = _RollingSum(14)
+        # Weekly (W-FRI) closes: completed weeks are committed to the rolling
+        # mean, the current week's last price is kept aside until the week rolls.
+        self.weekly_sma = _RollingMean(20)
+        self.weekly_count = 0
+        self.week_end: Optional[date] = None
+        self.week_close = math.nan
+
+    @staticmethod
+    def _week_end(d: date) -> date:
+        # Same bucket as resample('W-FRI'): label is the Friday closing the week
+        return d + timedelta(days=(4 - d.weekday()) % 7)
+
+    def update(self, effective_date: date, price: float):
+        """
+        Feeds the next (strictly newer) daily price.
+        """
+        if self.last_date is not None and effective_date <= self.last_date:
+            raise ValueError(f"Out-of-order price for {effective_date} (state at {self.last_date})")
+
+        delta = price - self.last_price if self.count else math.nan
+
+        macd = self.ema_fast.add(price) - self.ema_slow.add(price)
+        signal_line = self.ema_signal.add(macd)
+        self.prev_hist = self.hist
+        self.macd, self.signal_line, self.hist = macd, signal_line, macd - signal_line
+
+        # RSI inputs exactly as delta.where(...) builds them (first bar: gain 0, loss -0.0)
+        self.rsi_gain.add(delta if delta > 0 else 0.0)
+        self.rsi_loss.add(-(delta if delta < 0 else 0.0))
+
+        self.sma.add(price)
+        self.bb_mid.add(price)
+        self.bb_var.add(price)
+
+        self.er_volatility.add(abs(delta))
+        self.er_direction.add(delta)
+
+        week_end = self._week_end(effective_date)
+        if week_end != self.week_end:
+            if self.week_end is not None:
+                self.weekly_sma.add(self.week_close)
+            self.weekly_count += 1
+            self.week_end = week_end
+        self.week_close = price
+
+        self.count += 1
+        self.last_date = effective_date
+        self.last_price = price
+
+    def rsi(self) -> float:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(self.rsi_gain.value()) / np.float64(self.rsi_loss.value())
+            return float(100 - (100 / (1 + rs)))
+
+    def adx(self) -> float:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            er = np.float64(abs(self.er_direction.value())) / np.float64(self.er_volatility.value())
+        adx = float(er * 100)
+        return 0.0 if math.isnan(adx) else adx
+
+    def bollinger(self) -> Dict[str, float]:
+        mid = self.bb_mid.value()
+        var = self.bb_var.value()
+        std = math.sqrt(var) if var == var else math.nan
+        return {'bb_upper': mid + std * 2.0, 'bb_mid': mid, 'bb_lower': mid - std * 2.0}
+
+    def weekly_trend(self) -> str:
+        if self.weekly_count < 20:
+            return "NEUTRAL"
+        # Evaluate the SMA with the (possibly partial) current week included
+        sma = self.weekly_sma.copy()
+        current_sma = sma.add(self.week_close)
+        if math.isnan(current_sma):
+            return "NEUTRAL"
+        return "BULLISH" if self.week_close > current_sma else "BEARISH"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Latest indicator values, shaped like the arguments of determine_signal.
+        """
+        bb = self.bollinger()
+        return {
+            'macd': self.macd,
+            'signal': self.signal_line,
+            'hist': self.hist,
+            'prev_hist': self.prev_hist,
+            'rsi': self.rsi(),
+            'price': self.last_price,
+            'sma': self.sma.value(),
+            'bb_lower': bb['bb_lower'],
+            'bb_upper': bb['bb_upper'],
+            'adx': self.adx(),
+            'weekly_trend': self.weekly_trend(),
+        }
+
+    _accumulators = (
+        'ema_fast', 'ema_slow', 'ema_signal', 'rsi_gain', 'rsi_loss', 'sma',
+        'bb_mid', 'bb_var', 'er_volatility', 'er_direction', 'weekly_sma',
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name).to_dict() for name in self._accumulators}
+        data.update({
+            'version': self.VERSION,
+            'count': self.count,
+            'last_date': self.last_date.isoformat() if self.last_date else None,
+            'last_price': _dump(self.last_price),
+            'macd': _dump(self.macd),
+            'signal_line': _dump(self.signal_line),
+            'hist': _dump(self.hist),
+            'prev_hist': _dump(self.prev_hist),
+            'weekly_count': self.weekly_count,
+            'week_end': self.week_end.isoformat() if self.week_end else None,
+            'week_close': _dump(self.week_close),
+        })
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IncrementalIndicators":
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported indicator state version: {data.get('version')}")
+        state = cls()
+        for name in cls._accumulators:
+            getattr(state, name).load(data[name])
+        state.count = data['count']
+        state.last_date = date.fromisoformat(data['last_date']) if data['last_date'] else None
+        state.last_price = _load(data['last_price'])
+        state.macd = _load(data['macd'])
+        state.signal_line = _load(data['signal_line'])
+        state.hist = _load(data['hist'])
+        state.prev_hist = _load(data['prev_hist'])
+        state.weekly_count = data['weekly_count']
+        state.week_end = date.fromisoformat(data['week_end']) if data['week_end'] else None
+        state.week_close = _load(data['week_close'])
+        return state
+
+
+def advance_states(
+    jobs: Dict[str, Tuple[Optional[Dict[str, Any]], List[date], List[float]]]
+) -> Dict[str, Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str], float]]:
+    """
+    Feeds new prices into several assets' indicator states and evaluates the strategy.
+    jobs maps asset_code -> (serialized state or None for a full rebuild, dates, prices).
+    Returns asset_code -> (new serialized state, indicator snapshot, signal, seconds spent);
+    snapshot and signal are None while the asset has fewer than 26 rows (not enough for MACD).
+    Plain data in and out so it can run in a ProcessPoolExecutor worker.
+    """
+    analyzer = TechnicalAnalyzer()
+    results = {}
+    for code, (state, dates, prices) in jobs.items():
+        start = time.perf_counter()
+        indicators = IncrementalIndicators.from_dict(state) if state else IncrementalIndicators()
+        for effective_date, price in zip(dates, prices):
+            indicators.update(effective_date, price)
+
+        values, decision = None, None
+        if indicators.count >= 26:
+            values = indicators.snapshot()
+            decision = analyzer.determine_signal(
+                values['hist'], values['prev_hist'], values['rsi'], values['price'], values['sma'],
+                values['bb_lower'], values['bb_upper'], values['adx'], values['weekly_trend']
+            )
+        results[code] = (indicators.to_dict(), values, decision, time.perf_counter() - start)
+    return results
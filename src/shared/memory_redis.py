@@ -0,0 +1,248 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from redis.exceptions import ResponseError
+
+StreamId = Tuple[int, int]
+Fields = Dict[bytes, bytes]
+
+_POLL_SECONDS = 0.005
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def _parse_id(value: Union[str, bytes], default_seq: int = 0) -> StreamId:
+    value = value.decode() if isinstance(value, bytes) else str(value)
+    if value == "-":
+        return (0, 0)
+    if value == "+":
+        return (2 ** 64, 0)
+    ms, _, seq = value.partition("-")
+    return int(ms), int(seq) if seq else default_seq
+
+
+def _format_id(stream_id: StreamId) -> bytes:
+    return f"{stream_id[0]}-{stream_id[1]}".encode()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class _Group:
+    def __init__(self, last_delivered: StreamId):
+        self.last_delivered = last_delivered
+        # entry id -> [consumer, delivery time (ms), times delivered]
+        self.pending: Dict[StreamId, List[Any]] = {}
+
+
+class _Stream:
+    def __init__(self):
+        self.entries: Dict[StreamId, Fields] = {}
+        self.last_id: StreamId = (0, 0)
+        self.groups: Dict[bytes, _Group] = {}
+
+
+class _Pipeline:
+    """
+    Queues commands and runs them back to back on execute(); with a single event
+    loop nothing can interleave, so the batch is as atomic as MULTI/EXEC.
+    """
+
+    def __init__(self, client: "MemoryRedis"):
+        self._client = client
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return [await getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands = []
+
+
+class MemoryRedis:
+    """
+    In-process stand-in for the Redis commands of the event bus (src/shared/events.py):
+    streams with consumer groups, PUBLISH and pipelines, with redis-py's signatures
+    and RESP2 replies (bytes). Selected with REDIS_URL=memory:// for tests and local
+    runs without a Redis server; clients of the same URL share state within a process.
+    Trimming is always exact and published messages have no subscribers.
+    """
+
+    _instances: Dict[str, "MemoryRedis"] = {}
+
+    def __init__(self):
+        self._streams: Dict[bytes, _Stream] = {}
+
+    @classmethod
+    def from_url(cls, url: str) -> "MemoryRedis":
+        return cls._instances.setdefault(url, cls())
+
+    def _group(self, name, groupname) -> Tuple[_Stream, _Group]:
+        stream = self._streams.get(_encode(name))
+        group = stream.groups.get(_encode(groupname)) if stream else None
+        if group is None:
+            raise ResponseError(f"NOGROUP No such key '{name}' or consumer group '{groupname}'")
+        return stream, group
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        return _Pipeline(self)
+
+    async def publish(self, channel, message) -> int:
+        return 0
+
+    async def xadd(self, name, fields: Dict[Any, Any], id="*", maxlen: Optional[int] = None, approximate: bool = True) -> bytes:
+        stream = self._streams.setdefault(_encode(name), _Stream())
+        if id == "*":
+            ms = max(_now_ms(), stream.last_id[0])
+            entry_id = (ms, stream.last_id[1] + 1 if ms == stream.last_id[0] else 0)
+        else:
+            entry_id = _parse_id(id)
+        if entry_id <= stream.last_id:
+            raise ResponseError("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.entries[entry_id] = {_encode(k): _encode(v) for k, v in fields.items()}
+        stream.last_id = entry_id
+        if maxlen is not None:
+            for old in list(stream.entries)[:max(0, len(stream.entries) - maxlen)]:
+                del stream.entries[old]
+        return _format_id(entry_id)
+
+    async def xlen(self, name) -> int:
+        stream = self._streams.get(_encode(name))
+        return len(stream.entries) if stream else 0
+
+    async def xrange(self, name, min="-", max="+", count: Optional[int] = None) -> List[Tuple[bytes, Fields]]:
+        stream = self._streams.get(_encode(name))
+        if stream is None:
+            return []
+        low, high = _parse_id(min), _parse_id(max)
+        found = [(_format_id(i), fields) for i, fields in stream.entries.items() if low <= i <= high]
+        return found[:count] if count is not None else found
+
+    async def xgroup_create(self, name, groupname, id="$", mkstream: bool = False) -> bool:
+        key = _encode(name)
+        if key not in self._streams:
+            if not mkstream:
+                raise ResponseError("ERR The XGROUP subcommand requires the key to exist")
+            self._streams[key] = _Stream()
+        stream = self._streams[key]
+        if _encode(groupname) in stream.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        stream.groups[_encode(groupname)] = _Group(stream.last_id if id == "$" else _parse_id(id))
+        return True
+
+    def _deliver(self, name, groupname, consumername, count: Optional[int]) -> List[Tuple[bytes, Fields]]:
+        stream, group = self._group(name, groupname)
+        delivered = []
+        for entry_id, fields in stream.entries.items():
+            if entry_id <= group.last_delivered:
+                continue
+            if count is not None and len(delivered) >= count:
+                break
+            group.pending[entry_id] = [_encode(consumername), _now_ms(), 1]
+            group.last_delivered = entry_id
+            delivered.append((_format_id(entry_id), fields))
+        return delivered
+
+    async def xreadgroup(self, groupname, consumername, streams: Dict[Any, Any], count: Optional[int] = None,
+                         block: Optional[int] = None, noack: bool = False) -> List[Any]:
+        (name, start), = streams.items()
+        if start not in (">", b">"):
+            # A consumer's own pending entries after `start`
+            stream, group = self._group(name, groupname)
+            after = _parse_id(start)
+            own = [
+                (_format_id(entry_id), stream.entries[entry_id])
+                for entry_id, (consumer, _, _) in sorted(group.pending.items())
+                if consumer == _encode(consumername) and entry_id > after and entry_id in stream.entries
+            ][:count]
+            return [[_encode(name), own]]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + block / 1000 if block else None
+        delivered = self._deliver(name, groupname, consumername, count)
+        # Blocking reads poll; writers live in the same process and event loop
+        while not delivered and block is not None and (deadline is None or loop.time() < deadline):
+            await asyncio.sleep(_POLL_SECONDS)
+            delivered = self._deliver(name, groupname, consumername, count)
+        if noack:
+            _, group = self._group(name, groupname)
+            for entry_id, _ in delivered:
+                group.pending.pop(_parse_id(entry_id), None)
+        return [[_encode(name), delivered]] if delivered else []
+
+    async def xack(self, name, groupname, *ids) -> int:
+        _, group = self._group(name, groupname)
+        return sum(group.pending.pop(_parse_id(i), None) is not None for i in ids)
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time: int, start_id="0-0",
+                         count: Optional[int] = None, justid: bool = False) -> List[Any]:
+        stream, group = self._group(name, groupname)
+        start = _parse_id(start_id)
+        limit = count or 100
+        now = _now_ms()
+        claimed, deleted, next_id = [], [], (0, 0)
+        for entry_id in sorted(group.pending):
+            if entry_id < start:
+                continue
+            if len(claimed) + len(deleted) >= limit:
+                next_id = entry_id
+                break
+            record = group.pending[entry_id]
+            if now - record[1] < min_idle_time:
+                continue
+            if entry_id not in stream.entries:
+                # Trimmed away while pending
+                del group.pending[entry_id]
+                deleted.append(_format_id(entry_id))
+                continue
+            record[0] = _encode(consumername)
+            record[1] = now
+            if not justid:
+                record[2] += 1
+            claimed.append(_format_id(entry_id) if justid else (_format_id(entry_id), stream.entries[entry_id]))
+        return [_format_id(next_id), claimed, deleted]
+
+    async def xpending_range(self, name, groupname, min, max, count: int, consumername=None, idle: Optional[int] = None) -> List[Dict[str, Any]]:
+        _, group = self._group(name, groupname)
+        low, high = _parse_id(min), _parse_id(max)
+        now = _now_ms()
+        found = []
+        for entry_id in sorted(group.pending):
+            consumer, delivered_at, times = group.pending[entry_id]
+            if not low <= entry_id <= high:
+                continue
+            if consumername is not None and consumer != _encode(consumername):
+                continue
+            if idle is not None and now - delivered_at < idle:
+                continue
+            found.append({
+                "message_id": _format_id(entry_id),
+                "consumer": consumer,
+                "time_since_delivered": now - delivered_at,
+                "times_delivered": times,
+            })
+            if len(found) >= count:
+                break
+        return found
+
+    async def aclose(self):
+        pass
+
+    async def close(self):
+        pass
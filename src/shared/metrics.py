@@ -0,0 +1,236 @@
+import functools
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest, start_http_server
+from prometheus_client.metrics_core import Metric
+from sqlalchemy import event
+
+logger = logging.getLogger("metrics")
+
+# Off: the timing decorators return the function unchanged and nothing is recorded
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Port of the /metrics server of the miner and the brain (the API serves it itself)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+# Miner
+NBP_FETCH_SECONDS = Histogram(
+    "charon_nbp_fetch_seconds", "NBP API latency per date window, retries included", ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+NBP_FETCH_FAILURES = Counter("charon_nbp_fetch_failures_total", "NBP windows given up on", ["kind"])
+INGEST_ROWS = Histogram("charon_ingest_rows", "Rows stored per ingest job", ["kind"], buckets=ROW_BUCKETS)
+JOB_SECONDS = Histogram("charon_job_seconds", "Scheduled job duration", ["job"], buckets=LATENCY_BUCKETS)
+
+# Brain
+INDICATOR_SECONDS = Histogram(
+    "charon_indicator_seconds", "Indicator update and strategy evaluation time per asset", ["asset"],
+    buckets=LATENCY_BUCKETS,
+)
+BRAIN_EVENTS = Counter("charon_brain_events_total", "Ingest events received")
+BRAIN_ANALYSES = Counter("charon_brain_analyses_total", "Asset analyses run")
+BRAIN_ANALYSES_SAVED = Counter(
+    "charon_brain_analyses_saved_total", "Asset analyses skipped because the asset was already due in the same window",
+)
+BRAIN_WINDOW_EVENTS = Histogram("charon_brain_window_events", "Ingest events coalesced per window", buckets=ROW_BUCKETS)
+EVENT_TO_SIGNAL_SECONDS = Histogram(
+    "charon_event_to_signal_seconds", "Delay from an ingest event being published to its signals being stored", ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Event streams (src/shared/events.py)
+EVENTS_TOTAL = Counter("charon_events_total", "Stream entries per outcome (read, reclaimed, acked, dead)", ["stream", "outcome"])
+
+# API
+HTTP_REQUEST_SECONDS = Histogram(
+    "charon_http_request_seconds", "API request latency per endpoint", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_DB_SECONDS = Histogram(
+    "charon_http_db_seconds", "Time per API request spent in database calls", ["route"], buckets=LATENCY_BUCKETS,
+)
+HTTP_SERIALIZE_SECONDS = Histogram(
+    "charon_http_serialize_seconds", "Time per API request spent encoding the response body", ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+BACKTEST_SECONDS = Histogram("charon_backtest_seconds", "Backtest and sweep duration", ["mode"], buckets=LATENCY_BUCKETS)
+
+# All services
+DB_QUERY_SECONDS = Histogram("charon_db_query_seconds", "Database statement execution time", buckets=LATENCY_BUCKETS)
+
+
+def timed(histogram: Histogram, **labels: str) -> Callable:
+    """
+    Decorator observing the duration of every call (sync or async) in `histogram`.
+    With METRICS_ENABLED off the function is returned as is, so it costs nothing.
+    """
+    def decorator(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+        metric = histogram.labels(**labels) if labels else histogram
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metric.observe(time.perf_counter() - start)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed_sync(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - start)
+        return timed_sync
+    return decorator
+
+
+class _Timer:
+    __slots__ = ("metric", "start")
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metric.observe(time.perf_counter() - self.start)
+
+
+_NOT_TIMED = nullcontext()
+
+
+def timer(histogram: Histogram, **labels: str) -> ContextManager[None]:
+    """
+    Context manager observing the duration of a block in `histogram`, for spans
+    whose labels are only known at run time.
+    """
+    if not METRICS_ENABLED:
+        return _NOT_TIMED
+    return _Timer(histogram.labels(**labels) if labels else histogram)
+
+
+def observe(histogram: Histogram, value: float, **labels: str):
+    if METRICS_ENABLED:
+        (histogram.labels(**labels) if labels else histogram).observe(value)
+
+
+def inc(counter: Counter, amount: float = 1, **labels: str):
+    if METRICS_ENABLED:
+        (counter.labels(**labels) if labels else counter).inc(amount)
+
+
+# Time spent per kind ("db", "serialize") within the current API request
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def request_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collects add_request_time() calls made while handling one request.
+    """
+    timings = {"db": 0.0, "serialize": 0.0}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def add_request_time(kind: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[kind] += seconds
+
+
+@contextmanager
+def request_timer(kind: str) -> Iterator[None]:
+    if _request_timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_request_time(kind, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """
+    Times every statement of an (async) engine into DB_QUERY_SECONDS and the
+    current request's "db" time.
+    """
+    if not METRICS_ENABLED:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        DB_QUERY_SECONDS.observe(elapsed)
+        add_request_time("db", elapsed)
+
+
+class _CallbackCollector:
+    def __init__(self, read: Callable[[], Iterable[Metric]]):
+        self.read = read
+
+    def collect(self) -> Iterable[Metric]:
+        return self.read()
+
+    def describe(self) -> Iterable[Metric]:
+        # Nothing to check at registration; read() may need state that does not exist yet
+        return []
+
+
+_collectors: Dict[str, _CallbackCollector] = {}
+
+
+def register_collector(name: str, read: Callable[[], Iterable[Metric]]):
+    """
+    Exposes metrics computed at scrape time from counters kept elsewhere (pool,
+    cache). Registering a name again replaces its reader.
+    """
+    if not METRICS_ENABLED:
+        return
+    if name in _collectors:
+        _collectors[name].read = read
+        return
+    _collectors[name] = _CallbackCollector(read)
+    REGISTRY.register(_collectors[name])
+
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+def serve_metrics(port: int = METRICS_PORT):
+    """
+    Serves /metrics from a background thread (services without an HTTP server).
+    """
+    if not METRICS_ENABLED:
+        return
+    start_http_server(port)
+    logger.info(f"Serving metrics on :{port}/metrics")
+
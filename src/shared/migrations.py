@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import AssetCoverage, Base, RateQuote, SchemaMigration
+from .schema import partitioned_tables
+
+logger = logging.getLogger("migrations")
+
+# pg_advisory_lock key serializing concurrent migration runs
+LOCK_KEY = 0x63686172 # 'char'
+# How long services wait at startup for the migrations to be applied
+SCHEMA_WAIT_SECONDS = int(os.getenv("SCHEMA_WAIT_SECONDS", "300"))
+
+
+class Migration:
+    """
+    One schema version. `upgrade` gets a sync Connection; transactional migrations run
+    in a transaction together with their version record, the others in autocommit
+    mode (needed for CREATE INDEX CONCURRENTLY) and must be safe to re-run.
+    """
+
+    def __init__(self, version: int, name: str, upgrade: Callable[[Connection], None], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    def register(upgrade: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, name, upgrade, transactional))
+        return upgrade
+    return register
+
+
+# Migrations after the baseline must tolerate a database the baseline created from
+# the current models (IF NOT EXISTS / IF EXISTS), since the baseline is create_all.
+
+@migration(1, "baseline")
+def _baseline(conn: Connection):
+    # Creates the missing tables; databases created by the old create_all at startup keep theirs
+    Base.metadata.create_all(conn)
+
+
+def _drop_invalid_index(conn: Connection, name: str):
+    # A failed CREATE INDEX CONCURRENTLY leaves an invalid index that IF NOT EXISTS would keep
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str, unique: bool = False, include: Optional[str] = None):
+    """
+    CREATE INDEX IF NOT EXISTS; on PostgreSQL built CONCURRENTLY (writes keep going)
+    with an optional INCLUDE list. Partitioned parents cannot be indexed concurrently.
+    """
+    postgres = conn.dialect.name == "postgresql"
+    concurrently = postgres and table not in partitioned_tables(conn)
+    if concurrently:
+        _drop_invalid_index(conn, name)
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{name} ON {table} ({columns}){f' INCLUDE ({include})' if postgres and include else ''}"
+    ))
+
+
+@migration(2, "access path indexes", transactional=False)
+def _access_path_indexes(conn: Connection):
+    _create_index(conn, "idx_rates_code_date_cover", "rates", "currency_code, effective_date", unique=True, include="rate_mid")
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" and "rates" not in partitioned_tables(conn) else ""
+    conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS idx_rates_code_date"))
+    _create_index(conn, "idx_signals_asset_generated", "signals", "asset_code, generated_at, id")
+    _create_index(conn, "idx_signals_generated", "signals", "generated_at, id")
+    _create_index(conn, "idx_jobs_log_started", "jobs_log", "started_at, id")
+
+
+@migration(3, "nbp tables b and c")
+def _nbp_tables_b_and_c(conn: Connection):
+    # Table B mid rates need 8 decimals; SQLite does not enforce numeric precision
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE rates ALTER COLUMN rate_mid TYPE NUMERIC(18, 8)"))
+    RateQuote.__table__.create(conn, checkfirst=True)
+
+
+@migration(4, "asset coverage")
+def _asset_coverage(conn: Connection):
+    AssetCoverage.__table__.create(conn, checkfirst=True)
+
+
+@migration(5, "unique analysis snapshots")
+def _unique_analysis_snapshots(conn: Connection):
+    # Keep the latest row of each (asset, window); the table holds a few hundred rows,
+    # so the index is built in the same transaction and no duplicate slips in between
+    conn.execute(text(
+        "DELETE FROM analysis_snapshots WHERE id NOT IN ("
+        "SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY asset_code, window_days ORDER BY generated_at DESC, id DESC) AS rn "
+        "FROM analysis_snapshots) ranked WHERE rn = 1)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_snapshots_asset_window ON analysis_snapshots (asset_code, window_days)"
+    ))
+
+
+HEAD = max(m.version for m in MIGRATIONS)
+
+
+async def applied_versions(conn) -> List[int]:
+    result = await conn.execute(select(SchemaMigration.version).order_by(SchemaMigration.version))
+    return list(result.scalars())
+
+
+async def migrate(engine: AsyncEngine) -> List[int]:
+    """
+    Applies the pending migrations in order and returns their versions.
+    Concurrent runs are serialized with an advisory lock on PostgreSQL.
+    """
+    applied_now = []
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        postgres = engine.dialect.name == "postgresql"
+        if postgres:
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            await lock_conn.run_sync(lambda c: SchemaMigration.__table__.create(c, checkfirst=True))
+            applied = set(await applied_versions(lock_conn))
+
+            for m in sorted(MIGRATIONS, key=lambda m: m.version):
+                if m.version in applied:
+                    continue
+                logger.info(f"Applying migration {m.version:04d} {m.name}")
+                record = insert(SchemaMigration).values(version=m.version, name=m.name)
+                if m.transactional:
+                    async with engine.begin() as conn:
+                        await conn.run_sync(m.upgrade)
+                        await conn.execute(record)
+                else:
+                    async with engine.connect() as conn:
+                        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                        await conn.run_sync(m.upgrade)
+                        await conn.execute(record)
+                applied_now.append(m.version)
+        finally:
+            if postgres:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+    return applied_now
+
+
+async def current_version(engine: AsyncEngine) -> Optional[int]:
+    """
+    The highest applied migration, or None when the database has not been migrated
+    (or cannot be reached).
+    """
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(func.max(SchemaMigration.version)))).scalar()
+    except Exception:
+        return None
+
+
+async def wait_for_schema(engine: AsyncEngine, timeout: int = SCHEMA_WAIT_SECONDS) -> int:
+    """
+    Service startup check: one query per attempt, no metadata reflection. Waits until
+    the migrations (run separately, `python -m src.shared.migrations`) reached HEAD.
+    A newer schema is accepted, so old and new releases can overlap during a deploy.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        version = await current_version(engine)
+        if version is not None and version >= HEAD:
+            return version
+        if loop.time() >= deadline:
+            raise RuntimeError(
+                f"Database schema is at version {version}, expected {HEAD}; run `python -m src.shared.migrations`"
+            )
+        logger.info(f"Waiting for database migrations (at {version}, need {HEAD})...")
+        await asyncio.sleep(2)
+
+
+async def main(argv: List[str]) -> int:
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m src.shared.migrations", description="Database migrations")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        version = await current_version(engine)
+        print(f"current: {version}, head: {HEAD}")
+        return 0 if version is not None and version >= HEAD else 1
+
+    applied = await migrate(engine)
+    logger.info(f"Applied {len(applied)} migration(s); schema at version {HEAD}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, Boolean, JSON, ForeignKey, Enum, Index
+from sqlalchemy import Column, Integer, String, Text, Numeric, Date, DateTime, Boolean, JSON, ForeignKey, Enum, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 import enum
@@ -35,16 +35,35 @@ class Rate(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     currency_code = Column(String(3), ForeignKey("currencies.code"), nullable=False)
-    rate_mid = Column(Numeric(10, 4), nullable=False)
+    # Table B quotes exotic currencies to 8 decimals (e.g. IDR, VND)
+    rate_mid = Column(Numeric(18, 8), nullable=False)
     effective_date = Column(Date, nullable=False)
     fetched_at = Column(DateTime(timezone=True), server_default=func.now())
-    source = Column(String(50), default="NBP")
+    source = Column(String(50), default="NBP") # "NBP" (Table A), "NBP-B" (Table B)
     
     currency = relationship("Currency", back_populates="rates")
     
-    # Ensure unique rate per currency per day
+    # Ensure unique rate per currency per day; rate_mid is carried in the index
+    # (PostgreSQL INCLUDE) so price history reads are index-only scans
+    __table_args__ = (
+        Index('idx_rates_code_date_cover', 'currency_code', 'effective_date', unique=True, postgresql_include=['rate_mid']),
+    )
+
+class RateQuote(Base):
+    __tablename__ = "rate_quotes"
+
+    # NBP Table C: buy (bid) and sell (ask) rates of the most traded currencies
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    currency_code = Column(String(3), ForeignKey("currencies.code"), nullable=False)
+    bid = Column(Numeric(18, 8), nullable=False)
+    ask = Column(Numeric(18, 8), nullable=False)
+    effective_date = Column(Date, nullable=False)
+    trading_date = Column(Date, nullable=True)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now())
+    source = Column(String(50), default="NBP")
+
     __table_args__ = (
-        Index('idx_rates_code_date', 'currency_code', 'effective_date', unique=True),
+        Index('idx_rate_quotes_code_date', 'currency_code', 'effective_date', unique=True),
     )
 
 class GoldPrice(Base):
@@ -67,6 +86,11 @@ class JobLog(Base):
     rows_written = Column(Integer, default=0)
     error_message = Column(String, nullable=True)
 
+    # /stats/miner: newest jobs first
+    __table_args__ = (
+        Index('idx_jobs_log_started', 'started_at', 'id'),
+    )
+
 class Signal(Base):
     __tablename__ = "signals"
     
@@ -89,6 +113,12 @@ class Signal(Base):
     # Looking at the last X days of data
     horizon_days = Column(Integer, default=0)
 
+    # /signals (newest first, optionally per asset), exports and retention by age
+    __table_args__ = (
+        Index('idx_signals_asset_generated', 'asset_code', 'generated_at', 'id'),
+        Index('idx_signals_generated', 'generated_at', 'id'),
+    )
+
 class AnalysisSnapshot(Base):
     __tablename__ = "analysis_snapshots"
     
@@ -97,3 +127,53 @@ class AnalysisSnapshot(Base):
     window_days = Column(Integer, default=30)
     stats = Column(JSON, nullable=True) # Store JSON stats like volatility, min, max
     generated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # One row per (asset, window), replaced in place by the brain
+    __table_args__ = (
+        Index('idx_snapshots_asset_window', 'asset_code', 'window_days', unique=True),
+    )
+
+class IndicatorState(Base):
+    __tablename__ = "indicator_states"
+    
+    # One row per asset ('USD', 'GOLD'); state is IncrementalIndicators.to_dict()
+    asset_code = Column(String(10), primary_key=True)
+    version = Column(Integer, nullable=False)
+    last_date = Column(Date, nullable=False)
+    row_count = Column(Integer, nullable=False) # Rows folded into the state, used to detect backfills
+    state = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ForecastModel(Base):
+    __tablename__ = "forecast_models"
+    
+    # Latest fitted Prophet model per asset, serialized with prophet.serialize.model_to_json
+    asset_code = Column(String(10), primary_key=True)
+    last_date = Column(Date, nullable=False) # Last data date the model was fitted on
+    model = Column(Text, nullable=False)
+    fitted_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AssetCoverage(Base):
+    __tablename__ = "asset_coverage"
+
+    # Coverage of one asset of a miner source against the source's publication calendar,
+    # kept by the miner's gap repair; asset_code "" is the source as a whole.
+    # Counts are publication days (weeks for weekly sources).
+    source = Column(String(20), primary_key=True)
+    asset_code = Column(String(10), primary_key=True)
+    first_date = Column(Date, nullable=True)
+    last_date = Column(Date, nullable=True)
+    expected_count = Column(Integer, nullable=False, default=0)
+    stored_count = Column(Integer, nullable=False, default=0)
+    missing_count = Column(Integer, nullable=False, default=0)
+    missing_ranges = Column(JSON, nullable=True) # [[from, to], ...] ISO dates, oldest first
+    no_data = Column(JSON, nullable=True) # Dates a re-fetch confirmed NBP has nothing for
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    # Applied migrations (src/shared/migrations.py)
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
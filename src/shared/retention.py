@@ -0,0 +1,76 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Signal
+from .schema import PARTITIONING, ensure_partitions, partitioned_tables, partitions
+
+logger = logging.getLogger("retention")
+
+# Signals older than this are compacted to the last signal per asset and day
+SIGNAL_COMPACT_DAYS = int(os.getenv("SIGNAL_COMPACT_DAYS", "30"))
+# Signals older than this are deleted; 0 keeps them forever
+SIGNAL_RETENTION_DAYS = int(os.getenv("SIGNAL_RETENTION_DAYS", "0"))
+
+
+async def compact_signals(session: AsyncSession, before: datetime) -> int:
+    """
+    Keeps only the last signal of each asset and day among signals generated before
+    `before` (the brain writes one per ingest event, several a day). Returns rows deleted.
+    """
+    day = func.date(Signal.generated_at)
+    keep = (
+        select(func.max(Signal.id))
+        .where(Signal.generated_at < before)
+        .group_by(Signal.asset_code, day)
+    )
+    result = await session.execute(
+        delete(Signal).where(Signal.generated_at < before, Signal.id.not_in(keep))
+    )
+    return result.rowcount
+
+
+def _drop_expired_partitions(conn, before: datetime) -> int:
+    span = PARTITIONING["signals"][1]
+    dropped = 0
+    for name, first_year in partitions(conn, "signals"):
+        if datetime(first_year + span, 1, 1, tzinfo=timezone.utc) <= before:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped += 1
+    return dropped
+
+
+async def purge_signals(session: AsyncSession, before: datetime) -> int:
+    """
+    Deletes signals generated before `before`. On a partitioned signals table whole
+    partitions past the horizon are dropped first, the rest is deleted row by row.
+    Returns rows deleted (rows of dropped partitions are not counted).
+    """
+    conn = await session.connection()
+    if "signals" in await conn.run_sync(partitioned_tables):
+        dropped = await conn.run_sync(_drop_expired_partitions, before)
+        if dropped:
+            logger.info(f"Dropped {dropped} expired signal partitions")
+    result = await session.execute(delete(Signal).where(Signal.generated_at < before))
+    return result.rowcount
+
+
+async def apply_signal_retention(session: AsyncSession) -> Tuple[int, int]:
+    """
+    Runs the configured retention: purge past SIGNAL_RETENTION_DAYS, then compaction
+    past SIGNAL_COMPACT_DAYS. Keeps upcoming partitions in place as well.
+    Returns (compacted, purged) row counts; the caller owns the commit.
+    """
+    now = datetime.now(timezone.utc)
+    purged = 0
+    if SIGNAL_RETENTION_DAYS > 0:
+        purged = await purge_signals(session, now - timedelta(days=SIGNAL_RETENTION_DAYS))
+    compacted = await compact_signals(session, now - timedelta(days=SIGNAL_COMPACT_DAYS))
+
+    conn = await session.connection()
+    await conn.run_sync(ensure_partitions)
+    return compacted, purged
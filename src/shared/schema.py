@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import desc, select, text
+from sqlalchemy.engine import Connection
+
+from .models import Base, GoldPrice, JobLog, Rate, Signal
+
+logger = logging.getLogger("schema")
+
+# Tables that can be range-partitioned by time: partition key and years per partition.
+# Signals grow with every ingest event; rates are read across their whole history,
+# so they get few wide partitions to keep per-currency scans on a handful of indexes.
+PARTITIONING: Dict[str, Tuple[str, int]] = {
+    "signals": ("generated_at", 1),
+    "rates": ("effective_date", 10),
+}
+PARTITIONS_AHEAD = 1 # years
+
+
+def _first_year(year: int, span: int) -> int:
+    return year - year % span
+
+
+def _partition_name(table: str, year: int) -> str:
+    return f"{table}_{year}"
+
+
+def partitioned_tables(conn: Connection) -> List[str]:
+    if conn.dialect.name != "postgresql":
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"
+    ))
+    return [name for (name,) in rows if name in PARTITIONING]
+
+
+def partitions(conn: Connection, table: str) -> List[Tuple[str, int]]:
+    """
+    Range partitions of a table as (name, first year), oldest first; the default
+    partition is not listed.
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table})
+    pattern = re.compile(rf"^{table}_(\d{{4}})$")
+    found = [(name, int(m.group(1))) for (name,) in rows if (m := pattern.match(name))]
+    return sorted(found, key=lambda p: p[1])
+
+
+def _create_partition(conn: Connection, table: str, year: int):
+    span = PARTITIONING[table][1]
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(table, year)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + span}-01-01')"
+    ))
+
+
+def ensure_partitions(conn: Connection):
+    """
+    Creates the partitions of the current and the next PARTITIONS_AHEAD years, so
+    new rows never land in the default partition.
+    """
+    this_year = date.today().year
+    for table in partitioned_tables(conn):
+        span = PARTITIONING[table][1]
+        for year in range(this_year, this_year + PARTITIONS_AHEAD + 1):
+            _create_partition(conn, table, _first_year(year, span))
+
+
+def partition_table(conn: Connection, table: str):
+    """
+    Converts a plain table into a RANGE-partitioned one (PostgreSQL), copying its rows.
+    The primary key becomes (id, <partition key>) as PostgreSQL requires; ids keep
+    coming from the same sequence, so the models still address rows by id.
+    Takes an exclusive lock on the table for the duration of the copy.
+    """
+    if conn.dialect.name != "postgresql":
+        raise NotImplementedError("Partitioning needs PostgreSQL")
+    if table in partitioned_tables(conn):
+        logger.info(f"{table} is already partitioned")
+        return
+    key, span = PARTITIONING[table]
+    model_table = Base.metadata.tables[table]
+    old = f"{table}_unpartitioned"
+
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey"))
+    for index in model_table.indexes:
+        conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_unpartitioned"))
+
+    conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({key})"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {key})"))
+    for fk in model_table.foreign_key_constraints:
+        columns = ", ".join(c.name for c in fk.columns)
+        targets = ", ".join(e.column.name for e in fk.elements)
+        conn.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY ({columns}) REFERENCES {fk.referred_table.name} ({targets})"))
+    # The id sequence would otherwise be dropped together with the old table
+    conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+
+    oldest = conn.execute(text(f"SELECT min({key}) FROM {old}")).scalar()
+    this_year = date.today().year
+    first = _first_year(oldest.year if oldest else this_year, span)
+    for year in range(first, this_year + PARTITIONS_AHEAD + 1, span):
+        _create_partition(conn, table, year)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+    conn.execute(text(f"UPDATE {old} SET {key} = now() WHERE {key} IS NULL"))
+    copied = conn.execute(text(f"INSERT INTO {table} SELECT * FROM {old}")).rowcount
+    conn.execute(text(f"DROP TABLE {old}"))
+    for index in model_table.indexes:
+        index.create(conn)
+    conn.execute(text(f"ANALYZE {table}"))
+    logger.info(f"Partitioned {table} by {key} ({span} year(s) per partition), {copied} rows copied")
+
+
+# Tables whose sequential scans count as plan regressions (partitions included)
+GUARDED_TABLES = ("rates", "signals", "gold_prices", "jobs_log")
+
+
+def hot_queries() -> Dict[str, object]:
+    """
+    The statements behind the API's and the brain's frequent reads, as they issue them.
+    """
+    # history needs pandas, which the miner image (running the migrations) does not ship
+    from .history import price_history_query
+
+    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    return {
+        "rates page": select(Rate).where(Rate.currency_code == "USD")
+            .order_by(desc(Rate.effective_date), desc(Rate.id)).limit(100),
+        "rates after date": price_history_query("USD", start_date=date.today() - timedelta(days=30)),
+        "price history": price_history_query("USD"),
+        "price history tail": price_history_query("USD", tail=180),
+        "gold page": select(GoldPrice).order_by(desc(GoldPrice.effective_date), desc(GoldPrice.id)).limit(100),
+        "signals page": select(Signal).order_by(desc(Signal.generated_at), desc(Signal.id)).limit(20),
+        "signals per asset": select(Signal).where(Signal.asset_code == "USD")
+            .order_by(desc(Signal.generated_at), desc(Signal.id)).limit(20),
+        "signals by age": select(Signal.id).where(Signal.generated_at < week_ago),
+        "jobs page": select(JobLog).order_by(desc(JobLog.started_at), desc(JobLog.id)).limit(10),
+    }
+
+
+def _guarded(table: str) -> bool:
+    return any(table == t or re.fullmatch(rf"{t}_(\d{{4}}|default)", table) for t in GUARDED_TABLES)
+
+
+def _postgres_seq_scans(plan: dict) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and _guarded(plan.get("Relation Name", "")):
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_postgres_seq_scans(child))
+    return found
+
+
+def _explain(conn: Connection, stmt) -> List[str]:
+    """
+    Tables read by a full sequential scan in the plan of `stmt`.
+    On PostgreSQL, sequential scans are disabled first: the planner rightly prefers
+    them on small tables, so only a scan that no index can replace remains.
+    """
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[k] for k in compiled.positiontup) if compiled.positional else compiled.params
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        return _postgres_seq_scans(plan)
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+        scans = [re.fullmatch(r"SCAN (?:TABLE )?(\w+)", row[-1]) for row in rows]
+        return [m.group(1) for m in scans if m and _guarded(m.group(1))]
+    raise NotImplementedError(f"Query plan check is not supported for dialect '{conn.dialect.name}'")
+
+
+def check_query_plans(conn: Connection) -> Dict[str, List[str]]:
+    """
+    Query-plan regression check: {query name: tables it scans sequentially} for every
+    hot query that cannot be answered from an index. Empty when all plans are fine.
+    """
+    problems = {}
+    for name, stmt in hot_queries().items():
+        scans = _explain(conn, stmt)
+        if scans:
+            problems[name] = scans
+    return problems
+
+
+async def main(argv: List[str]) -> int:
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m src.shared.schema", description="Schema maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ensure-partitions", help="create the upcoming partitions of partitioned tables")
+    partition = commands.add_parser("partition", help="convert tables to time-range partitioning (PostgreSQL)")
+    partition.add_argument("tables", nargs="*", choices=list(PARTITIONING), default=["signals"])
+    commands.add_parser("check-plans", help="fail when a hot query needs a sequential scan")
+    args = parser.parse_args(argv)
+
+    async with engine.begin() as conn:
+        if args.command == "ensure-partitions":
+            await conn.run_sync(ensure_partitions)
+        elif args.command == "partition":
+            for table in args.tables:
+                await conn.run_sync(partition_table, table)
+        else:
+            problems = await conn.run_sync(check_query_plans)
+            for name, tables in problems.items():
+                print(f"FAIL {name}: sequential scan on {', '.join(tables)}")
+            if problems:
+                return 1
+            print(f"OK: {len(hot_queries())} query plans use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main(sys.argv[1:])))
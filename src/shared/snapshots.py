@@ -0,0 +1,232 @@
+import logging
+import math
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .history import GOLD_CODE, load_price_history, load_price_matrix
+from .models import AnalysisSnapshot, Rate, GoldPrice
+from .upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of AnalysisSnapshot.stats changes; older rows are then ignored
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# window_days = 0 means "full history" (used for the monthly-return matrix)
+FULL_HISTORY = 0
+STATS_WINDOWS = (30, 90, 180, 365)
+CORRELATION_WINDOWS = (30, 90, 180)
+# Pseudo asset code for cross-asset snapshots (correlation matrices)
+ALL_ASSETS = "*"
+CORRELATION_ASSETS = ["GOLD", "USD", "EUR", "CHF", "GBP", "JPY", "CAD", "AUD", "NOK"]
+
+
+def _json_safe(obj: Any) -> Any:
+    """Recursively converts numpy scalars to Python and NaN/Inf to None for JSON columns."""
+    if isinstance(obj, dict):
+        return {str(k): _json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+        return None
+    return obj
+
+
+def monthly_returns(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Monthly return heat map: one record per year with month columns 1..12 (in %).
+    df needs 'date' (datetime64) and 'price'.
+    """
+    df = df.copy()
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month
+
+    # Resample to monthly closing price to calculate monthly return
+    # Group by Year-Month, take the LAST price of the month
+    monthly_df = df.sort_values('date').groupby(['year', 'month']).last().reset_index()
+
+    # Calculate Percentage Change
+    monthly_df['pct_change'] = monthly_df['price'].pct_change() * 100
+
+    # Pivot for Heatmap: Index=Year, Columns=Month, Values=PctChange
+    pivot_df = monthly_df.pivot(index='year', columns='month', values='pct_change')
+
+    # Fill NaN (first month usually) with 0
+    pivot_df = pivot_df.fillna(0)
+
+    # reset_index to keep year as column
+    return pivot_df.reset_index().to_dict(orient='records')
+
+
+def window_stats(df: pd.DataFrame, window_days: int) -> Dict[str, Any]:
+    """
+    Volatility and range statistics over the last `window_days` observations.
+    Volatility is the annualized std of daily returns, in %.
+    """
+    prices = df['price'].to_numpy(dtype=float)[-window_days:]
+    returns = np.diff(prices) / prices[:-1] if len(prices) > 1 else np.array([])
+    return {
+        'observations': len(prices),
+        'first': prices[0],
+        'last': prices[-1],
+        'min': prices.min(),
+        'max': prices.max(),
+        'mean': prices.mean(),
+        'change_pct': (prices[-1] / prices[0] - 1) * 100,
+        'volatility_pct': returns.std(ddof=1) * math.sqrt(252) * 100 if len(returns) > 1 else None,
+    }
+
+
+def tail_rows(matrix: np.ndarray, n: int) -> np.ndarray:
+    """
+    Keeps only the last `n` observations of each column of a wide price matrix (NaN elsewhere).
+    """
+    valid = ~np.isnan(matrix)
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    return np.where(valid & (from_end <= n), matrix, np.nan)
+
+
+def _complete_rows(matrix: np.ndarray) -> np.ndarray:
+    # Dates every asset has (inner join)
+    return matrix[~np.isnan(matrix).any(axis=1)]
+
+
+def correlation_matrix(codes: List[str], matrix: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """
+    Correlation of prices between assets (columns of a wide matrix from
+    load_price_matrix) over the dates they have in common, in one vectorized pass.
+    Same layout as DataFrame.corr().to_dict().
+    """
+    x = _complete_rows(matrix)
+    if not len(x):
+        return {}
+    centered = x - x.mean(axis=0)
+    cov = centered.T @ centered
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    return {a: {b: float(corr[i, j]) for i, b in enumerate(codes)} for j, a in enumerate(codes)}
+
+
+def rolling_correlation(codes: List[str], dates: np.ndarray, matrix: np.ndarray, window: int) -> Dict[str, Any]:
+    """
+    Pairwise correlation over a rolling window of common dates.
+    Window sums of x and x*y are running sums (the new row added, the oldest
+    dropped, via prefix-sum differences), so the cost does not depend on the
+    window length.
+    """
+    mask = ~np.isnan(matrix).any(axis=1)
+    x, dates = matrix[mask], dates[mask]
+    if len(x) < window or not codes:
+        return {'window': window, 'dates': [], 'pairs': {}}
+
+    # Centering keeps the running sums of squares well conditioned
+    x = x - x.mean(axis=0)
+
+    def window_sums(a: np.ndarray) -> np.ndarray:
+        prefix = np.concatenate((np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)))
+        return prefix[window:] - prefix[:-window]
+
+    s = window_sums(x)
+    sxy = window_sums(x[:, :, None] * x[:, None, :])
+    cov = sxy - s[:, :, None] * s[:, None, :] / window
+    var = np.diagonal(cov, axis1=1, axis2=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(var[:, :, None] * var[:, None, :])
+
+    return {
+        'window': window,
+        'dates': dates[window - 1:].astype(str).tolist(),
+        'pairs': {
+            f"{a}/{b}": corr[:, i, j].tolist()
+            for i, a in enumerate(codes) for j, b in enumerate(codes) if i < j
+        },
+    }
+
+
+async def latest_data_date(session: AsyncSession, asset_code: str) -> Optional[date]:
+    if asset_code == GOLD_CODE:
+        return await session.scalar(select(func.max(GoldPrice.effective_date)))
+    if asset_code == ALL_ASSETS:
+        return await session.scalar(select(func.max(Rate.effective_date)))
+    return await session.scalar(select(func.max(Rate.effective_date)).where(Rate.currency_code == asset_code))
+
+
+async def get_snapshot(session: AsyncSession, asset_code: str, window_days: int) -> Optional[AnalysisSnapshot]:
+    """
+    Snapshot for (asset, window) with the current schema version, or None.
+    """
+    result = await session.execute(
+        select(AnalysisSnapshot)
+        .where(AnalysisSnapshot.asset_code == asset_code.upper(), AnalysisSnapshot.window_days == window_days)
+    )
+    snapshot = result.scalar()
+    if snapshot is None or (snapshot.stats or {}).get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+        return None
+    return snapshot
+
+
+async def upsert_snapshot(session: AsyncSession, asset_code: str, window_days: int, kind: str, data: Any, data_until: date):
+    """
+    Stores one snapshot row per (asset, window), replacing the previous content
+    (ON CONFLICT DO UPDATE on idx_snapshots_asset_window, so concurrent brains cannot
+    create duplicates).
+    """
+    stats = _json_safe({
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'kind': kind,
+        'data_until': data_until.isoformat(),
+        'data': data,
+    })
+    await upsert(
+        session, AnalysisSnapshot,
+        {'asset_code': asset_code, 'window_days': window_days, 'stats': stats, 'generated_at': func.now()},
+        key_columns=['asset_code', 'window_days'],
+    )
+
+
+async def build_asset_snapshots(session: AsyncSession, asset_code: str):
+    """
+    Materializes the monthly-return matrix (full history) and window stats of one asset.
+    """
+    code = asset_code.upper()
+    df = await load_price_history(session, code)
+    if df.empty:
+        return
+    data_until = df['date'].iloc[-1].date()
+
+    await upsert_snapshot(session, code, FULL_HISTORY, 'monthly_returns', monthly_returns(df), data_until)
+    for window in STATS_WINDOWS:
+        await upsert_snapshot(session, code, window, 'window_stats', window_stats(df, window), data_until)
+
+
+async def build_correlation_snapshots(session: AsyncSession):
+    """
+    Materializes correlation matrices of CORRELATION_ASSETS for each correlation window
+    (last N observations per asset, aligned on common dates), and over the same
+    observations the rolling correlation for every shorter or equal correlation
+    window ('rolling', keyed by its length).
+    """
+    dates, codes, prices = await load_price_matrix(session, CORRELATION_ASSETS, tail=max(CORRELATION_WINDOWS))
+    if not codes:
+        return
+    data_until = dates[-1].item()
+
+    for window in CORRELATION_WINDOWS:
+        observations = tail_rows(prices, window)
+        rolling = {
+            str(length): rolling_correlation(codes, dates, observations, length)
+            for length in CORRELATION_WINDOWS if length <= window
+        }
+        await upsert_snapshot(
+            session, ALL_ASSETS, window, 'correlation',
+            {'assets': CORRELATION_ASSETS, 'matrix': correlation_matrix(codes, observations), 'rolling': rolling},
+            data_until
+        )
@@ -0,0 +1,137 @@
+import itertools
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .analysis import TechnicalAnalyzer
+from .backtester import Backtester, DEFAULT_PARAMS, check_param
+
+# Metrics a sweep can be ranked by (descending; undefined values rank last)
+RANK_METRICS = (
+    "total_return_pct", "final_value", "max_drawdown_pct", "sharpe_ratio",
+    "hit_rate_pct", "exposure_pct", "total_trades",
+)
+
+# Parameters each indicator depends on; combinations sharing them share the series
+INDICATOR_KEYS = {
+    'hist': ('macd_fast', 'macd_slow', 'macd_signal'),
+    'rsi': ('rsi_window',),
+    'sma': ('sma_window',),
+    'bb': ('bb_window', 'bb_std'),
+}
+
+
+def expand_grid(grid: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+    """
+    Cartesian product of parameter ranges. Parameters not in the grid keep their
+    default value; combinations that make no sense (MACD fast >= slow, RSI
+    oversold >= overbought) are dropped. Values the indicators cannot take
+    (see check_param) raise ValueError before any worker starts.
+    """
+    unknown = set(grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown strategy parameters: {', '.join(sorted(unknown))}")
+
+    names = list(grid)
+    values = [list(dict.fromkeys(check_param(name, v) for v in grid[name])) for name in names]
+    if any(not v for v in values):
+        raise ValueError("Every swept parameter needs at least one value")
+
+    combos = []
+    for combo in itertools.product(*values):
+        params = {**DEFAULT_PARAMS, **dict(zip(names, combo))}
+        if params['macd_fast'] >= params['macd_slow'] or params['rsi_oversold'] >= params['rsi_overbought']:
+            continue
+        combos.append(params)
+    return combos
+
+
+def _indicator_key(params: Dict[str, Any]) -> tuple:
+    return tuple(params[name] for keys in INDICATOR_KEYS.values() for name in keys)
+
+
+def split_combinations(combos: List[Dict[str, Any]], chunks: int) -> List[List[Dict[str, Any]]]:
+    """
+    Splits combinations into at most `chunks` contiguous batches after ordering them
+    by indicator windows, so combinations that share indicators land in the same worker.
+    """
+    ordered = sorted(combos, key=_indicator_key)
+    size = max(1, -(-len(ordered) // max(1, chunks)))
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+class IndicatorCache:
+    """
+    Memoizes indicator series of one price history per window, so each distinct
+    window is computed once for all combinations using it. ADX and the weekly
+    trend do not depend on the strategy parameters and are computed up front.
+    """
+
+    def __init__(self, df_prices: pd.DataFrame):
+        self.analyzer = TechnicalAnalyzer()
+        self.prices = df_prices['price']
+        self.price = self.prices.to_numpy(dtype=float)
+        self.adx = self.analyzer.calculate_adx(df_prices).to_numpy(dtype=float)
+        self.weekly_trend = Backtester().weekly_trend(df_prices)
+        self._series: Dict[tuple, Any] = {}
+
+    def _get(self, key: tuple, compute):
+        if key not in self._series:
+            self._series[key] = compute()
+        return self._series[key]
+
+    def indicators(self, params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        Indicator columns for one parameter set, as expected by Backtester.generate_signals.
+        """
+        hist = self._get(('hist',) + tuple(params[k] for k in INDICATOR_KEYS['hist']), lambda: self.analyzer.calculate_macd(
+            self.prices, fast=params['macd_fast'], slow=params['macd_slow'], signal=params['macd_signal']
+        )['hist'].to_numpy(dtype=float))
+        rsi = self._get(('rsi', params['rsi_window']), lambda: self.analyzer.calculate_rsi(
+            self.prices, window=params['rsi_window']
+        ).to_numpy(dtype=float))
+        sma = self._get(('sma', params['sma_window']), lambda: self.analyzer.calculate_sma(
+            self.prices, window=params['sma_window']
+        ).to_numpy(dtype=float))
+        bb = self._get(('bb', params['bb_window'], params['bb_std']), lambda: self.analyzer.calculate_bollinger_bands(
+            self.prices, window=params['bb_window'], num_std=params['bb_std']
+        ))
+        return {
+            'hist': hist,
+            'rsi': rsi,
+            'price': self.price,
+            'sma': sma,
+            'bb_lower': bb['bb_lower'].to_numpy(dtype=float),
+            'bb_upper': bb['bb_upper'].to_numpy(dtype=float),
+            'adx': self.adx,
+            'weekly_trend': self.weekly_trend,
+        }
+
+
+def run_sweep_chunk(df_prices: pd.DataFrame, combos: List[Dict[str, Any]], initial_capital: float) -> List[Dict[str, Any]]:
+    """
+    Backtests a batch of parameter sets on one price history, reporting summary
+    metrics only. Self-contained so it can run in a worker process.
+    """
+    cache = IndicatorCache(df_prices)
+    results = []
+    for params in combos:
+        backtester = Backtester(initial_capital=initial_capital, params=params)
+        start = backtester.warmup
+        if len(cache.price) < start:
+            continue
+        signals = backtester.generate_signals(cache.indicators(params))
+        metrics = backtester.evaluate(cache.price[start:], signals[start:])
+        results.append({"params": params, **metrics})
+    return results
+
+
+def rank_results(results: List[Dict[str, Any]], sort_by: str = "total_return_pct", top: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Orders sweep results best-first by one metric and numbers them.
+    """
+    if sort_by not in RANK_METRICS:
+        raise ValueError(f"Cannot rank by {sort_by}; choose one of {', '.join(RANK_METRICS)}")
+    ranked = sorted(results, key=lambda r: (r[sort_by] is not None, r[sort_by] or 0), reverse=True)[:top]
+    return [{"rank": i + 1, **r} for i, r in enumerate(ranked)]
@@ -0,0 +1,47 @@
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def dialect_insert(session: AsyncSession, model):
+    """
+    Returns a dialect-specific INSERT construct supporting ON CONFLICT.
+    PostgreSQL in production, SQLite for local fixtures.
+    """
+    dialect = session.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upsert is not supported for dialect '{dialect}'")
+
+
+async def upsert(
+    session: AsyncSession,
+    model,
+    values: Dict[str, Any],
+    key_columns: Sequence[str],
+    where: Optional[Callable[[Any], Any]] = None,
+) -> bool:
+    """
+    INSERT ... ON CONFLICT (key_columns) DO UPDATE of the other given columns, in one
+    statement, so concurrent writers of the same key neither fail on the unique index
+    nor need to read first. Columns with an onupdate default (updated_at) are set too.
+    `where(excluded)` optionally limits the update, e.g. to newer values. key_columns
+    must match a unique index. Returns whether a row was written; the caller owns the commit.
+    """
+    stmt = dialect_insert(session, model).values(**values)
+    update = {name: stmt.excluded[name] for name in values if name not in key_columns}
+    update.update({
+        column.name: column.onupdate.arg
+        for column in model.__table__.columns
+        if column.onupdate is not None and column.name not in update
+    })
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_=update,
+        where=where(stmt.excluded) if where is not None else None,
+    )
+    result = await session.execute(stmt)
+    return result.rowcount > 0
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the services the way they run in Docker: `from src.shared...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
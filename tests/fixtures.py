@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from src.shared.analysis import TechnicalAnalyzer
+
+
+def random_walk(days: int = 1500, seed: int = 7, start: str = "2015-01-01") -> pd.DataFrame:
+    """
+    Business-day price history ('date', 'price'): a seeded random walk with trending
+    and ranging stretches, so every branch of the strategy fires.
+    """
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.normal(0, 0.002, days // 100 + 1), 100)[:days]
+    prices = 4.0 * np.exp(np.cumsum(drift + rng.normal(0, 0.006, days)))
+    return pd.DataFrame({'date': pd.bdate_range(start, periods=days), 'price': prices})
+
+
+def reference_backtest(df: pd.DataFrame, initial_capital: float = 10000.0, start: int = 50) -> dict:
+    """
+    The backtest as it was before vectorization: one determine_signal call and one
+    position update per bar. `df` is an indicator frame from prepare_indicators.
+    Returns the signals (from `start`), the executed trades and the equity per bar.
+    """
+    analyzer = TechnicalAnalyzer()
+    capital = initial_capital
+    position = 0.0
+    signals, trades, equity = [], [], []
+    for i in range(start, len(df)):
+        row = df.iloc[i]
+        prev_row = df.iloc[i - 1]
+        price = float(row['price'])
+        signal = analyzer.determine_signal(
+            current_hist=float(row['hist']),
+            prev_hist=float(prev_row['hist']),
+            rsi=float(row['rsi']),
+            current_price=price,
+            sma_val=float(row['sma']),
+            bb_lower=float(row['bb_lower']),
+            bb_upper=float(row['bb_upper']),
+            adx=float(row['adx']),
+            weekly_trend=str(row['weekly_trend'])
+        )
+        signals.append(signal)
+
+        if signal == "BUY" and position == 0:
+            position = capital / price
+            capital = 0
+            trades.append({"date": row['date'], "type": "BUY", "price": price, "value": position * price})
+        elif signal == "SELL" and position > 0:
+            capital = position * price
+            position = 0
+            trades.append({"date": row['date'], "type": "SELL", "price": price, "value": capital})
+        equity.append(capital + position * price)
+
+    return {"signals": signals, "trades": trades, "equity": equity}
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from src.shared.backtester import Backtester
+from tests.fixtures import random_walk, reference_backtest
+
+
+@pytest.fixture(scope="module", params=[7, 11, 23])
+def history(request):
+    return random_walk(seed=request.param)
+
+
+def test_signals_match_reference_loop(history):
+    backtester = Backtester()
+    df = backtester.prepare_indicators(history)
+    expected = reference_backtest(df, start=backtester.warmup)
+
+    signals = backtester.generate_signals(df)[backtester.warmup:]
+
+    assert signals.tolist() == expected["signals"]
+    assert {"BUY", "SELL"} <= set(expected["signals"])
+
+
+def test_run_matches_reference_loop(history):
+    backtester = Backtester()
+    expected = reference_backtest(backtester.prepare_indicators(history), start=backtester.warmup)
+
+    result = backtester.run(history)
+
+    assert len(expected["trades"]) > 2
+    assert [(t["date"], t["type"]) for t in result["trades"]] == [
+        (t["date"].date(), t["type"]) for t in expected["trades"]
+    ]
+    np.testing.assert_allclose([t["price"] for t in result["trades"]], [t["price"] for t in expected["trades"]])
+    np.testing.assert_allclose([t["value"] for t in result["trades"]], [t["value"] for t in expected["trades"]])
+    np.testing.assert_allclose([p["equity"] for p in result["equity_curve"]], expected["equity"], rtol=1e-12)
+    assert result["final_value"] == pytest.approx(expected["equity"][-1], rel=1e-12)
+    assert result["total_trades"] == len(expected["trades"])
+
+
+def test_run_needs_warmup_history():
+    assert "error" in Backtester().run(random_walk(days=40))
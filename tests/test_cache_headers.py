@@ -0,0 +1,50 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.api.cache import CACHE_CONTROL, CACHE_TTL, RATES, cached
+from src.api.columnar import PACKED_F32, columnar
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/rates")
+    @columnar("effective_date", ["rate_mid"])
+    @cached(RATES, asset_param="code")
+    async def rates(code: str):
+        return [{"currency_code": code, "rate_mid": 4.0, "effective_date": "2024-01-02"}]
+
+    FastAPICache.init(InMemoryBackend(), prefix="test")
+    return TestClient(app)
+
+
+def test_clients_revalidate_instead_of_keeping_the_server_ttl():
+    client = _client()
+    miss = client.get("/rates", params={"code": "USD"})
+    hit = client.get("/rates", params={"code": "USD"})
+
+    assert miss.headers["x-fastapi-cache"] == "MISS" and hit.headers["x-fastapi-cache"] == "HIT"
+    for response in (miss, hit):
+        assert response.headers["cache-control"] == CACHE_CONTROL
+        assert f"max-age={CACHE_TTL}" not in response.headers["cache-control"]
+    assert hit.headers["etag"] == miss.headers["etag"]
+
+    revalidated = client.get("/rates", params={"code": "USD"}, headers={"If-None-Match": hit.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == CACHE_CONTROL
+
+
+def test_representations_vary_on_accept_and_are_cached_apart():
+    client = _client()
+    json_miss = client.get("/rates", params={"code": "USD"})
+    packed_miss = client.get("/rates", params={"code": "USD"}, headers={"Accept": PACKED_F32})
+    packed_hit = client.get("/rates", params={"code": "USD"}, headers={"Accept": PACKED_F32})
+
+    assert packed_miss.headers["x-fastapi-cache"] == "MISS" and packed_hit.headers["x-fastapi-cache"] == "HIT"
+    assert json_miss.headers["content-type"] == "application/json"
+    assert packed_hit.headers["content-type"] == PACKED_F32
+    for response in (json_miss, packed_miss, packed_hit):
+        assert "Accept" in response.headers["vary"]
+        assert response.headers["cache-control"] == CACHE_CONTROL
@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.shared.history import GOLD_CODE, load_price_matrix
+from src.shared.models import Base, Currency, GoldPrice, Rate
+from src.shared.snapshots import (
+    ALL_ASSETS, CORRELATION_ASSETS, CORRELATION_WINDOWS,
+    build_correlation_snapshots, correlation_matrix, get_snapshot, rolling_correlation,
+)
+
+
+def _series(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'snapshots.db'}")
+    rng = np.random.default_rng(8)
+    days = [d.date() for d in pd.bdate_range("2023-01-02", periods=260)]
+    walk = lambda base: base * np.exp(np.cumsum(rng.normal(0, 0.006, len(days))))
+    currencies = [c for c in CORRELATION_ASSETS if c != GOLD_CODE]
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Currency), [{'code': code, 'name': code} for code in currencies])
+            await conn.execute(insert(Rate), [
+                {'currency_code': code, 'rate_mid': round(float(p), 6), 'effective_date': d, 'source': "NBP"}
+                for code in currencies for d, p in zip(days, walk(4.0))
+            ])
+            # Gold is missing on some days the rates have
+            await conn.execute(insert(GoldPrice), [
+                {'price': round(float(p), 2), 'effective_date': d, 'source': "NBP"}
+                for i, (d, p) in enumerate(zip(days, walk(250.0))) if i % 17 != 5
+            ])
+    asyncio.run(seed())
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+def test_snapshots_match_the_live_computation(Session):
+    async def scenario():
+        async with Session() as session:
+            await build_correlation_snapshots(session)
+            await session.commit()
+        results = {}
+        async with Session() as session:
+            for window in CORRELATION_WINDOWS:
+                snapshot = await get_snapshot(session, ALL_ASSETS, window)
+                live = await load_price_matrix(session, CORRELATION_ASSETS, tail=window)
+                results[window] = (snapshot.stats['data'], live)
+        return results
+
+    for window, (data, (dates, codes, prices)) in asyncio.run(scenario()).items():
+        assert data['matrix'] == correlation_matrix(codes, prices)
+        assert sorted(data['rolling'], key=int) == [str(n) for n in CORRELATION_WINDOWS if n <= window]
+        for length, stored in data['rolling'].items():
+            expected = rolling_correlation(codes, dates, prices, int(length))
+            assert stored['window'] == expected['window'] and stored['dates'] == expected['dates']
+            assert stored['pairs'].keys() == expected['pairs'].keys()
+            for pair, values in expected['pairs'].items():
+                np.testing.assert_array_equal(_series(stored['pairs'][pair]), np.array(values))
@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.shared.analysis import TechnicalAnalyzer
+from src.shared.incremental import IncrementalIndicators, advance_states
+from tests.fixtures import random_walk
+
+COLUMNS = ['macd', 'signal', 'hist', 'prev_hist', 'rsi', 'sma', 'bb_lower', 'bb_upper', 'adx']
+
+
+def batch_indicators(history: pd.DataFrame) -> pd.DataFrame:
+    analyzer = TechnicalAnalyzer()
+    prices = history['price']
+    macd = analyzer.calculate_macd(prices)
+    bb = analyzer.calculate_bollinger_bands(prices)
+    return pd.DataFrame({
+        'macd': macd['macd'],
+        'signal': macd['signal'],
+        'hist': macd['hist'],
+        'prev_hist': macd['hist'].shift(1),
+        'rsi': analyzer.calculate_rsi(prices),
+        'sma': analyzer.calculate_sma(prices),
+        'bb_lower': bb['bb_lower'],
+        'bb_upper': bb['bb_upper'],
+        'adx': analyzer.calculate_adx(history),
+    })
+
+
+def round_trip(state: IncrementalIndicators) -> IncrementalIndicators:
+    # The brain stores the state as JSON between runs
+    return IncrementalIndicators.from_dict(json.loads(json.dumps(state.to_dict(), allow_nan=False)))
+
+
+def row_by_row(history: pd.DataFrame) -> np.ndarray:
+    state = IncrementalIndicators()
+    rows = []
+    for effective_date, price in zip(history['date'].dt.date, history['price']):
+        state = round_trip(state)
+        state.update(effective_date, float(price))
+        snapshot = state.snapshot()
+        rows.append([snapshot[c] for c in COLUMNS])
+    return np.array(rows)
+
+
+@pytest.fixture(scope="module")
+def history():
+    return random_walk(days=600, seed=3)
+
+
+@pytest.fixture(scope="module")
+def flat_history():
+    history = random_walk(days=600, seed=5)
+    # Longer than every window: the rolling accumulators see constant windows
+    history.loc[300:360, 'price'] = history['price'][300]
+    return history
+
+
+@pytest.mark.parametrize("seed", [3, 5, 9])
+def test_row_by_row_matches_batch(seed):
+    history = random_walk(days=600, seed=seed)
+    np.testing.assert_array_equal(row_by_row(history), batch_indicators(history)[COLUMNS].to_numpy())
+
+
+def test_row_by_row_after_constant_prices(flat_history):
+    np.testing.assert_allclose(
+        row_by_row(flat_history), batch_indicators(flat_history)[COLUMNS].to_numpy(), rtol=1e-12, atol=1e-15
+    )
+
+
+@pytest.mark.parametrize("name", ["history", "flat_history"])
+def test_weekly_trend_matches_batch(name, request):
+    history = request.getfixturevalue(name)
+    analyzer = TechnicalAnalyzer()
+    state = IncrementalIndicators()
+    trends = set()
+    for i, (effective_date, price) in enumerate(zip(history['date'].dt.date, history['price'])):
+        state.update(effective_date, float(price))
+        if i % 7 == 0 or i == len(history) - 1:
+            state = round_trip(state)
+            expected = analyzer.get_weekly_trend(analyzer.resample_to_weekly(history.iloc[:i + 1]))
+            assert state.weekly_trend() == expected, f"bar {i} ({effective_date})"
+            trends.add(expected)
+    assert trends == {"NEUTRAL", "BULLISH", "BEARISH"}
+
+
+def test_resumed_state_matches_full_rebuild(history):
+    dates, prices = list(history['date'].dt.date), [float(p) for p in history['price']]
+    full = advance_states({'USD': (None, dates, prices)})['USD']
+    first = advance_states({'USD': (None, dates[:400], prices[:400])})['USD']
+    resumed = advance_states({'USD': (json.loads(json.dumps(first[0])), dates[400:], prices[400:])})['USD']
+
+    assert resumed[0] == full[0]
+    assert resumed[1:3] == full[1:3]
+
+
+def test_rejects_out_of_order_prices(history):
+    state = IncrementalIndicators()
+    state.update(history['date'][1].date(), 4.0)
+    with pytest.raises(ValueError):
+        state.update(history['date'][0].date(), 4.1)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from datetime import date
+
+import httpx
+import pytest
+
+from src.miner.nbp_client import NBPClient, NBPFetchError
+from src.miner.sources import SOURCES
+
+GOLD = SOURCES["gold"]
+
+
+class StubNBP:
+    """
+    Stand-in for the NBP API: answers gold windows after `delay` seconds, failing
+    the first requests with the queued `failures` (a status code or an exception).
+    Records how many requests were in flight at once and when each arrived.
+    """
+
+    def __init__(self, failures=(), delay: float = 0.0):
+        self.failures = list(failures)
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(time.monotonic())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                failure = self.failures.pop(0)
+                if isinstance(failure, Exception):
+                    raise failure
+                return httpx.Response(failure, text="stub failure")
+            start = request.url.path.rstrip("/").split("/")[-2]
+            return httpx.Response(200, json=[{"data": start, "cena": 250.0}])
+        finally:
+            self.in_flight -= 1
+
+
+def _fetch(stub: StubNBP, start: date, end: date, **options):
+    async def run():
+        options.setdefault("backoff_base", 0)
+        async with NBPClient(base_url="http://nbp.test/api", transport=httpx.MockTransport(stub), **options) as client:
+            return await client.fetch(GOLD, start, end)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_retries_server_errors_and_rate_limits(status):
+    stub = StubNBP(failures=[status, status])
+    records = _fetch(stub, date(2024, 1, 2), date(2024, 1, 5))
+    assert records == [{"data": "2024-01-02", "cena": 250.0}]
+    assert len(stub.requests) == 3
+
+
+def test_retries_timeouts():
+    stub = StubNBP(failures=[httpx.ReadTimeout("stub timeout")])
+    assert len(_fetch(stub, date(2024, 1, 2), date(2024, 1, 5))) == 1
+    assert len(stub.requests) == 2
+
+
+def test_gives_up_after_the_retries():
+    stub = StubNBP(failures=[httpx.ReadTimeout("stub timeout")] * 3)
+    with pytest.raises(NBPFetchError, match="after 3 attempts"):
+        _fetch(stub, date(2024, 1, 2), date(2024, 1, 5), max_retries=2)
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    stub = StubNBP(failures=[400])
+    with pytest.raises(NBPFetchError, match="400"):
+        _fetch(stub, date(2024, 1, 2), date(2024, 1, 5))
+    assert len(stub.requests) == 1
+
+
+def test_concurrent_windows_are_capped():
+    stub = StubNBP(delay=0.02)
+    # 2023-2024 in windows of at most 94 days
+    records = _fetch(stub, date(2023, 1, 1), date(2024, 12, 31), max_concurrency=2, rate_limit=1000)
+    assert len(records) == len(stub.requests) == 8
+    assert [r["data"] for r in records] == sorted(r["data"] for r in records)
+    assert stub.max_in_flight == 2
+
+
+def test_request_rate_is_limited():
+    stub = StubNBP()
+    # A burst of 4 (the bucket holds one second of requests), then 4 per second
+    _fetch(stub, date(2023, 1, 1), date(2024, 12, 31), max_concurrency=8, rate_limit=4)
+    assert len(stub.requests) == 8
+    assert stub.requests[-1] - stub.requests[0] >= (8 - 4) / 4 * 0.9
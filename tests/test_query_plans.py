@@ -0,0 +1,42 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.shared.migrations import migrate
+from src.shared.schema import check_query_plans
+
+# PostgreSQL database (postgresql+asyncpg://...) the plan check also runs against;
+# migrated to HEAD if needed, no data is written
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def _plan_problems(url: str, before_check: str = None):
+    async def run():
+        engine = create_async_engine(url)
+        try:
+            await migrate(engine)
+            async with engine.begin() as conn:
+                if before_check:
+                    await conn.exec_driver_sql(before_check)
+                return await conn.run_sync(check_query_plans)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def test_hot_queries_use_indexes_sqlite(tmp_path):
+    assert _plan_problems(f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}") == {}
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL (PostgreSQL) not set")
+@pytest.mark.skipif(importlib.util.find_spec("asyncpg") is None, reason="asyncpg not installed")
+def test_hot_queries_use_indexes_postgres():
+    assert _plan_problems(TEST_DATABASE_URL) == {}
+
+
+def test_missing_index_is_reported(tmp_path):
+    problems = _plan_problems(f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}", "DROP INDEX idx_signals_generated")
+    assert problems == {"signals page": ["signals"]}
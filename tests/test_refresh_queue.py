@@ -0,0 +1,47 @@
+import asyncio
+
+from src.shared.events import RefreshQueue
+
+
+def test_one_run_in_flight_and_codes_merged():
+    runs, running, overlaps = [], 0, 0
+
+    async def refresh(batch):
+        nonlocal running, overlaps
+        overlaps += running > 0
+        running += 1
+        runs.append(dict(batch))
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def scenario():
+        queue = RefreshQueue("Test", refresh)
+        first = queue.add(["usd"])
+        await asyncio.sleep(0)
+        # Windows arriving while USD is refreshed
+        assert queue.add(["EUR", "GBP"]) is first
+        queue.add(["EUR"], flag=True)
+        queue.add(["GBP"])
+        await first
+        assert queue.task.done() and not queue.pending
+
+    asyncio.run(scenario())
+    assert runs == [{"USD": False}, {"EUR": True, "GBP": False}]
+    assert overlaps == 0
+
+
+def test_failed_run_does_not_stop_later_runs():
+    runs = []
+
+    async def refresh(batch):
+        runs.append(list(batch))
+        if "BAD" in batch:
+            raise RuntimeError("boom")
+
+    async def scenario():
+        queue = RefreshQueue("Test", refresh)
+        await queue.add(["BAD"])
+        await queue.add(["USD"])
+
+    asyncio.run(scenario())
+    assert runs == [["BAD"], ["USD"]]
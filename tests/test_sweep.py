@@ -0,0 +1,36 @@
+import pytest
+
+from src.shared.backtester import Backtester
+from src.shared.sweep import expand_grid, run_sweep_chunk
+from tests.fixtures import random_walk
+
+
+@pytest.mark.parametrize("grid", [
+    {'rsi_window': [2.5]},
+    {'sma_window': [0]},
+    {'macd_signal': [-3]},
+    {'bb_window': [True]},
+    {'bb_std': [0]},
+    {'bb_std': [-1.5]},
+    {'adx_threshold': [float('nan')]},
+    {'rsi_window': []},
+    {'stop_loss': [1]},
+])
+def test_expand_grid_rejects_invalid_values(grid):
+    with pytest.raises(ValueError):
+        expand_grid(grid)
+
+
+def test_expand_grid_normalizes_windows():
+    combos = expand_grid({'rsi_window': [14.0, 14, 10], 'macd_fast': [12, 30]})
+    assert [(c['rsi_window'], c['macd_fast']) for c in combos] == [(14, 12), (10, 12)]
+    assert all(type(c['rsi_window']) is int for c in combos)
+
+
+def test_sweep_metrics_match_backtester_run():
+    history = random_walk(days=900)
+    combos = expand_grid({'rsi_window': [7, 14], 'bb_std': [1.5, 2.5], 'adx_threshold': [20, 30]})
+    for result in run_sweep_chunk(history, combos, 10000.0):
+        expected = Backtester(params=result['params']).run(history)
+        for metric in ("final_value", "total_trades", "max_drawdown_pct", "sharpe_ratio", "hit_rate_pct"):
+            assert result[metric] == pytest.approx(expected[metric]), metric
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.shared.models import Base, ForecastModel
+from src.shared.upsert import upsert
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'upsert.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(create())
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+async def _store_model(Session, last_date: date, model: str) -> bool:
+    async with Session() as session:
+        written = await upsert(
+            session, ForecastModel, {'asset_code': "USD", 'last_date': last_date, 'model': model},
+            key_columns=['asset_code'], where=lambda excluded: ForecastModel.last_date <= excluded.last_date,
+        )
+        await session.commit()
+        return written
+
+
+async def _stored(Session):
+    async with Session() as session:
+        return (await session.execute(select(ForecastModel.last_date, ForecastModel.model))).all()
+
+
+def test_concurrent_writers_of_one_key(Session):
+    async def scenario():
+        results = await asyncio.gather(*(_store_model(Session, date(2024, 1, 2), f"m{i}") for i in range(4)))
+        return results, await _stored(Session)
+
+    results, rows = asyncio.run(scenario())
+    assert all(results)
+    assert len(rows) == 1
+
+
+def test_where_keeps_newer_row(Session):
+    async def scenario():
+        await _store_model(Session, date(2024, 1, 3), "new")
+        older = await _store_model(Session, date(2024, 1, 2), "old")
+        newer = await _store_model(Session, date(2024, 1, 4), "newest")
+        return older, newer, await _stored(Session)
+
+    older, newer, rows = asyncio.run(scenario())
+    assert not older and newer
+    assert rows == [(date(2024, 1, 4), "newest")]